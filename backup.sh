@@ -1 +1,3 @@
- 
\ No newline at end of file
+#!/bin/sh
+# Take a verified, compressed online backup of the bot database
+cd "$(dirname "$0")" && python -m src.utils.backup
@@ -0,0 +1,118 @@
+"""Memory benchmark for the gateway member cache policies.
+
+Builds a guild from a simulated GUILD_CREATE payload with 10k and 100k members under
+each MEMBER_CACHE_FLAGS policy and reports the memory the client keeps afterwards,
+plus the cost of a full on-demand LRU (MEMBER_LRU_SIZE members).
+
+    python benchmark_members.py [member counts...]
+
+Results from `python benchmark_members.py` (default counts, an empty .env so
+MEMBER_LRU_SIZE is 1000) on CPython 3.11.7, discord.py 2.7.1, aiohttp 3.14.5,
+python-dotenv 1.2.4, Linux 6.18 x86_64 (glibc 2.36), about 20s wall time:
+
+      members  policy    cached     retained
+        10000  all        10000       6.7 MiB
+        10000  joined     10000       6.7 MiB
+        10000  none           0       0.0 MiB
+       100000  all       100000      71.8 MiB
+       100000  joined    100000      71.8 MiB
+       100000  none           0       0.0 MiB
+
+    On-demand LRU with 1000 members: 0.7 MiB
+
+`joined` matches `all` here because every simulated member arrives in GUILD_CREATE, which
+`joined` keeps too; it only saves the members seen later through other events. The default
+(`none` plus the LRU) keeps about 0.7 MiB however large the guild is.
+"""
+import gc
+import sys
+import tracemalloc
+import discord
+from src.utils.cache import LRUCache
+from src.config.settings import MEMBER_LRU_SIZE, MEMBER_LRU_TTL
+
+POLICIES = {
+    "all": discord.MemberCacheFlags.all,
+    "joined": lambda: discord.MemberCacheFlags(joined=True),
+    "none": discord.MemberCacheFlags.none,
+}
+
+
+def member_payload(member_id: int) -> dict:
+    return {
+        "user": {
+            "id": str(member_id),
+            "username": f"member{member_id}",
+            "discriminator": "0",
+            "global_name": None,
+            "avatar": None,
+        },
+        "roles": [],
+        "joined_at": "2024-01-01T00:00:00+00:00",
+        "deaf": False,
+        "mute": False,
+        "flags": 0,
+    }
+
+
+def guild_payload(count: int) -> dict:
+    return {
+        "id": "1",
+        "name": "Benchmark",
+        "member_count": count,
+        "roles": [],
+        "emojis": [],
+        "stickers": [],
+        "features": [],
+        "members": [member_payload(100_000_000 + i) for i in range(count)],
+    }
+
+
+def measure(count: int, flags: discord.MemberCacheFlags) -> tuple:
+    """Returns (cached members, bytes retained) after loading the guild"""
+    intents = discord.Intents.default()
+    intents.members = True
+    client = discord.Client(intents=intents, member_cache_flags=flags, max_messages=None)
+    payload = guild_payload(count)
+
+    gc.collect()
+    tracemalloc.start()
+    guild = discord.Guild(data=payload, state=client._connection)
+    del payload
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return len(guild.members), retained
+
+
+def measure_lru(size: int) -> int:
+    intents = discord.Intents.default()
+    client = discord.Client(intents=intents, member_cache_flags=discord.MemberCacheFlags.none())
+    guild = discord.Guild(data=guild_payload(0), state=client._connection)
+    payloads = [member_payload(200_000_000 + i) for i in range(size)]
+
+    gc.collect()
+    tracemalloc.start()
+    cache = LRUCache(size, MEMBER_LRU_TTL)
+    for data in payloads:
+        member = discord.Member(data=data, guild=guild, state=client._connection)
+        cache.set((guild.id, member.id), member)
+    del payloads
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return retained
+
+
+def main():
+    counts = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000]
+    print(f"{'members':>9}  {'policy':<7} {'cached':>8} {'retained':>12}")
+    for count in counts:
+        for name, flags in POLICIES.items():
+            cached, retained = measure(count, flags())
+            print(f"{count:>9}  {name:<7} {cached:>8} {retained / 1024 / 1024:>9.1f} MiB")
+    print(f"\nOn-demand LRU with {MEMBER_LRU_SIZE} members: {measure_lru(MEMBER_LRU_SIZE) / 1024 / 1024:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
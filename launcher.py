@@ -0,0 +1,121 @@
+"""Runs the bot as several processes, each connecting its own block of gateway shards.
+
+    python launcher.py [processes] [shards]
+
+`shards` defaults to Discord's recommended count for the token. Every child runs main.py
+with SHARD_COUNT and SHARD_IDS set (see src/utils/sharding.py); the one with shard 0 is
+the primary and also runs the webhook server and process-wide jobs. SIGINT/SIGTERM are
+passed on so each child drains before exiting.
+
+A child that crashes is restarted with exponential backoff. A clean exit (0) or a fatal
+one (bad token, missing intents) is not restarted, and a block of shards is given up on
+after MAX_FAST_FAILURES crashes in a row that each came within STABLE_SECONDS of starting.
+"""
+import asyncio
+import os
+import signal
+import sys
+import time
+from pathlib import Path
+import aiohttp
+from src.config.settings import DISCORD_TOKEN
+
+MAIN = Path(__file__).resolve().parent / "main.py"
+IDENTIFY_INTERVAL = 5  # Seconds Discord wants between shard identifies
+RESTART_DELAY = 10  # First restart delay, doubled after each crash that came soon after starting
+RESTART_MAX_DELAY = 300
+STABLE_SECONDS = 60  # A child that ran this long resets the backoff
+MAX_FAST_FAILURES = 5
+EXIT_FATAL = 2  # main.py's exit code for errors a restart can't fix
+
+
+async def recommended_shards() -> int:
+    async with aiohttp.ClientSession() as session:
+        async with session.get(
+            "https://discord.com/api/v10/gateway/bot", headers={"Authorization": f"Bot {DISCORD_TOKEN}"}
+        ) as response:
+            response.raise_for_status()
+            return (await response.json())["shards"]
+
+
+def split_shards(shard_count: int, processes: int) -> list:
+    """Contiguous blocks of shard ids, one per process, as even as possible"""
+    processes = max(1, min(processes, shard_count))
+    size, extra = divmod(shard_count, processes)
+    blocks, start = [], 0
+    for index in range(processes):
+        end = start + size + (1 if index < extra else 0)
+        blocks.append(list(range(start, end)))
+        start = end
+    return blocks
+
+
+async def run_child(shard_ids: list, shard_count: int, delay: float, stopping: asyncio.Event):
+    env = {**os.environ, "SHARD_COUNT": str(shard_count), "SHARD_IDS": ",".join(map(str, shard_ids))}
+    # Stagger the first start so the processes don't identify at the same time
+    try:
+        await asyncio.wait_for(stopping.wait(), timeout=delay)
+        return
+    except asyncio.TimeoutError:
+        pass
+
+    fast_failures = 0
+    while not stopping.is_set():
+        print(f"Starting shards {shard_ids}")
+        started = time.monotonic()
+        process = await asyncio.create_subprocess_exec(sys.executable, str(MAIN), env=env)
+        exited = asyncio.create_task(process.wait())
+        stop = asyncio.create_task(stopping.wait())
+        await asyncio.wait({exited, stop}, return_when=asyncio.FIRST_COMPLETED)
+        if stop.done():
+            if process.returncode is None:
+                process.send_signal(signal.SIGTERM)
+            await exited
+            return
+        stop.cancel()
+
+        code = process.returncode
+        if code == 0:
+            print(f"Shards {shard_ids} exited cleanly, not restarting")
+            return
+        if code == EXIT_FATAL:
+            print(f"Shards {shard_ids} hit a fatal error (check the token and intents), not restarting")
+            return
+
+        fast_failures = fast_failures + 1 if time.monotonic() - started < STABLE_SECONDS else 1
+        if fast_failures >= MAX_FAST_FAILURES:
+            print(f"Shards {shard_ids} crashed {fast_failures} times in a row right after starting, giving up")
+            return
+        delay = min(RESTART_MAX_DELAY, RESTART_DELAY * 2 ** (fast_failures - 1))
+        print(f"Shards {shard_ids} exited with code {code}, restarting in {delay}s")
+        try:
+            await asyncio.wait_for(stopping.wait(), timeout=delay)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def launch(processes: int, shard_count: int = None):
+    shard_count = shard_count or await recommended_shards()
+    blocks = split_shards(shard_count, processes)
+    print(f"Launching {shard_count} shards in {len(blocks)} processes: {blocks}")
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stopping.set)
+        except NotImplementedError:
+            pass  # Windows, Ctrl+C still reaches the children
+
+    delays = [IDENTIFY_INTERVAL * block[0] for block in blocks]
+    await asyncio.gather(*(
+        run_child(block, shard_count, delay, stopping) for block, delay in zip(blocks, delays)
+    ))
+    print("All shard processes stopped")
+
+
+if __name__ == "__main__":
+    asyncio.run(launch(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 2,
+        int(sys.argv[2]) if len(sys.argv) > 2 else None
+    ))
@@ -1,10 +1,16 @@
 import asyncio
+import sys
+import discord
 from src.bot import ZwiftsBot
 from src.config.settings import DISCORD_TOKEN
 
+EXIT_ERROR = 1
+EXIT_FATAL = 2  # Bad token or missing privileged intents, restarting won't help
+
 async def setup():
     bot = ZwiftsBot()
     async with bot:
+        bot.lifecycle.install_signal_handlers()
         await bot.start(DISCORD_TOKEN)
 
 def main():
@@ -12,8 +18,12 @@ def main():
         asyncio.run(setup())
     except KeyboardInterrupt:
         print("\nBot shutdown by user")
+    except (discord.LoginFailure, discord.PrivilegedIntentsRequired) as e:
+        print(f"Fatal error: {e}")
+        sys.exit(EXIT_FATAL)
     except Exception as e:
         print(f"Error: {e}")
+        sys.exit(EXIT_ERROR)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1 +1,3 @@
- 
\ No newline at end of file
+#!/bin/sh
+# Switch the bot database to incremental auto-vacuum while the bot is stopped (a one-off full VACUUM)
+cd "$(dirname "$0")" && python -m src.models.archive
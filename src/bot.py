@@ -1,37 +1,89 @@
+import asyncio
 import discord
 from discord.ext import commands, tasks
 from collections import defaultdict
 from src.models.key_manager import KeyManagement
 from src.models.product import ProductDelivery
-import requests
-from src.config.settings import SELLAUTH_API_KEY, SELLAUTH_PASSWORD, SHOP_ID, GUILD_ID, CUSTOMER_ROLE_ID, SELLAUTH_API_BASE
+from src.models.tenants import TenantRegistry
+from src.config.settings import SELLAUTH_PASSWORD, CATALOG_TTL, ROLE_RECONCILE_MINUTES, POLL_TENANT_BATCH
+from src.config.settings import EXPIRY_CHECK_MINUTES, EXPIRY_BATCH_SIZE
+from src.config.settings import REMINDER_LEAD_DAYS, REMINDER_CHECK_MINUTES, REMINDER_BATCH_SIZE, REMINDER_CONCURRENCY
+from src.config.settings import ARCHIVE_DATABASE_PATH, ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE, ARCHIVE_INTERVAL_HOURS
+from src.config.settings import BACKUP_INTERVAL_HOURS, BUTTON_KEY_PURGE_MINUTES, BUTTON_KEY_PURGE_BATCH, COUPON_SYNC_MINUTES
+from src.config.settings import RELOAD_WATCH_SECONDS, CHUNK_GUILDS_AT_STARTUP, MESSAGE_CACHE_SIZE
+from src.config.settings import DELIVERY_RETRY_INTERVAL
 import logging
 import datetime
-import aiohttp
 from src.models.database import Database
+from src.models.archive import Archiver, ARCHIVE_RULES
+from src.models import ledger
+from src.models.ledger import PaymentLedger
+from src.models.write_behind import WriteBehindBuffer
 import json
 from datetime import datetime, timedelta
 from src.webhooks.sellauth_webhook import SellAuthWebhook
+from src.utils.sellauth_client import SellAuthUnavailable
+from src.utils.polling import next_poll_interval
+from src.utils.speculation import SpeculativeInvoices
+from src.utils.role_manager import RoleManager
+from src.utils.backup import BackupManager
+from src.utils import outbound
+from src.utils.outbound import OutboundScheduler
+from src.utils.lifecycle import Lifecycle, LifecycleTree, graceful
+from src.utils.reloader import Reloader
+from src.utils.member_cache import MemberCache, build_intents, build_member_cache_flags
+from src.utils.metrics import timed
+from src.utils.profiler import Profiler
+from src.utils.watchdog import LoopWatchdog
+from src.utils.sharding import ShardPlan, shard_id_for
+from src.utils import deliveries
+from src.utils.deliveries import DeliveryRetries
 
-class ZwiftsBot(commands.Bot):
+# Sharded modes need AutoShardedBot, so the base class is picked from SHARDING/SHARD_IDS
+SHARD_PLAN = ShardPlan()
+
+class ZwiftsBot(commands.AutoShardedBot if SHARD_PLAN.sharded else commands.Bot):
     def __init__(self):
-        intents = discord.Intents.default()
-        intents.message_content = True  # Add message content intent
-        intents.members = True
-        intents.guilds = True
+        intents = build_intents()
         
         super().__init__(
             command_prefix="!",
-            intents=intents
+            intents=intents,
+            tree_cls=LifecycleTree,
+            member_cache_flags=build_member_cache_flags(intents),
+            chunk_guilds_at_startup=CHUNK_GUILDS_AT_STARTUP,
+            max_messages=MESSAGE_CACHE_SIZE or None,
+            **SHARD_PLAN.bot_options()
         )
-        self.key_manager = KeyManagement()
+        self.shard_plan = SHARD_PLAN
+        self.member_cache = MemberCache(self)
+        self.db = Database(archive_path=ARCHIVE_DATABASE_PATH)  # Initialize the database
+        self.db.write_buffer = WriteBehindBuffer(self.db)
+        self.ledger = PaymentLedger(self.db)
+        self.key_manager = KeyManagement(self.db, ledger=self.ledger)
         self.product_delivery = ProductDelivery(self, self.key_manager)
-        self.active_invoices = {}
+        self.tenants = TenantRegistry(self.db, owns_guild=self.shard_plan.owns_guild)
         self.last_status_check = defaultdict(float)
         self.STATUS_CHECK_COOLDOWN = 60  # 60 seconds cooldown
         self._extensions_loaded = False  # Track if extensions are loaded
-        self.db = Database()  # Initialize the database
+        self.archiver = Archiver(self.db, ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE)
+        self.archiver.enable_incremental_vacuum()  # Before connecting, a no-op once it's done
+        self.backups = BackupManager(self.db.db_path, self.db.archive_path)
         self.webhook_handler = None
+        # The .env storefront, for code that only ever serves one shop
+        self.sellauth = self.tenants.default.sellauth
+        self.catalog = self.tenants.default.catalog
+        self.coupons = self.tenants.default.coupons
+        self.active_invoices = self.tenants.default.active_invoices
+        self.purchase_view = None  # Default tenant's persistent view, registered by the commands cog
+        self.speculator = SpeculativeInvoices(self)
+        self.role_manager = RoleManager(self)
+        self.deliveries = DeliveryRetries(self)
+        self.outbound = OutboundScheduler()
+        self.lifecycle = Lifecycle(self)
+        self.reloader = Reloader(self)
+        self.profiler = Profiler()
+        self.watchdog = LoopWatchdog()
         
     async def setup_hook(self):
         """Initial setup when bot is starting"""
@@ -40,28 +92,43 @@ class ZwiftsBot(commands.Bot):
         try:
             print("Loading commands cog...")
             await self.load_extension("src.cogs.commands")
+            await self.load_extension("src.cogs.admin")
             print("Commands cog loaded successfully")
             
             print("Registering commands...")
-            guild = discord.Object(id=GUILD_ID)
-            self.tree.copy_global_to(guild=guild)
-            commands = await self.tree.sync(guild=guild)
-            print(f"Successfully synced {len(commands)} commands to guild")
-            for cmd in commands:
-                print(f"Registered command: {cmd.name}")
+            await self.reloader.sync_if_changed()
         except Exception as e:
             print(f"Error during setup: {e}")
             import traceback
             traceback.print_exc()
 
-        print("Starting tasks...")
-        self.check_invoices.start()
-        self.check_expiring_subs.start()
+        print(f"Starting tasks ({self.shard_plan.describe()})...")
+        self.watchdog.start()
+        self.ledger.start()
+        self.db.write_buffer.start()
+        self.refresh_catalog.start()
+        self.refresh_coupons.start()
+        self.expire_speculative_invoices.start()
+        self.role_manager.start()
+        self.reconcile_roles.start()
         self.check_invoice_status.start()  # Start the background task
+        if RELOAD_WATCH_SECONDS:
+            self.watch_for_reload.change_interval(seconds=RELOAD_WATCH_SECONDS)
+            self.watch_for_reload.start()
+
+        # Process-wide jobs and the webhook server run once, in the primary process
+        if self.shard_plan.primary:
+            self.enforce_expiries.start()
+            self.archive_cold_rows.start()
+            self.purge_button_keys.start()
+            self.scheduled_backup.start()
+            self.check_invoices.start()
+            self.check_expiring_subs.start()
+            self.retry_deliveries.start()
 
-        # Start webhook server
-        self.webhook_handler = SellAuthWebhook(self)
-        await self.webhook_handler.start()
+            # Start webhook server
+            self.webhook_handler = SellAuthWebhook(self)
+            await self.webhook_handler.start()
 
         print("Bot setup complete!")
 
@@ -70,32 +137,46 @@ class ZwiftsBot(commands.Bot):
         """Handler for bot ready event"""
         print(f"Logged in as {self.user.name}")
         print(f"Bot ID: {self.user.id}")
-        print(f"Guild ID: {GUILD_ID}")
+        print(f"Sharding: {self.shard_plan.describe()}")
+        print(f"Tenants: {len(self.tenants)} ({', '.join(f'{t.id}: guild {t.guild_id}' for t in self.tenants.owned())} here)")
         print("------")
         
-        # Try to sync commands again on ready
+        # Sync again on ready only if the commands changed since the last sync (e.g. setup failed)
         try:
-            guild = self.get_guild(GUILD_ID)
-            if guild:
-                print(f"Attempting to sync commands to {guild.name}...")
-                synced = await self.tree.sync(guild=guild)
-                print(f"Synced {len(synced)} commands")
-                for cmd in synced:
-                    print(f"- Command available: {cmd.name}")
-            else:
-                print(f"Could not find guild with ID {GUILD_ID}")
+            for guild_id in self.tenants.guild_ids(owned=True):
+                if not self.get_guild(guild_id):
+                    print(f"Could not find guild with ID {guild_id}")
+            await self.reloader.sync_if_changed()
         except Exception as e:
             print(f"Error syncing commands on ready: {e}")
 
-    async def create_sellauth_invoice(self, user_id: str, product_id: str, checkout_data: dict) -> dict:
-        """Create a SELLAUTH invoice"""
-        url = f"{SELLAUTH_API_BASE}/shops/{SHOP_ID}/checkout"
-        headers = {
-            "Authorization": f"Bearer {SELLAUTH_API_KEY}",
-            "Accept": "application/json",
-            "Content-Type": "application/json"
-        }
-        
+    @commands.Cog.listener()
+    async def on_shard_ready(self, shard_id: int):
+        print(f"Shard {shard_id} ready")
+
+    def guild_shard_ready(self, guild_id: int) -> bool:
+        """True if the shard carrying `guild_id` is connected in this process"""
+        if not self.shard_plan.sharded or not guild_id:
+            return True
+        shard = self.get_shard(shard_id_for(guild_id, self.shard_count))
+        return shard is not None and not shard.is_closed()
+
+    async def close(self):
+        """Drain in-flight work and queues (see Lifecycle) before disconnecting"""
+        await self.lifecycle.shutdown()
+        await super().close()
+
+    async def create_sellauth_invoice(self, user_id: str, product_id: str, checkout_data: dict, track: bool = True,
+                                      tenant=None) -> dict:
+        """Create a SELLAUTH invoice in `tenant`'s shop (the default tenant if not given)
+
+        For crypto payments the invoice details (address/amount) are fetched in the
+        background and exposed as the `crypto_details` task, so the payment link can be
+        shown without waiting for a second round-trip. Pass track=False to skip status
+        polling (used for speculative invoices until they're claimed).
+        """
+        tenant = tenant or self.tenants.default
+
         # Format the request payload
         payload = {
             "cart": [{
@@ -119,100 +200,300 @@ class ZwiftsBot(commands.Bot):
         
         try:
             print(f"Sending request to SELLAUTH with data: {json.dumps(payload, indent=2)}")
-            response = requests.post(url, json=payload, headers=headers)
-            print(f"SELLAUTH Response Status: {response.status_code}")
-            print(f"SELLAUTH Response: {response.text}")
+            data = await tenant.sellauth.create_checkout(payload)
             
-            if response.status_code == 200:
-                data = response.json()
-                if data.get("success"):
-                    invoice_id = data.get('invoice_id')
-                    if invoice_id:
-                        self.active_invoices[invoice_id] = user_id
-                        
-                        # If it's a crypto payment, get the invoice details
-                        if checkout_data.get("gateway") == "CRYPTO":
-                            invoice_response = requests.get(
-                                f"{SELLAUTH_API_BASE}/shops/{SHOP_ID}/invoices/{invoice_id}",
-                                headers=headers
-                            )
-                            if invoice_response.status_code == 200:
-                                invoice_data = invoice_response.json()
-                                return {
-                                    "url": data.get("invoice_url") or data.get("url"),
-                                    "gateway": "LTC",  # Using LTC as specified in docs
-                                    "crypto_address": invoice_data.get("crypto_address"),
-                                    "crypto_amount": invoice_data.get("crypto_amount"),
-                                    "currency": "LTC",  # Explicitly set currency
-                                    "price_usd": invoice_data.get("price_usd")
-                                }
-                        
-                    return {
-                        "url": data.get("invoice_url") or data.get("url"),
-                        "gateway": checkout_data.get("gateway")
-                    }
+            if data and data.get("success"):
+                invoice_id = data.get('invoice_id')
+                invoice = {
+                    "invoice_id": invoice_id,
+                    "url": data.get("invoice_url") or data.get("url"),
+                    "gateway": checkout_data.get("gateway")
+                }
+                if invoice_id:
+                    self.ledger.record(
+                        ledger.INVOICE_CREATED, invoice_id, user_id,
+                        gateway=payload["gateway"], variant_id=payload["cart"][0]["variantId"], speculative=not track,
+                        tenant=tenant.id
+                    )
+                    if track:
+                        tenant.active_invoices[invoice_id] = user_id
+                    
+                    # If it's a crypto payment, fetch the invoice details concurrently
+                    if payload["gateway"] == "LTC":
+                        invoice["gateway"] = "LTC"  # Using LTC as specified in docs
+                        invoice["currency"] = "LTC"
+                        invoice["crypto_details"] = asyncio.create_task(tenant.sellauth.get_invoice(invoice_id))
+                    
+                return invoice
             return None
+        except SellAuthUnavailable:
+            raise
         except Exception as e:
             print(f"SELLAUTH Request Error: {e}")
             print(f"Full error details: {e.__class__.__name__}: {str(e)}")
             return None
 
+    def record_order(self, user: discord.User, invoice_id: str, variant_id=None, product_name: str = "",
+                     gateway: str = None, amount=0, tenant=None):
+        """Record a completed invoice as a subscription and a purchase (idempotent per invoice)"""
+        tenant = tenant or self.tenants.default
+        duration_days = tenant.catalog.duration_days(variant_id, product_name)
+        variant_key = tenant.catalog.find_variant_key(variant_id) or product_name or "UNKNOWN"
+        self.db.add_subscription(
+            discord_id=str(user.id),
+            discord_name=user.name,
+            invoice_id=str(invoice_id),
+            duration_days=duration_days,
+            variant_key=variant_key,
+            gateway=gateway,
+            amount=amount,
+            tenant_id=tenant.id
+        )
+        self.db.record_purchase(
+            discord_id=str(user.id),
+            discord_name=user.name,
+            invoice_id=str(invoice_id),
+            product_key=None,
+            variant_key=variant_key,
+            duration_days=duration_days,
+            gateway=gateway,
+            amount=amount,
+            tenant_id=tenant.id
+        )
+
     @tasks.loop(seconds=30)
+    @graceful
+    @timed("loop.check_invoices")
     async def check_invoices(self):
         """Check SELLAUTH for completed invoices"""
-        async with aiohttp.ClientSession() as session:
-            url = "https://api.sellauth.app/v1/fetchInvoices"
-            headers = {
-                "Authorization": f"Bearer {SELLAUTH_API_KEY}"
-            }
-            payload = {
-                "password": SELLAUTH_PASSWORD,
-                "status": "completed"
-            }
-            
-            async with session.post(url, json=payload, headers=headers) as response:
-                if response.status == 200:
-                    invoices = await response.json()
+        url = "https://api.sellauth.app/v1/fetchInvoices"
+        payload = {
+            "password": SELLAUTH_PASSWORD,
+            "status": "completed"
+        }
+        
+        try:
+            status, invoices = await self.sellauth.request("POST", url, json=payload)
+        except SellAuthUnavailable as e:
+            print(f"Skipping invoice check: {e}")
+            return
+        finally:
+            self.check_invoices.change_interval(seconds=next_poll_interval(
+                self.sellauth.latency, 1, self.sellauth.breaker.retry_after
+            ))
+
+        if status == 200 and invoices:
+            for invoice in invoices:
+                invoice_id = invoice['id']
+                
+                # Skip if we've already processed this invoice
+                if invoice_id in self.active_invoices:
+                    continue
                     
-                    for invoice in invoices:
-                        invoice_id = invoice['id']
+                user_id = invoice['userId']
+                try:
+                    user = await self.member_cache.fetch_user(user_id)
+                    if user:
+                        # Record the order with its plan, gateway and price so the sale rolls up correctly
+                        self.record_order(user, invoice_id, **SellAuthWebhook.order_details(invoice))
                         
-                        # Skip if we've already processed this invoice
-                        if invoice_id in self.active_invoices:
-                            continue
-                            
-                        user_id = invoice['userId']
-                        try:
-                            user = await self.fetch_user(int(user_id))
-                            if user:
-                                # Record subscription in database
-                                self.db.add_subscription(
-                                    discord_id=user_id,
-                                    discord_name=user.name,
-                                    invoice_id=invoice_id
-                                )
-                                
-                                # Send thank you message
-                                await self.send_thank_you(user, invoice_id)
-                                
-                                # Mark as processed
-                                self.active_invoices[invoice_id] = True
-                                
-                        except Exception as e:
-                            print(f"Error processing invoice {invoice_id}: {e}")
-
-    @tasks.loop(hours=12)
+                        # Send thank you message
+                        await self.outbound.submit(outbound.DELIVERY, "dm", lambda: self.send_thank_you(user, invoice_id))
+                        
+                        # Mark as processed
+                        self.active_invoices[invoice_id] = True
+                        
+                except Exception as e:
+                    print(f"Error processing invoice {invoice_id}: {e}")
+
+    @tasks.loop(seconds=CATALOG_TTL)
+    async def refresh_catalog(self):
+        """Keep every tenant's product catalog warm so interactions never wait on SellAuth"""
+        await asyncio.gather(*(tenant.catalog.refresh() for tenant in self.tenants))
+
+    @tasks.loop(minutes=COUPON_SYNC_MINUTES)
+    async def refresh_coupons(self):
+        """Keep every tenant's coupon list in sync so codes can be checked before checkout"""
+        await asyncio.gather(*(tenant.coupons.refresh() for tenant in self.tenants))
+
+    @tasks.loop(seconds=5)
+    async def watch_for_reload(self):
+        """Hot-reload constants, views and cogs when their files change (RELOAD_WATCH_SECONDS)"""
+        if self.reloader.changed():
+            try:
+                await self.reloader.reload()
+            except Exception as e:
+                print(f"Automatic reload failed: {e}")
+
+    @tasks.loop(seconds=60)
+    async def expire_speculative_invoices(self):
+        """Forget speculative invoices that were never claimed"""
+        self.speculator.expire()
+
+    @tasks.loop(minutes=ROLE_RECONCILE_MINUTES)
+    @graceful
+    async def reconcile_roles(self):
+        """Fix customer role drift against active subscriptions, one owned tenant guild at a time"""
+        for tenant in self.tenants.owned():
+            if not self.guild_shard_ready(tenant.guild_id):
+                print(f"Skipping role reconciliation for {tenant.id}, its shard is reconnecting")
+                continue
+            await self.role_manager.reconcile(tenant.guild_id, tenant.role_id, tenant.id)
+
+    @reconcile_roles.before_loop
+    async def before_reconcile_roles(self):
+        await self.wait_until_ready()
+
+    @tasks.loop(minutes=EXPIRY_CHECK_MINUTES)
+    @graceful
+    async def enforce_expiries(self):
+        """Expire lapsed subscriptions in bounded batches and revoke their roles"""
+        total = 0
+        while True:
+            expired = self.db.expire_subscriptions_batch(EXPIRY_BATCH_SIZE)
+            if not expired:
+                break
+            total += len(expired)
+
+            # Renewals keep the role, everyone else loses it (in the guild of the tenant they bought from)
+            active = {}
+            for _, discord_id, invoice_id, tenant_id in expired:
+                tenant = self.tenants.get(tenant_id)
+                if tenant is None:
+                    continue  # Tenant was removed, its guild is no longer managed
+                if str(invoice_id).startswith("backfill:"):
+                    continue  # Backfilled by reconciliation, which decides on revoking those
+                if tenant_id not in active:
+                    active[tenant_id] = self.db.get_active_subscriber_ids(tenant_id)
+                if active[tenant_id] is None:
+                    print(f"Not revoking {discord_id}, active subscriptions for {tenant_id} couldn't be loaded")
+                elif int(discord_id) not in active[tenant_id]:
+                    self.role_manager.revoke(discord_id, tenant.guild_id, tenant.role_id, invoice_id=invoice_id)
+
+            if len(expired) < EXPIRY_BATCH_SIZE:
+                break
+            await asyncio.sleep(0)  # Let other tasks run between batches
+
+        if total:
+            print(f"Expired {total} subscriptions")
+
+    @enforce_expiries.before_loop
+    async def before_enforce_expiries(self):
+        await self.wait_until_ready()
+
+    @tasks.loop(hours=ARCHIVE_INTERVAL_HOURS)
+    @graceful
+    async def archive_cold_rows(self):
+        """Move old used keys, button keys and purchases to the archive database"""
+        await asyncio.to_thread(self.archiver.ensure_archive_schema)
+
+        moved = 0
+        for table in ARCHIVE_RULES:
+            while True:
+                count = await asyncio.to_thread(self.archiver.archive_batch, table)
+                moved += count
+                if count < ARCHIVE_BATCH_SIZE:
+                    break
+
+        if moved:
+            await asyncio.to_thread(self.archiver.incremental_vacuum)
+            print(f"Archived {moved} rows")
+
+    @archive_cold_rows.before_loop
+    async def before_archive_cold_rows(self):
+        await self.wait_until_ready()
+
+    @tasks.loop(minutes=BUTTON_KEY_PURGE_MINUTES)
+    async def purge_button_keys(self):
+        """Delete expired button keys and purchase sessions in batches and drop stale cache entries"""
+        purged = 0
+        while True:
+            count = await asyncio.to_thread(self.db.purge_expired_button_keys, BUTTON_KEY_PURGE_BATCH)
+            purged += count
+            if count < BUTTON_KEY_PURGE_BATCH:
+                break
+        self.key_manager.button_keys.cache.purge_expired()
+        if purged:
+            print(f"Purged {purged} expired button keys")
+
+        sessions = 0
+        while True:
+            count = await asyncio.to_thread(self.db.purge_expired_purchase_sessions, BUTTON_KEY_PURGE_BATCH)
+            sessions += count
+            if count < BUTTON_KEY_PURGE_BATCH:
+                break
+        if sessions:
+            print(f"Purged {sessions} expired purchase sessions")
+
+    @tasks.loop(seconds=DELIVERY_RETRY_INTERVAL)
+    @graceful
+    async def retry_deliveries(self):
+        """Re-attempt up to DELIVERY_RETRY_BATCH failed purchase DMs that are due"""
+        await self.deliveries.run_batch()
+
+    @retry_deliveries.before_loop
+    async def before_retry_deliveries(self):
+        await self.wait_until_ready()
+
+    @tasks.loop(hours=BACKUP_INTERVAL_HOURS)
+    async def scheduled_backup(self):
+        """Take an online, verified database snapshot"""
+        try:
+            await asyncio.to_thread(self.backups.run)
+        except Exception as e:
+            print(f"Scheduled backup failed: {e}")
+
+    @tasks.loop(minutes=REMINDER_CHECK_MINUTES)
+    @graceful
+    @timed("loop.check_expiring_subs")
     async def check_expiring_subs(self):
-        """Check for subscriptions expiring in 2 days"""
-        expiring = self.db.get_expiring_subscriptions()
-        for discord_id, discord_name, expiry_date in expiring:
+        """Remind owners of subscriptions expiring soon, a page at a time"""
+        semaphore = asyncio.Semaphore(REMINDER_CONCURRENCY)
+        after = None
+        sent = 0
+        while True:
+            page = self.db.get_due_reminders(REMINDER_LEAD_DAYS, after, REMINDER_BATCH_SIZE)
+            if not page:
+                break
+            after = (page[-1][3], page[-1][0])
+
+            outcomes = await asyncio.gather(*(self._send_reminder(semaphore, row) for row in page))
+            # Permanent failures (DMs closed, unknown user) are marked too so they aren't retried every sweep
+            handled = [row[0] for row, outcome in zip(page, outcomes) if outcome != "error"]
+            self.db.mark_notifications_sent(handled)
+            sent += outcomes.count("sent")
+
+            if len(page) < REMINDER_BATCH_SIZE:
+                break
+
+        if sent:
+            print(f"Sent {sent} expiry reminders")
+
+    @check_expiring_subs.before_loop
+    async def before_check_expiring_subs(self):
+        await self.wait_until_ready()
+
+    async def _send_reminder(self, semaphore: asyncio.Semaphore, row: tuple) -> str:
+        """DM one expiry reminder and record the outcome (sent, dm_closed, user_not_found or error)"""
+        subscription_id, discord_id, invoice_id, expiry_date = row
+        async with semaphore:
             try:
-                user = await self.fetch_user(int(discord_id))
-                if user:
-                    await self.send_expiry_notice(user, expiry_date)
-                    self.db.mark_notification_sent(discord_id)
+                user = await self.member_cache.fetch_user(discord_id)
+                if user is None:
+                    outcome = "user_not_found"
+                else:
+                    expiry = datetime.fromisoformat(str(expiry_date))
+                    await self.outbound.submit(outbound.REMINDER, "dm", lambda: self.send_expiry_notice(user, expiry))
+                    outcome = "sent"
+            except discord.Forbidden:
+                outcome = "dm_closed"
             except Exception as e:
                 print(f"Error sending expiry notice to {discord_id}: {e}")
+                outcome = "error"
+
+        event = ledger.REMINDER_SENT if outcome == "sent" else ledger.REMINDER_FAILED
+        self.ledger.record(event, invoice_id, discord_id, subscription_id=subscription_id, outcome=outcome)
+        return outcome
 
     async def send_thank_you(self, user: discord.User, invoice_id: str):
         """Send thank you message to user"""
@@ -232,7 +513,7 @@ class ZwiftsBot(commands.Bot):
         embed = discord.Embed(
             title="⚠️ Subscription Expiring Soon",
             description=(
-                "Your AUTOPLAY subscription is expiring in 2 days!\n\n"
+                f"Your AUTOPLAY subscription is expiring <t:{int(expiry_date.timestamp())}:R>!\n\n"
                 "To keep your benefits, please renew using `/buy`."
             ),
             color=discord.Color.yellow()
@@ -243,159 +524,105 @@ class ZwiftsBot(commands.Bot):
         )
         await user.send(embed=embed)
 
+    def completed_invoice_embed(self, invoice_id, invoice_data: dict) -> discord.Embed:
+        """Build the DM sent when the poller sees an invoice complete"""
+        embed = discord.Embed(
+            title="🎉 Thank You For Your Purchase!",
+            description="Your order has been completed successfully!",
+            color=discord.Color.green(),
+            timestamp=discord.utils.utcnow()
+        )
+        
+        # Get purchase date and calculate renewal date
+        purchase_date = datetime.utcnow()
+        # Check if it's monthly or weekly subscription
+        if "MONTHLY" in invoice_data.get('product', {}).get('name', ''):
+            renewal_date = purchase_date + timedelta(days=30)
+        else:
+            renewal_date = purchase_date + timedelta(days=7)
+        
+        embed.add_field(
+            name="📅 Important Dates",
+            value=(
+                f"**Purchase Date:** <t:{int(purchase_date.timestamp())}:F>\n"
+                f"**Renewal Date:** <t:{int(renewal_date.timestamp())}:F>"
+            ),
+            inline=False
+        )
+        
+        embed.add_field(
+            name="📦 Order Details",
+            value=(
+                f"**Product:** {invoice_data.get('product', {}).get('name', 'Generator')}\n"
+                f"**Invoice ID:** `{invoice_id}`\n"
+                f"**Amount Paid:** ${invoice_data.get('price_usd', '0.00')} USD"
+            ),
+            inline=False
+        )
+        
+        embed.add_field(
+            name="❓ Need Help?",
+            value="If you need any assistance, please contact our support team.",
+            inline=False
+        )
+        
+        # Set thumbnail
+        embed.set_thumbnail(url="https://media.discordapp.net/attachments/1237105773138542763/1338023352790683739/logox.png?ex=67aed8da&is=67ad875a&hm=18cd0b58b8ef8b572f1acabb0bfc89674f7d5bfd1a9526af4c0e9248f140bf25&=&format=webp&quality=lossless&width=1024&height=1024")
+        return embed
+
     @tasks.loop(minutes=5)
     async def cleanup_old_invoices(self):
         """Clean up old invoices that haven't been completed"""
         # Implementation if needed
         pass 
 
-    @tasks.loop(minutes=30)
-    async def check_expiring_subscriptions(self):
-        """Check for subscriptions expiring in 2 days"""
-        try:
-            with self.db.connect() as conn:
-                cursor = conn.cursor()
-                
-                # Get subscriptions expiring in ~2 days that haven't been notified
-                cursor.execute("""
-                    SELECT discord_id, discord_name, expiry_date 
-                    FROM subscriptions 
-                    WHERE notified = FALSE 
-                    AND expiry_date BETWEEN datetime('now', '+1 day', '+23 hours') 
-                    AND datetime('now', '+2 days', '+1 hour')
-                """)
-                
-                expiring_subs = cursor.fetchall()
-                
-                for discord_id, discord_name, expiry_date in expiring_subs:
-                    try:
-                        user = await self.fetch_user(int(discord_id))
-                        if user:
-                            embed = discord.Embed(
-                                title="⚠️ Subscription Expiring Soon",
-                                description=(
-                                    "Your GENERATOR subscription is expiring in 2 days!\n\n"
-                                    "To keep your benefits and continue using our GENERATOR, "
-                                    "please renew your subscription using `/buy`.\n\n"
-                                    "Thank you for being a valued customer! 🙏"
-                                ),
-                                color=discord.Color.yellow()
-                            )
-                            embed.add_field(
-                                name="Expiry Date",
-                                value=f"<t:{int(datetime.datetime.fromisoformat(expiry_date).timestamp())}:F>"
-                            )
-                            
-                            await user.send(embed=embed)
-                            
-                            # Mark as notified
-                            cursor.execute(
-                                "UPDATE subscriptions SET notified = TRUE WHERE discord_id = ?",
-                                (discord_id,)
-                            )
-                            conn.commit()
-                            
-                    except Exception as e:
-                        print(f"Error notifying user {discord_id}: {e}")
-                        
-        except Exception as e:
-            print(f"Error checking expiring subscriptions: {e}") 
-
     @tasks.loop(seconds=30)
+    @graceful
+    @timed("loop.check_invoice_status")
     async def check_invoice_status(self):
-        """Check status of active invoices every 30 seconds"""
-        for invoice_id, user_id in list(self.active_invoices.items()):
+        """Check tracked invoices, a fair share per tenant on each tick (POLL_TENANT_BATCH)"""
+        for tenant, invoice_id, user_id in self.tenants.poll_schedule(POLL_TENANT_BATCH):
+            if tenant.sellauth.breaker.is_open():
+                continue  # Opened during this tick, the other tenants carry on
             try:
-                headers = {
-                    "Authorization": f"Bearer {SELLAUTH_API_KEY}",
-                    "Accept": "application/json"
-                }
+                invoice_data = await tenant.sellauth.get_invoice(invoice_id)
                 
-                response = requests.get(
-                    f"{SELLAUTH_API_BASE}/shops/{SHOP_ID}/invoices/{invoice_id}",
-                    headers=headers
-                )
-                
-                if response.status_code == 200:
-                    invoice_data = response.json()
-                    
+                if invoice_data:
+                    self.ledger.record(ledger.STATUS_POLLED, invoice_id, user_id, status=invoice_data.get('status'))
                     if invoice_data.get('status') == 'completed':
-                        # Get the user
-                        user = self.get_user(int(user_id))
-                        if user:
-                            # Create success embed
-                            embed = discord.Embed(
-                                title="🎉 Thank You For Your Purchase!",
-                                description="Your order has been completed successfully!",
-                                color=discord.Color.green(),
-                                timestamp=discord.utils.utcnow()
-                            )
-                            
-                            # Get purchase date and calculate renewal date
-                            purchase_date = datetime.utcnow()
-                            # Check if it's monthly or weekly subscription
-                            if "MONTHLY" in invoice_data.get('product', {}).get('name', ''):
-                                renewal_date = purchase_date + timedelta(days=30)
-                            else:
-                                renewal_date = purchase_date + timedelta(days=7)
-                            
-                            embed.add_field(
-                                name="📅 Important Dates",
-                                value=(
-                                    f"**Purchase Date:** <t:{int(purchase_date.timestamp())}:F>\n"
-                                    f"**Renewal Date:** <t:{int(renewal_date.timestamp())}:F>"
-                                ),
-                                inline=False
-                            )
-                            
-                            embed.add_field(
-                                name="📦 Order Details",
-                                value=(
-                                    f"**Product:** {invoice_data.get('product', {}).get('name', 'Generator')}\n"
-                                    f"**Invoice ID:** `{invoice_id}`\n"
-                                    f"**Amount Paid:** ${invoice_data.get('price_usd', '0.00')} USD"
-                                ),
-                                inline=False
-                            )
-                            
-                            embed.add_field(
-                                name="❓ Need Help?",
-                                value="If you need any assistance, please contact our support team.",
-                                inline=False
-                            )
-                            
-                            # Set thumbnail
-                            embed.set_thumbnail(url="https://media.discordapp.net/attachments/1237105773138542763/1338023352790683739/logox.png?ex=67aed8da&is=67ad875a&hm=18cd0b58b8ef8b572f1acabb0bfc89674f7d5bfd1a9526af4c0e9248f140bf25&=&format=webp&quality=lossless&width=1024&height=1024")
-                            
-                            try:
-                                await user.send(embed=embed)
-                                print(f"Sent success message to user {user.name} ({user.id})")
-                                
-                                # Add customer role if configured
-                                if CUSTOMER_ROLE_ID:
-                                    guild = self.get_guild(GUILD_ID)
-                                    if guild:
-                                        member = guild.get_member(int(user_id))
-                                        if member:
-                                            role = guild.get_role(CUSTOMER_ROLE_ID)
-                                            if role:
-                                                await member.add_roles(role)
-                                                print(f"Added customer role to {member.name}")
-                            except discord.Forbidden:
-                                print(f"Could not DM user {user_id}")
-                            except Exception as e:
-                                print(f"Error sending success message: {e}")
-                            
-                            # Remove from active invoices
-                            del self.active_invoices[invoice_id]
+                        # Records the order, grants the role and DMs the buyer (or queues the DM for retry)
+                        await self.deliveries.deliver(
+                            deliveries.PURCHASE_COMPLETED,
+                            user_id,
+                            invoice_id,
+                            self.completed_invoice_embed(invoice_id, invoice_data),
+                            tenant,
+                            order={
+                                "variant_id": invoice_data.get('variant_id'),
+                                "product_name": invoice_data.get('product', {}).get('name', ''),
+                                "gateway": invoice_data.get('gateway'),
+                                "amount": invoice_data.get('price_usd') or 0
+                            }
+                        )
+                        
+                        # Remove from active invoices
+                        tenant.active_invoices.pop(invoice_id, None)
                             
                     elif invoice_data.get('status') == 'cancelled':
                         # Remove cancelled invoices
-                        del self.active_invoices[invoice_id]
+                        tenant.active_invoices.pop(invoice_id, None)
                 
+            except SellAuthUnavailable as e:
+                print(f"Error checking invoice {invoice_id}: {e}")
             except Exception as e:
                 print(f"Error checking invoice {invoice_id}: {e}")
 
+        # The tenant that needs polling soonest sets the pace, the per-tenant cap keeps it fair
+        self.check_invoice_status.change_interval(seconds=min(
+            next_poll_interval(tenant.sellauth.latency, len(tenant.active_invoices), tenant.sellauth.breaker.retry_after)
+            for tenant in self.tenants
+        ))
+
     @check_invoice_status.before_loop
     async def before_check_invoice_status(self):
         await self.wait_until_ready() 
\ No newline at end of file
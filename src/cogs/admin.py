@@ -0,0 +1,275 @@
+import asyncio
+import io
+import discord
+from discord import app_commands
+from discord.ext import commands
+from src.bot import ZwiftsBot
+from src.config.constants import EMOJIS
+from src.utils import outbound
+from src.utils.metrics import timings
+from src.utils.profiler import ProfilerBusy
+from src.config.settings import PROFILE_MAX_SECONDS
+
+class Admin(commands.Cog):
+    """Administrator-only reporting and maintenance commands"""
+
+    def __init__(self, bot: ZwiftsBot):
+        self.bot = bot
+        super().__init__()
+
+    @app_commands.command(name="stats", description="Show sales and revenue")
+    @app_commands.default_permissions(administrator=True)
+    @app_commands.describe(days="How many days to include (default 30)")
+    async def stats(self, interaction: discord.Interaction, days: app_commands.Range[int, 1, 365] = 30):
+        """Answer from this guild's shop's incrementally maintained sales rollups"""
+        tenant = self.bot.tenants.for_guild(interaction.guild_id)
+        stats = self.bot.db.get_sales_stats(days, tenant.id)
+        if stats is None:
+            await interaction.response.send_message("❌ Could not load sales stats.", ephemeral=True)
+            return
+
+        embed = discord.Embed(
+            title=f"{EMOJIS['chart']} Sales - last {days} days",
+            color=discord.Color.gold()
+        )
+        embed.add_field(
+            name="Total",
+            value=f"**Sales:** {stats['total'][0]}\n**Revenue:** ${stats['total'][1]:.2f}",
+            inline=True
+        )
+        embed.add_field(
+            name="Today",
+            value=f"**Sales:** {stats['today'][0]}\n**Revenue:** ${stats['today'][1]:.2f}",
+            inline=True
+        )
+        embed.add_field(
+            name="By Plan",
+            value="\n".join(f"**{k}:** {n} · ${r:.2f}" for k, n, r in stats["by_variant"]) or "No sales",
+            inline=False
+        )
+        embed.add_field(
+            name="By Gateway",
+            value="\n".join(f"**{k}:** {n} · ${r:.2f}" for k, n, r in stats["by_gateway"]) or "No sales",
+            inline=False
+        )
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @app_commands.command(name="backfillstats", description="Rebuild sales stats from purchase history")
+    @app_commands.default_permissions(administrator=True)
+    async def backfillstats(self, interaction: discord.Interaction):
+        """Rebuild this guild's shop's sales rollups from subscriptions and purchases"""
+        await interaction.response.defer(ephemeral=True)
+        tenant = self.bot.tenants.for_guild(interaction.guild_id)
+        count = await asyncio.to_thread(self.bot.db.rebuild_sales_rollups, tenant.id)
+        if count < 0:
+            await interaction.followup.send("❌ Failed to rebuild sales stats.", ephemeral=True)
+        else:
+            await interaction.followup.send(f"✅ Rebuilt sales stats from {count} invoices.", ephemeral=True)
+
+    @app_commands.command(name="backup", description="Take a database backup now")
+    @app_commands.default_permissions(administrator=True)
+    async def backup(self, interaction: discord.Interaction):
+        """Back up the hot and archive databases and report how long it took and how big each file is"""
+        await interaction.response.defer(ephemeral=True)
+        try:
+            result = await asyncio.to_thread(self.bot.backups.run)
+        except Exception as e:
+            print(f"Manual backup failed: {e}")
+            await interaction.followup.send(f"❌ Backup failed: {e}", ephemeral=True)
+            return
+
+        files = "\n".join(f"**File:** `{file['path']}` · {file['size'] / 1024:.1f} KiB" for file in result["files"])
+        await interaction.followup.send(
+            f"✅ Backup complete in {result['duration']:.1f}s (gzip, integrity check passed)\n{files}",
+            ephemeral=True
+        )
+
+    @app_commands.command(name="reload", description="Reload products, views and commands without restarting")
+    @app_commands.default_permissions(administrator=True)
+    async def reload(self, interaction: discord.Interaction):
+        """Hot-reload constants and extensions, re-syncing commands only if they changed"""
+        await interaction.response.defer(ephemeral=True)
+        try:
+            result = await self.bot.reloader.reload()
+        except Exception as e:
+            print(f"Reload failed: {e}")
+            await interaction.followup.send(f"❌ Reload failed: {e}", ephemeral=True)
+            return
+
+        await interaction.followup.send(
+            f"✅ Reloaded {len(result['extensions'])} extensions and the product catalog "
+            f"(v{result['catalog_version']}).\n"
+            f"**Commands:** {'re-synced' if result['synced'] else 'unchanged, no sync needed'}",
+            ephemeral=True
+        )
+
+    @app_commands.command(name="tenants", description="List the storefronts served by this bot")
+    @app_commands.default_permissions(administrator=True)
+    @app_commands.describe(reload="Re-read the tenants table first (default no)")
+    async def tenants(self, interaction: discord.Interaction, reload: bool = False):
+        """Show each tenant's shop, guild, tracked invoices and SellAuth health"""
+        await interaction.response.defer(ephemeral=True)
+        if reload:
+            try:
+                retired = self.bot.tenants.load()
+                await self.bot.tenants.close(retired)
+                # Reloading the cogs registers new tenants' purchase menus and syncs their guilds
+                await self.bot.reloader.reload()
+            except Exception as e:
+                print(f"Tenant reload failed: {e}")
+                await interaction.followup.send(f"❌ Tenant reload failed: {e}", ephemeral=True)
+                return
+
+        embed = discord.Embed(title="🏪 Tenants", color=discord.Color.blurple())
+        for tenant in list(self.bot.tenants)[:25]:
+            embed.add_field(
+                name=f"{tenant.name} (`{tenant.id}`)",
+                value=(
+                    f"**Shop:** {tenant.shop_id}\n"
+                    f"**Guild:** {tenant.guild_id or 'None'} · **Role:** {tenant.role_id or 'None'}\n"
+                    f"**Tracked invoices:** {len(tenant.active_invoices)}\n"
+                    f"**SellAuth:** {tenant.sellauth.breaker.state} · {tenant.sellauth.latency * 1000:.0f}ms"
+                ),
+                inline=False
+            )
+        await interaction.followup.send(embed=embed, ephemeral=True)
+
+    @app_commands.command(name="deadletters", description="List purchase DMs that could not be delivered")
+    @app_commands.default_permissions(administrator=True)
+    async def deadletters(self, interaction: discord.Interaction):
+        """Show this guild's shop's dead-lettered deliveries, most recent first"""
+        tenant = self.bot.tenants.for_guild(interaction.guild_id)
+        rows = self.bot.db.get_dead_deliveries(15, tenant.id)
+        counts = self.bot.db.count_delivery_retries(tenant.id)
+        embed = discord.Embed(
+            title="📭 Undelivered Purchase DMs",
+            description=(
+                f"**Dead:** {counts.get('dead', 0)} · **Retrying:** {counts.get('pending', 0)}\n"
+                "Use `/replaydelivery` to try them again."
+            ),
+            color=discord.Color.red()
+        )
+        for shown, row in enumerate(rows):
+            name = f"#{row['id']} · {row['kind']} · invoice `{row['invoice_id']}`"[:256]
+            value = (
+                f"**User:** <@{row['discord_id']}> ({row['discord_id']}) · **Tenant:** {row['tenant_id']}\n"
+                f"**Attempts:** {row['attempts']} · **Last error:** {(row['last_error'] or 'unknown')[:200]}"
+            )[:1024]
+            # Discord rejects embeds over 6000 characters in total, leave room for the footer
+            if len(embed) + len(name) + len(value) > 5900:
+                embed.set_footer(text=f"{len(rows) - shown} more not shown")
+                break
+            embed.add_field(name=name, value=value, inline=False)
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @app_commands.command(name="replaydelivery", description="Retry dead-lettered purchase DMs")
+    @app_commands.default_permissions(administrator=True)
+    @app_commands.describe(retry_id="Dead letter # from /deadletters (leave empty to replay all)")
+    async def replaydelivery(self, interaction: discord.Interaction, retry_id: int = None):
+        """Make this guild's shop's dead letters due again, then run a retry batch right away"""
+        await interaction.response.defer(ephemeral=True)
+        tenant = self.bot.tenants.for_guild(interaction.guild_id)
+        count = self.bot.db.replay_dead_deliveries(retry_id, tenant.id)
+        if not count:
+            await interaction.followup.send("❌ No matching dead letters.", ephemeral=True)
+            return
+        await self.bot.deliveries.run_batch()
+        counts = self.bot.db.count_delivery_retries(tenant.id)
+        await interaction.followup.send(
+            f"✅ Replayed {count} dead letters.\n"
+            f"**Still retrying:** {counts.get('pending', 0)} · **Dead:** {counts.get('dead', 0)}",
+            ephemeral=True
+        )
+
+    @app_commands.command(name="profile", description="Profile the bot for a few seconds")
+    @app_commands.default_permissions(administrator=True)
+    @app_commands.describe(seconds="How long to sample (default 10)")
+    async def profile(self, interaction: discord.Interaction, seconds: app_commands.Range[int, 1, PROFILE_MAX_SECONDS] = 10):
+        """Sample the event loop and attach top functions, allocation sites and loop timings"""
+        await interaction.response.defer(ephemeral=True)
+        try:
+            report = await self.bot.profiler.run(seconds)
+        except ProfilerBusy as e:
+            await interaction.followup.send(f"❌ {e}", ephemeral=True)
+            return
+
+        file = discord.File(io.BytesIO(report.encode()), filename=f"profile-{interaction.id}.txt")
+        await interaction.followup.send(f"✅ Profiled for {seconds}s", file=file, ephemeral=True)
+
+    @app_commands.command(name="lag", description="Show event loop lag and the code blocking it")
+    @app_commands.default_permissions(administrator=True)
+    async def lag(self, interaction: discord.Interaction):
+        """Report loop lag percentiles and the worst blocking call sites"""
+        watchdog = self.bot.watchdog
+        embed = discord.Embed(title="🐢 Event Loop Lag", color=discord.Color.orange())
+        recorder = timings.get("loop.lag")
+        embed.add_field(
+            name="Lag",
+            value=f"{recorder.summary() if recorder else 'No samples yet'}\n**Worst stall:** {watchdog.max_lag * 1000:.0f}ms",
+            inline=False
+        )
+        embed.add_field(
+            name=f"Worst Offenders (stalls over {watchdog.threshold * 1000:.0f}ms)",
+            value="\n".join(
+                f"`{site}`"[:200] + f" · worst {o['worst'] * 1000:.0f}ms · {o['count']}x"
+                for site, o in watchdog.worst(8)
+            ) or "None recorded",
+            inline=False
+        )
+
+        if watchdog.offenders:
+            # Full stacks of each offender's worst stall
+            stacks = "\n\n".join(f"== {site} ({o['worst'] * 1000:.0f}ms) ==\n{o['stack']}" for site, o in watchdog.worst())
+            file = discord.File(io.BytesIO(stacks.encode()), filename="lag-stacks.txt")
+            await interaction.response.send_message(embed=embed, file=file, ephemeral=True)
+        else:
+            await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @app_commands.command(name="diagnostics", description="Show cache and queue health")
+    @app_commands.default_permissions(administrator=True)
+    async def diagnostics(self, interaction: discord.Interaction):
+        """Report in-memory cache hit rates and queue depths"""
+        button_keys = self.bot.key_manager.button_keys.stats()
+        retries = self.bot.db.count_delivery_retries()
+        embed = discord.Embed(title="🩺 Diagnostics", color=discord.Color.blurple())
+        embed.add_field(
+            name="Button Key Cache",
+            value=(
+                f"**Size:** {button_keys['size']}\n"
+                f"**Hit rate:** {button_keys['hit_rate']:.1%} "
+                f"({button_keys['hits']} hits / {button_keys['misses']} misses)"
+            ),
+            inline=False
+        )
+        embed.add_field(
+            name="Queues",
+            value=(
+                f"**Write-behind:** {self.bot.db.write_buffer.pending} pending\n"
+                f"**Role changes:** {self.bot.role_manager.pending} pending\n"
+                f"**Outbound Discord calls:** {self.bot.outbound.pending} pending\n"
+                f"**Delivery retries:** {retries.get('pending', 0)} pending, {retries.get('dead', 0)} dead"
+            ),
+            inline=False
+        )
+        embed.add_field(
+            name="Outbound Queue Wait",
+            value="\n".join(
+                f"**{name}:** {timings[f'outbound_wait.{name}'].summary()}"
+                for name in outbound.CLASS_NAMES.values()
+                if f"outbound_wait.{name}" in timings
+            ) or "No sends yet",
+            inline=False
+        )
+        latencies = getattr(self.bot, "latencies", [(0, self.bot.latency)])
+        embed.add_field(
+            name="Gateway",
+            value=f"**Mode:** {self.bot.shard_plan.describe()}\n" + "\n".join(
+                f"**Shard {shard_id}:** {latency * 1000:.0f}ms" for shard_id, latency in latencies[:20]
+            ),
+            inline=False
+        )
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+async def setup(bot: ZwiftsBot):
+    await bot.add_cog(Admin(bot))
+    print("Admin cog loaded")
@@ -1,10 +1,77 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
-from src.config.constants import PRODUCTS, PAYMENT_METHODS, EMOJIS
+from src.config.constants import PAYMENT_METHODS, EMOJIS
 from src.bot import ZwiftsBot
+from src.utils.sellauth_client import SellAuthUnavailable
+from src.utils.views import HistoryView
+from src.utils.metrics import record_timing, timings
+from src.utils.lifecycle import reject_if_closing
+from src.models.tenants import DEFAULT_TENANT_ID
+from src.config.settings import PURCHASE_SESSION_TTL_HOURS
 import json
 import re
+import time
+from datetime import datetime
+
+SESSION_EXPIRED_MESSAGE = "⌛ This purchase menu has expired. Please run `/buy` again."
+
+SELLAUTH_DOWN_MESSAGE = (
+    "⏳ Our payment provider is having trouble right now. "
+    "Please try again in a few minutes."
+)
+
+def build_variant_options(catalog, product_name: str) -> list:
+    """Build plan select options from the cached catalog"""
+    options = []
+    for key, variant in catalog.get_variants(product_name).items():
+        stock = catalog.stock_label(variant)
+        options.append(discord.SelectOption(
+            label=f"{variant['name']} (${variant['amount']})"[:100],
+            description=(stock or variant['description'])[:100],
+            emoji=variant['emoji'],
+            value=key
+        ))
+    return options[:25]
+
+def format_price(coupons, product: dict, variant: dict, coupon_code: str = None) -> str:
+    """Plan price, struck through next to the discounted price when a valid coupon applies"""
+    if coupon_code:
+        coupon, _ = coupons.validate(coupon_code, product["id"] if product else None)
+        if coupon:
+            return f"~~${variant['amount']}~~ ${coupons.apply(coupon, variant['amount']):.2f}"
+    return f"${variant['amount']}"
+
+def build_checkout_data(product: dict, variant: dict, gateway: str, email: str, coupon: str = None) -> dict:
+    """Build the checkout request passed to create_sellauth_invoice"""
+    checkout_data = {
+        "cart": [{
+            "productId": product["id"],
+            "variantId": variant["id"],
+            "quantity": 1
+        }],
+        "gateway": gateway,
+        "email": email
+    }
+    if coupon:
+        checkout_data["coupon"] = coupon
+    return checkout_data
+
+def speculate_invoice(client, user_id: int, session: dict, tenant):
+    """Start creating the most likely invoice in `tenant`'s shop while the user is still choosing"""
+    catalog = tenant.catalog
+    product = catalog.get_product(session["product_name"])
+    variant = catalog.get_variant(session["product_name"], session["variant_key"])
+    if not product or not variant or not catalog.in_stock(variant):
+        return
+    gateway = client.speculator.predicted_gateway()
+    if gateway == "PAYPAL":
+        return  # Manual PayPal payments never use the invoice link
+    client.speculator.start(
+        str(user_id),
+        build_checkout_data(product, variant, gateway, session["email"], session["coupon"]),
+        tenant
+    )
 
 class InitialPurchaseModal(discord.ui.Modal):
     def __init__(self):
@@ -27,7 +94,15 @@ class InitialPurchaseModal(discord.ui.Modal):
         )
         self.add_item(self.coupon)
 
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return not await reject_if_closing(interaction)
+
     async def on_submit(self, interaction: discord.Interaction):
+        # Tracked so a shutdown waits for the speculative invoice and the reply
+        async with interaction.client.lifecycle.track():
+            await self._submit(interaction)
+
+    async def _submit(self, interaction: discord.Interaction):
         try:
             # Validate email
             if not re.match(r"[^@]+@[^@]+\.[^@]+", self.email.value):
@@ -37,29 +112,66 @@ class InitialPurchaseModal(discord.ui.Modal):
                 )
                 return
 
+            tenant = interaction.client.tenants.for_guild(interaction.guild_id)
+            catalog = tenant.catalog
+            coupons = tenant.coupons
+            product = catalog.get_product("GENERATOR")
+
+            # Check the coupon locally so a bad code never reaches checkout
+            coupon_code = self.coupon.value.strip() if self.coupon.value else None
+            coupon = None
+            if coupon_code:
+                coupon, error = coupons.validate(coupon_code, product["id"] if product else None)
+                if error:
+                    await interaction.response.send_message(
+                        f"❌ {error} Please check the code or leave it empty.",
+                        ephemeral=True
+                    )
+                    return
+                if coupon:
+                    coupon_code = coupon["code"]
+
             # Create embed
             embed = discord.Embed(
                 title="🛒 Purchase Generator Access",
-                description="Please select your payment method below.",
+                description="Please select your plan and payment method below.",
                 color=discord.Color.blue()
             )
 
+            # Add available plans with live prices and stock
+            plans = []
+            for variant in catalog.get_variants("GENERATOR").values():
+                stock = catalog.stock_label(variant)
+                plans.append(
+                    f"{variant['emoji']} **{variant['name']}** - {format_price(coupons, product, variant, coupon_code)}"
+                    + (f" ({stock})" if stock else "")
+                )
+            embed.add_field(name="Plans", value="\n".join(plans) or "None available", inline=False)
+
             # Add order details
             embed.add_field(
                 name="Order Details",
                 value=(
                     f"**Email:** {self.email.value}\n"
-                    f"**Coupon:** {self.coupon.value if self.coupon.value else 'None'}"
+                    f"**Coupon:** {f'{coupon_code} ({coupons.describe(coupon)})' if coupon else coupon_code or 'None'}"
                 ),
                 inline=False
             )
 
-            # Create view with payment options
-            view = PurchaseView(
-                product_name="GENERATOR",
-                email=self.email.value,
-                coupon=self.coupon.value if self.coupon.value else None
+            # Remember the order details for the persistent purchase view
+            session = {
+                "product_name": "GENERATOR",
+                "email": self.email.value,
+                "coupon": coupon_code,
+                "variant_key": catalog.default_variant_key("GENERATOR")
+            }
+            interaction.client.db.save_purchase_session(
+                discord_id=str(interaction.user.id), ttl_hours=PURCHASE_SESSION_TTL_HOURS, **session
             )
+            speculate_invoice(interaction.client, interaction.user.id, session, tenant)
+
+            view = tenant.purchase_view
+            view.sync_options()
 
             # Send response
             await interaction.response.send_message(
@@ -84,7 +196,8 @@ class InitialPurchaseModal(discord.ui.Modal):
 
 class PaymentLinkView(discord.ui.View):
     def __init__(self, url: str):
-        super().__init__()
+        # Link buttons never dispatch interactions, so there's nothing to time out
+        super().__init__(timeout=None)
         self.add_item(discord.ui.Button(
             label="Click Here to Pay", 
             url=url, 
@@ -92,14 +205,82 @@ class PaymentLinkView(discord.ui.View):
         ))
 
 class PurchaseView(discord.ui.View):
-    def __init__(self, product_name: str, email: str, coupon: str = None):
-        super().__init__()
+    """Persistent purchase menu, registered once with bot.add_view.
+
+    One instance per tenant is attached to every /buy message in that tenant's guild.
+    Per-user state (email, coupon, chosen plan) lives in the purchase_sessions table, so
+    menus keep working after a restart.
+    """
+
+    def __init__(self, tenant, product_name: str = "GENERATOR"):
+        super().__init__(timeout=None)
+        self.tenant = tenant
+        self.catalog = tenant.catalog
         self.product_name = product_name
-        self.email = email
-        self.coupon = coupon
+        self.catalog_version = None
+        if tenant.id != DEFAULT_TENANT_ID:
+            # Custom ids are global to the bot, so each tenant's menu needs its own
+            self.variant_select.custom_id = f"purchase:variant:{tenant.id}"
+            self.payment_select.custom_id = f"purchase:payment:{tenant.id}"
+        self.sync_options()
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return not await reject_if_closing(interaction)
+
+    def sync_options(self):
+        """Rebuild the plan options if the catalog changed since the last render"""
+        if self.catalog_version != self.catalog.version:
+            self.variant_select.options = build_variant_options(self.catalog, self.product_name)
+            self.catalog_version = self.catalog.version
+
+    @discord.ui.select(
+        placeholder="Choose your plan",
+        custom_id="purchase:variant",
+        options=[discord.SelectOption(label="Loading plans...", value="MONTHLY")]
+    )
+    async def variant_select(self, interaction: discord.Interaction, select: discord.ui.Select):
+        """Remember the chosen plan"""
+        variant_key = select.values[0]
+        variant = self.catalog.get_variant(self.product_name, variant_key)
+        if not variant or not self.catalog.in_stock(variant):
+            await interaction.response.send_message(
+                "❌ That plan is out of stock right now. Please pick another one.",
+                ephemeral=True
+            )
+            return
+
+        if not interaction.client.db.set_session_variant(str(interaction.user.id), variant_key):
+            await interaction.response.send_message(SESSION_EXPIRED_MESSAGE, ephemeral=True)
+            return
+
+        session = interaction.client.db.get_purchase_session(str(interaction.user.id))
+        if session:
+            speculate_invoice(interaction.client, interaction.user.id, session, self.tenant)
+
+        embed = interaction.message.embeds[0] if interaction.message and interaction.message.embeds else None
+        if embed:
+            for index, field in enumerate(embed.fields):
+                if field.name == "Selected Plan":
+                    embed.remove_field(index)
+                    break
+            price = format_price(
+                self.tenant.coupons,
+                self.catalog.get_product(self.product_name),
+                variant,
+                session["coupon"] if session else None
+            )
+            embed.add_field(
+                name="Selected Plan",
+                value=f"{variant['emoji']} **{variant['name']}** - {price}",
+                inline=False
+            )
+            await interaction.response.edit_message(embed=embed)
+        else:
+            await interaction.response.defer()
 
     @discord.ui.select(
         placeholder="Choose your payment method",
+        custom_id="purchase:payment",
         options=[
             discord.SelectOption(
                 label="Credit/Debit Card",
@@ -124,32 +305,47 @@ class PurchaseView(discord.ui.View):
         ]
     )
     async def payment_select(self, interaction: discord.Interaction, select: discord.ui.Select):
-        """Handle payment method selection"""
+        """Handle payment method selection, tracked so a shutdown doesn't cut off invoice creation"""
+        async with interaction.client.lifecycle.track():
+            await self._payment_select(interaction, select)
+
+    async def _payment_select(self, interaction: discord.Interaction, select: discord.ui.Select):
         try:
             await interaction.response.defer(ephemeral=True)
             
+            session = interaction.client.db.get_purchase_session(str(interaction.user.id))
+            if not session:
+                await interaction.followup.send(SESSION_EXPIRED_MESSAGE, ephemeral=True)
+                return
+
+            catalog = self.catalog
             payment_method = PAYMENT_METHODS[select.values[0]]
-            variant_data = PRODUCTS[self.product_name]["variants"]["MONTHLY"]
+            product = catalog.get_product(session["product_name"])
+            variant_key = session["variant_key"] or catalog.default_variant_key(session["product_name"])
+            variant_data = catalog.get_variant(session["product_name"], variant_key)
+            if not variant_data or not catalog.in_stock(variant_data):
+                await interaction.edit_original_response(
+                    content="❌ The selected plan is out of stock. Please pick another one.",
+                    embed=None,
+                    view=None
+                )
+                return
             
-            checkout_data = {
-                "cart": [{
-                    "productId": PRODUCTS[self.product_name]["id"],
-                    "variantId": variant_data["id"],
-                    "quantity": 1
-                }],
-                "gateway": payment_method["gateway"],
-                "email": self.email
-            }
-
-            if self.coupon:
-                checkout_data["coupon"] = self.coupon
-
-            invoice = await interaction.client.create_sellauth_invoice(
-                user_id=str(interaction.user.id),
-                product_id=PRODUCTS[self.product_name]["id"],
-                checkout_data=checkout_data
+            checkout_data = build_checkout_data(
+                product, variant_data, payment_method["gateway"], session["email"], session["coupon"]
             )
 
+            # Use the invoice started when the modal was submitted if the guess was right
+            invoice = await interaction.client.speculator.claim(str(interaction.user.id), checkout_data, self.tenant)
+            speculative_hit = invoice is not None
+            if not invoice:
+                invoice = await interaction.client.create_sellauth_invoice(
+                    user_id=str(interaction.user.id),
+                    product_id=product["id"],
+                    checkout_data=checkout_data,
+                    tenant=self.tenant
+                )
+
             if invoice:
                 if payment_method["gateway"] == "LTC":
                     embed = discord.Embed(
@@ -183,7 +379,7 @@ class PurchaseView(discord.ui.View):
                             f"**Product:** {variant_data['name']}\n"
                             f"**Price:** ${variant_data['amount']}\n"
                             f"**Payment Method:** {payment_method['name']}\n"
-                            f"**Email:** {self.email}\n"
+                            f"**Email:** {session['email']}\n"
                             f"**Discord ID:** {interaction.user.id}"
                         ),
                         inline=False
@@ -216,12 +412,43 @@ class PurchaseView(discord.ui.View):
                     embed=embed,
                     view=payment_view
                 )
+
+                elapsed = (discord.utils.utcnow() - interaction.created_at).total_seconds()
+                record_timing("payment_link", elapsed)
+                record_timing("payment_link.speculative" if speculative_hit else "payment_link.direct", elapsed)
+                print(f"Payment link latency {elapsed:.2f}s (speculative={speculative_hit}), {timings['payment_link'].summary()}")
+
+                # Crypto details arrive after the link is already on screen
+                if invoice.get("crypto_details"):
+                    try:
+                        details = await invoice["crypto_details"]
+                    except SellAuthUnavailable:
+                        details = None  # The link alone is enough to pay
+                    if details and details.get("crypto_address"):
+                        embed.add_field(
+                            name="Send Exactly",
+                            value=f"`{details.get('crypto_amount')}` {invoice['currency']}",
+                            inline=False
+                        )
+                        embed.add_field(
+                            name="To Address",
+                            value=f"`{details['crypto_address']}`",
+                            inline=False
+                        )
+                        await interaction.edit_original_response(embed=embed, view=payment_view)
             else:
                 await interaction.edit_original_response(
                     content="❌ Error creating payment link. Please try again.",
                     view=None
                 )
 
+        except SellAuthUnavailable as e:
+            print(f"SellAuth unavailable in payment_select: {e}")
+            await interaction.edit_original_response(
+                content=SELLAUTH_DOWN_MESSAGE,
+                embed=None,
+                view=None
+            )
         except Exception as e:
             print(f"Error in payment_select: {str(e)}")
             try:
@@ -243,9 +470,97 @@ class Commands(commands.Cog):
     @app_commands.command(name="buy", description="Purchase Generator Access")
     async def buy(self, interaction: discord.Interaction):
         """Start the purchase process"""
+        if self.bot.tenants.for_guild(interaction.guild_id).sellauth.breaker.is_open():
+            await interaction.response.send_message(SELLAUTH_DOWN_MESSAGE, ephemeral=True)
+            return
+
         modal = InitialPurchaseModal()
         await interaction.response.send_modal(modal)
 
+    @app_commands.command(name="status", description="Check the status of your orders")
+    @app_commands.describe(invoice_id="Invoice ID to check (leave empty to list your recent orders)")
+    async def status(self, interaction: discord.Interaction, invoice_id: str = None):
+        """Answer order status questions from local data, falling back to cached SellAuth lookups"""
+        user_id = str(interaction.user.id)
+        now = time.monotonic()
+        remaining = self.bot.STATUS_CHECK_COOLDOWN - (now - self.bot.last_status_check[user_id])
+        if remaining > 0:
+            await interaction.response.send_message(
+                f"⏳ Please wait {int(remaining) + 1}s before checking again.",
+                ephemeral=True
+            )
+            return
+        self.bot.last_status_check[user_id] = now
+
+        await interaction.response.defer(ephemeral=True)
+
+        embed = discord.Embed(title="📋 Order Status", color=discord.Color.blue())
+        if invoice_id:
+            invoice_ids = [invoice_id.strip()]
+        else:
+            invoice_ids = [
+                i for tenant in self.bot.tenants for i, owner in tenant.active_invoices.items() if str(owner) == user_id
+            ]
+            invoice_ids += [row[0] for row in self.bot.db.get_user_subscriptions(user_id)]
+
+        if not invoice_ids:
+            embed.description = "You don't have any orders yet. Use `/buy` to get started!"
+        for current_id in invoice_ids[:10]:
+            name, value = await self._describe_invoice(user_id, str(current_id), interaction.guild_id)
+            embed.add_field(name=name, value=value, inline=False)
+
+        await interaction.followup.send(embed=embed, ephemeral=True)
+
+    async def _describe_invoice(self, user_id: str, invoice_id: str, guild_id: int = None):
+        """Return an embed field (name, value) describing one invoice"""
+        # Completed orders are in the local store, no API call needed
+        subscription = self.bot.db.get_subscription_by_invoice(invoice_id)
+        if subscription:
+            owner, purchase_date, expiry_date = subscription
+            if str(owner) != user_id:
+                return f"Invoice `{invoice_id}`", "❌ Not found"
+            expiry = datetime.fromisoformat(str(expiry_date))
+            return (
+                f"✅ Invoice `{invoice_id}`",
+                f"**Status:** Completed\n**Expires:** <t:{int(expiry.timestamp())}:R>"
+            )
+
+        # Pending orders: SellAuth invoice ids are ints in active_invoices
+        key = int(invoice_id) if invoice_id.isdigit() else invoice_id
+        tenant = self.bot.tenants.for_invoice(key) or self.bot.tenants.for_guild(guild_id)
+        owner = tenant.active_invoices.get(key)
+        try:
+            invoice_data = await tenant.sellauth.get_invoice(invoice_id)
+        except SellAuthUnavailable:
+            return f"Invoice `{invoice_id}`", "⏳ Status temporarily unavailable, please try again later."
+
+        if not invoice_data or str(invoice_data.get("discord_user_id") or owner) != user_id:
+            return f"Invoice `{invoice_id}`", "❌ Not found"
+
+        status = str(invoice_data.get("status", "unknown"))
+        return (
+            f"{EMOJIS['pending'] if status == 'pending' else EMOJIS['info']} Invoice `{invoice_id}`",
+            f"**Status:** {status.title()}\n**Amount:** ${invoice_data.get('price_usd', '0.00')} USD"
+        )
+
+    @app_commands.command(name="history", description="View your purchase history")
+    async def history(self, interaction: discord.Interaction):
+        """Page through your own purchases"""
+        await self._send_history(interaction, interaction.user)
+
+    @app_commands.command(name="userhistory", description="View a user's purchase history")
+    @app_commands.default_permissions(administrator=True)
+    @app_commands.describe(user="The user to look up")
+    async def userhistory(self, interaction: discord.Interaction, user: discord.User):
+        """Page through a user's purchases from this guild's shop (admin only)"""
+        tenant = self.bot.tenants.for_guild(interaction.guild_id)
+        await self._send_history(interaction, user, tenant.id)
+
+    async def _send_history(self, interaction: discord.Interaction, target: discord.abc.User, tenant_id: str = None):
+        view = HistoryView(self.bot.db, target, interaction.user.id, tenant_id)
+        view.load_page()
+        await interaction.response.send_message(embed=view.build_embed(), view=view, ephemeral=True)
+
     @app_commands.command(name="sync", description="Sync all slash commands")
     @app_commands.default_permissions(administrator=True)
     async def sync(self, interaction: discord.Interaction):
@@ -263,5 +578,11 @@ class Commands(commands.Cog):
             await interaction.followup.send(f"❌ Error syncing commands: {str(e)}", ephemeral=True)
 
 async def setup(bot: ZwiftsBot):
+    # Register persistent views once so menus keep working across restarts
+    for tenant in bot.tenants:
+        tenant.purchase_view = PurchaseView(tenant)
+        bot.add_view(tenant.purchase_view)
+    bot.purchase_view = bot.tenants.default.purchase_view
+
     await bot.add_cog(Commands(bot))
     print("Commands cog loaded")
\ No newline at end of file
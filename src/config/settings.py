@@ -46,6 +46,121 @@ except ValueError:
 SELLAUTH_API_BASE = "https://api.sellauth.com/v1"
 STRIPE_API_KEY = os.getenv("STRIPE_API_KEY")
 
+# SellAuth resilience: request timeout and circuit breaker thresholds
+SELLAUTH_TIMEOUT = float(os.getenv("SELLAUTH_TIMEOUT", 10))
+SELLAUTH_BREAKER_FAILURE_RATE = float(os.getenv("SELLAUTH_BREAKER_FAILURE_RATE", 0.5))
+SELLAUTH_BREAKER_MIN_CALLS = int(os.getenv("SELLAUTH_BREAKER_MIN_CALLS", 5))
+SELLAUTH_BREAKER_OPEN_SECONDS = float(os.getenv("SELLAUTH_BREAKER_OPEN_SECONDS", 60))
+
+# Seconds a SellAuth invoice response is reused before asking the API again, and how many are kept per shop
+INVOICE_CACHE_TTL = float(os.getenv("INVOICE_CACHE_TTL", 10))
+INVOICE_CACHE_SIZE = int(os.getenv("INVOICE_CACHE_SIZE", 1000))
+
+# Invoice polling bounds (seconds)
+POLL_MIN_SECONDS = 10
+POLL_BASE_SECONDS = 30
+POLL_MAX_SECONDS = 120
+POLL_TARGET_LATENCY = 1.0
+
+# Max invoices polled per tenant on each tick, so one busy shop can't starve the others
+POLL_TENANT_BATCH = int(os.getenv("POLL_TENANT_BATCH", 20))
+
+# How long (seconds) the SellAuth product catalog is considered fresh
+CATALOG_TTL = int(os.getenv("CATALOG_TTL", 300))
+
+# How often (minutes) valid coupons are re-synced from SellAuth for local validation
+COUPON_SYNC_MINUTES = int(os.getenv("COUPON_SYNC_MINUTES", 10))
+
+# Poll constants/views/cogs for changes and hot-reload them every N seconds (0 disables watching)
+RELOAD_WATCH_SECONDS = int(os.getenv("RELOAD_WATCH_SECONDS", 0))
+
+# Customer role queue: seconds between role edits and minutes between reconciliation sweeps
+ROLE_OP_INTERVAL = float(os.getenv("ROLE_OP_INTERVAL", 0.5))
+ROLE_RECONCILE_MINUTES = int(os.getenv("ROLE_RECONCILE_MINUTES", 60))
+# Reconciliation only grants missing roles unless ROLE_RECONCILE_REVOKE is on, and then revokes at most
+# ROLE_RECONCILE_MAX_REVOKES per run. Role holders with no subscription on record (bought before orders
+# were recorded, or granted by hand) get a backfilled one lasting ROLE_BACKFILL_DAYS instead of being revoked
+ROLE_RECONCILE_REVOKE = os.getenv("ROLE_RECONCILE_REVOKE", "false").lower() == "true"
+ROLE_RECONCILE_MAX_REVOKES = int(os.getenv("ROLE_RECONCILE_MAX_REVOKES", 25))
+ROLE_BACKFILL_DAYS = int(os.getenv("ROLE_BACKFILL_DAYS", 30))
+
+# Expiry enforcement: sweep interval and rows per transaction
+EXPIRY_CHECK_MINUTES = int(os.getenv("EXPIRY_CHECK_MINUTES", 5))
+EXPIRY_BATCH_SIZE = int(os.getenv("EXPIRY_BATCH_SIZE", 100))
+
+# Expiry reminders: how far ahead to remind, sweep interval, page size and concurrent DMs
+REMINDER_LEAD_DAYS = int(os.getenv("REMINDER_LEAD_DAYS", 2))
+REMINDER_CHECK_MINUTES = int(os.getenv("REMINDER_CHECK_MINUTES", 60))
+REMINDER_BATCH_SIZE = int(os.getenv("REMINDER_BATCH_SIZE", 50))
+REMINDER_CONCURRENCY = int(os.getenv("REMINDER_CONCURRENCY", 5))
+
+# Outbound Discord REST scheduler: per-route concurrency, and 429 handling for low-priority sends
+OUTBOUND_ROUTE_LIMITS = {
+    "dm": int(os.getenv("OUTBOUND_DM_CONCURRENCY", 5)),
+    "roles": int(os.getenv("OUTBOUND_ROLE_CONCURRENCY", 2)),
+}
+OUTBOUND_MAX_RETRIES = int(os.getenv("OUTBOUND_MAX_RETRIES", 3))
+OUTBOUND_BACKOFF_SECONDS = float(os.getenv("OUTBOUND_BACKOFF_SECONDS", 5))
+
+# Failed purchase DMs: retried with exponential backoff (base doubling per attempt, capped at max)
+# and dead-lettered after DELIVERY_MAX_ATTEMPTS; the worker sweeps every DELIVERY_RETRY_INTERVAL seconds
+DELIVERY_RETRY_BASE_SECONDS = float(os.getenv("DELIVERY_RETRY_BASE_SECONDS", 60))
+DELIVERY_RETRY_MAX_SECONDS = float(os.getenv("DELIVERY_RETRY_MAX_SECONDS", 6 * 3600))
+DELIVERY_MAX_ATTEMPTS = int(os.getenv("DELIVERY_MAX_ATTEMPTS", 8))
+DELIVERY_RETRY_INTERVAL = int(os.getenv("DELIVERY_RETRY_INTERVAL", 30))
+DELIVERY_RETRY_BATCH = int(os.getenv("DELIVERY_RETRY_BATCH", 50))
+
+# Gateway cache policy. Members are only needed for customer roles, so by default none are cached
+# or chunked up front; they're fetched on demand through a small LRU (MEMBER_LRU_SIZE entries)
+INTENT_MEMBERS = os.getenv("INTENT_MEMBERS", "true").lower() == "true"
+INTENT_MESSAGE_CONTENT = os.getenv("INTENT_MESSAGE_CONTENT", "false").lower() == "true"
+MEMBER_CACHE_FLAGS = os.getenv("MEMBER_CACHE_FLAGS", "none").lower()  # none | joined | all
+CHUNK_GUILDS_AT_STARTUP = os.getenv("CHUNK_GUILDS_AT_STARTUP", "false").lower() == "true"
+MESSAGE_CACHE_SIZE = int(os.getenv("MESSAGE_CACHE_SIZE", 0))  # 0 disables the message cache
+MEMBER_LRU_SIZE = int(os.getenv("MEMBER_LRU_SIZE", 1000))
+MEMBER_LRU_TTL = int(os.getenv("MEMBER_LRU_TTL", 600))
+
+# Gateway sharding: "off" (one connection) or "auto" (every shard in this process, SHARD_COUNT of
+# them or Discord's recommendation if 0). launcher.py sets SHARD_COUNT/SHARD_IDS to split shards across processes
+SHARDING = os.getenv("SHARDING", "off").lower()
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", 0))
+SHARD_IDS = [int(shard_id) for shard_id in os.getenv("SHARD_IDS", "").split(",") if shard_id.strip()]
+
+# On-demand profiler (/profile and GET /debug/profile): sampling interval and max duration. The HTTP route
+# is served on its own 127.0.0.1:PROFILE_PORT listener (0 disables it), never on the proxied webhook port
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", 0.005))
+PROFILE_MAX_SECONDS = int(os.getenv("PROFILE_MAX_SECONDS", 60))
+PROFILE_PORT = int(os.getenv("PROFILE_PORT", 8081))
+
+# Event loop watchdog: heartbeat interval, lag that counts as a stall, and how many offenders to keep
+WATCHDOG_INTERVAL = float(os.getenv("WATCHDOG_INTERVAL", 0.1))
+WATCHDOG_THRESHOLD = float(os.getenv("WATCHDOG_THRESHOLD", 0.25))
+WATCHDOG_KEEP = int(os.getenv("WATCHDOG_KEEP", 20))
+
+# Seconds a shutdown may spend draining in-flight work before loops are cancelled
+SHUTDOWN_DEADLINE = float(os.getenv("SHUTDOWN_DEADLINE", 25))
+
+# Payment ledger group commit: max seconds an event waits in memory, and max events per batch
+LEDGER_FLUSH_INTERVAL = float(os.getenv("LEDGER_FLUSH_INTERVAL", 0.005))
+LEDGER_MAX_BATCH = int(os.getenv("LEDGER_MAX_BATCH", 500))
+
+# Write-behind buffer for small DB writes (button keys, new subscriptions)
+WRITE_BEHIND_INTERVAL = float(os.getenv("WRITE_BEHIND_INTERVAL", 0.05))
+WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", 200))
+
+# Button keys: rows expire after BUTTON_KEY_TTL_DAYS and are purged in batches; lookups go through an in-memory LRU
+BUTTON_KEY_TTL_DAYS = int(os.getenv("BUTTON_KEY_TTL_DAYS", 30))
+BUTTON_KEY_CACHE_SIZE = int(os.getenv("BUTTON_KEY_CACHE_SIZE", 2048))
+BUTTON_KEY_CACHE_TTL = int(os.getenv("BUTTON_KEY_CACHE_TTL", 3600))
+BUTTON_KEY_PURGE_MINUTES = int(os.getenv("BUTTON_KEY_PURGE_MINUTES", 60))
+BUTTON_KEY_PURGE_BATCH = int(os.getenv("BUTTON_KEY_PURGE_BATCH", 500))
+
+# /buy sessions (email, coupon, plan) expire after PURCHASE_SESSION_TTL_HOURS and are purged with the button keys
+PURCHASE_SESSION_TTL_HOURS = float(os.getenv("PURCHASE_SESSION_TTL_HOURS", 24))
+
+# Seconds an unclaimed speculative invoice is kept before being discarded
+SPECULATIVE_INVOICE_TTL = int(os.getenv("SPECULATIVE_INVOICE_TTL", 600))
+
 # File paths
 # KEYS_FILE = "product_keys.json"
 # BACKUP_DIR = "backups"
@@ -54,5 +169,18 @@ STRIPE_API_KEY = os.getenv("STRIPE_API_KEY")
 # Add database configuration
 DATABASE_PATH = "database.db"
 
+# Cold data archival: rows older than ARCHIVE_AFTER_DAYS move to the archive DB in batches
+ARCHIVE_DATABASE_PATH = os.getenv("ARCHIVE_DATABASE_PATH", "archive.db")
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", 90))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", 500))
+ARCHIVE_INTERVAL_HOURS = int(os.getenv("ARCHIVE_INTERVAL_HOURS", 24))
+
+# Online backups: where snapshots go, how many to keep and how gently to copy
+BACKUP_DIR = os.getenv("BACKUP_DIR", "backups")
+BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", 14))
+BACKUP_INTERVAL_HOURS = int(os.getenv("BACKUP_INTERVAL_HOURS", 6))
+BACKUP_PAGES_PER_STEP = int(os.getenv("BACKUP_PAGES_PER_STEP", 64))
+BACKUP_STEP_SLEEP = float(os.getenv("BACKUP_STEP_SLEEP", 0.01))
+
 # Add this with your other environment variables
 WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET') 
\ No newline at end of file
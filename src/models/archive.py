@@ -0,0 +1,113 @@
+import logging
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from src.models.database import Database
+
+
+# table -> (id column, SQL condition selecting cold rows; ? is the cutoff timestamp)
+ARCHIVE_RULES = {
+    "keys": ("id", "used = TRUE AND used_at < ?"),
+    "button_keys": ("invoice_id", "expires_at IS NULL AND (created_at IS NULL OR created_at < ?)"),  # Rows with a TTL are purged instead
+    "purchases": ("id", "purchase_date < ? AND expiry_date < CURRENT_TIMESTAMP"),
+}
+
+
+class Archiver:
+    """Moves cold rows from the hot database into the attached archive database.
+
+    Used keys, old button keys and lapsed purchases older than `after_days` are copied
+    and deleted in batches of `batch_size`, one transaction per batch, then the freed
+    pages are handed back with incremental vacuum. Lookups in Database read through
+    to the archive, so nothing disappears from the user's point of view.
+    """
+
+    def __init__(self, db: Database, after_days: int, batch_size: int):
+        self.db = db
+        self.after_days = after_days
+        self.batch_size = batch_size
+
+    def ensure_archive_schema(self):
+        """Create archive tables mirroring the hot tables' columns"""
+        with self.db.connect() as conn:
+            conn.execute("ATTACH DATABASE ? AS archive", (self.db.archive_path,))
+            for table in ARCHIVE_RULES:
+                conn.execute(f"CREATE TABLE IF NOT EXISTS archive.{table} AS SELECT * FROM main.{table} WHERE 0")
+                hot = self._columns(conn, "main", table)
+                cold = self._columns(conn, "archive", table)
+                for column in hot:
+                    if column not in cold:
+                        conn.execute(f"ALTER TABLE archive.{table} ADD COLUMN {column}")
+            conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS archive.idx_archive_keys_id ON keys (id)")
+            conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS archive.idx_archive_button_keys ON button_keys (invoice_id)")
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS archive.idx_archive_purchases_user_date
+                ON purchases (discord_id, purchase_date DESC, id DESC)
+            """)
+            conn.commit()
+
+    def enable_incremental_vacuum(self) -> bool:
+        """Switch the hot DB to incremental auto-vacuum (a one-off full VACUUM).
+
+        The VACUUM rewrites the whole file under the write lock, so it runs before the
+        bot connects (or offline via maintenance.sh), never from the archive loop.
+        Returns False if another process held the database and it has to wait for the next start.
+        """
+        conn = sqlite3.connect(self.db.db_path, isolation_level=None)
+        try:
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+                return True
+            print("Enabling incremental vacuum on the hot database...")
+            started = time.monotonic()
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+            print(f"Incremental vacuum enabled in {time.monotonic() - started:.1f}s")
+            return True
+        except sqlite3.OperationalError as e:
+            logging.error(f"Could not enable incremental vacuum, retrying on the next start: {e}")
+            return False
+        finally:
+            conn.close()
+
+    def archive_batch(self, table: str) -> int:
+        """Move one batch of cold rows for `table`, returns how many were moved"""
+        id_column, condition = ARCHIVE_RULES[table]
+        cutoff = datetime.now() - timedelta(days=self.after_days)
+        try:
+            with self.db.connect(attach_archive=True) as conn:
+                ids = [row[0] for row in conn.execute(
+                    f"SELECT {id_column} FROM main.{table} WHERE {condition} LIMIT ?",
+                    (cutoff, self.batch_size)
+                )]
+                if not ids:
+                    return 0
+
+                columns = ", ".join(self._columns(conn, "main", table))
+                placeholders = ", ".join("?" * len(ids))
+                conn.execute(
+                    f"INSERT OR REPLACE INTO archive.{table} ({columns}) "
+                    f"SELECT {columns} FROM main.{table} WHERE {id_column} IN ({placeholders})",
+                    ids
+                )
+                conn.execute(f"DELETE FROM main.{table} WHERE {id_column} IN ({placeholders})", ids)
+                conn.commit()
+                return len(ids)
+        except Exception as e:
+            logging.error(f"Failed to archive {table}: {e}")
+            return 0
+
+    def incremental_vacuum(self, pages: int = 1000):
+        conn = sqlite3.connect(self.db.db_path, isolation_level=None)
+        try:
+            conn.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _columns(conn, schema: str, table: str) -> list:
+        return [row[1] for row in conn.execute(f"PRAGMA {schema}.table_info({table})")]
+
+
+if __name__ == "__main__":
+    from src.config.settings import DATABASE_PATH, ARCHIVE_DATABASE_PATH, ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE
+    Archiver(Database(DATABASE_PATH, ARCHIVE_DATABASE_PATH), ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE).enable_incremental_vacuum()
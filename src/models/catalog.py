@@ -0,0 +1,164 @@
+import asyncio
+import copy
+import re
+import time
+from typing import Dict, Optional
+from src.config.constants import PRODUCTS
+from src.config.settings import CATALOG_TTL
+from src.utils.sellauth_client import SellAuthUnavailable
+
+
+class ProductCatalog:
+    """In-memory product catalog synced from SellAuth.
+
+    Starts from the hard-coded PRODUCTS (which still provide emojis, descriptions and
+    perks) and overlays live names, prices and stock counts from the API. Reads never
+    touch the network: a stale catalog is served as-is while a refresh runs in the
+    background (stale-while-revalidate).
+    """
+
+    def __init__(self, client, seed: dict = None, ttl: int = CATALOG_TTL):
+        self.client = client
+        self.ttl = ttl
+        self.products = copy.deepcopy(seed if seed is not None else PRODUCTS)
+        self.fetched_at = 0.0
+        self.version = 0  # Bumped whenever prices/stock change, lets views re-render lazily
+        self.etag = None
+        self.last_modified = None
+        self._remote_products = None  # Last product list from SellAuth, re-applied on reseed
+        self._refresh_task = None
+
+    @property
+    def is_stale(self) -> bool:
+        return time.monotonic() - self.fetched_at > self.ttl
+
+    def get_product(self, product_name: str) -> Optional[dict]:
+        self.ensure_fresh()
+        return self.products.get(product_name)
+
+    def get_variants(self, product_name: str) -> Dict[str, dict]:
+        product = self.get_product(product_name)
+        return product["variants"] if product else {}
+
+    def get_variant(self, product_name: str, variant_key: str) -> Optional[dict]:
+        return self.get_variants(product_name).get(variant_key)
+
+    def default_variant_key(self, product_name: str) -> Optional[str]:
+        """MONTHLY if it's in stock, otherwise the first variant that is"""
+        variants = self.get_variants(product_name)
+        if "MONTHLY" in variants and self.in_stock(variants["MONTHLY"]):
+            return "MONTHLY"
+        for key, variant in variants.items():
+            if self.in_stock(variant):
+                return key
+        return next(iter(variants), None)
+
+    def find_variant_key(self, variant_id) -> Optional[str]:
+        """Map a SellAuth variant id back to its catalog key (e.g. MONTHLY)"""
+        for product in self.products.values():
+            for key, variant in product["variants"].items():
+                if str(variant["id"]) == str(variant_id):
+                    return key
+        return None
+
+    def duration_days(self, variant_id=None, name: str = "") -> int:
+        """Subscription length of a variant, read from names like 'Generator [30 Days]'"""
+        for product in self.products.values():
+            for variant in product["variants"].values():
+                if variant_id is not None and str(variant["id"]) == str(variant_id):
+                    name = variant["name"]
+        match = re.search(r"(\d+)\s*Days?", name or "", re.IGNORECASE)
+        if match:
+            return int(match.group(1))
+        return 30 if "MONTHLY" in (name or "").upper() else 7
+
+    @staticmethod
+    def in_stock(variant: dict) -> bool:
+        stock = variant.get("stock")
+        return stock is None or stock < 0 or stock > 0
+
+    @staticmethod
+    def stock_label(variant: dict) -> str:
+        stock = variant.get("stock")
+        if stock is None or stock < 0:
+            return ""
+        if stock == 0:
+            return "Out of stock"
+        return f"{stock} left"
+
+    def ensure_fresh(self):
+        """Kick off a background refresh if the catalog is stale, without waiting for it"""
+        if not self.fetched_at:
+            return  # First load is owned by the bot's refresh loop
+        if self.is_stale and (self._refresh_task is None or self._refresh_task.done()):
+            try:
+                self._refresh_task = asyncio.get_running_loop().create_task(self.refresh())
+            except RuntimeError:
+                pass  # No running loop (e.g. import time), the periodic task will refresh
+
+    async def refresh(self) -> bool:
+        """Fetch products from SellAuth and merge them into the catalog"""
+        try:
+            status, products, headers = await self.client.get_products(self.etag, self.last_modified)
+        except SellAuthUnavailable as e:
+            print(f"Catalog refresh skipped: {e}")
+            return False
+
+        if status == 304:
+            self.fetched_at = time.monotonic()
+            return True
+        if status != 200 or not isinstance(products, list):
+            print(f"Catalog refresh failed with status {status}")
+            return False
+
+        self._merge(products)
+        self._remote_products = products
+        self.version += 1
+        self.etag = headers.get("ETag")
+        self.last_modified = headers.get("Last-Modified")
+        self.fetched_at = time.monotonic()
+        print(f"Catalog refreshed: {sum(len(p['variants']) for p in self.products.values())} variants")
+        return True
+
+    def reseed(self, seed: dict):
+        """Swap in new hard-coded products (after a constants reload), keeping live data"""
+        self.products = copy.deepcopy(seed)
+        if self._remote_products:
+            self._merge(self._remote_products)
+        self.version += 1
+
+    def _merge(self, remote_products: list):
+        by_id = {str(p.get("id")): p for p in remote_products}
+        for product in self.products.values():
+            remote = by_id.get(str(product["id"]))
+            if not remote:
+                continue
+
+            remote_variants = {str(v.get("id")): v for v in remote.get("variants") or []}
+            for variant in product["variants"].values():
+                remote_variant = remote_variants.pop(str(variant["id"]), None)
+                if remote_variant:
+                    self._apply_variant(variant, remote_variant)
+
+            # Variants created on SellAuth after the last deploy
+            for variant_id, remote_variant in remote_variants.items():
+                key = str(remote_variant.get("name") or variant_id).upper().replace(" ", "_")
+                variant = {
+                    "id": variant_id,
+                    "name": remote_variant.get("name") or key,
+                    "description": remote_variant.get("description") or product["description"],
+                    "emoji": product["emoji"],
+                    "amount": "0.00",
+                    "perks": []
+                }
+                self._apply_variant(variant, remote_variant)
+                product["variants"][key] = variant
+
+    @staticmethod
+    def _apply_variant(variant: dict, remote_variant: dict):
+        if remote_variant.get("name"):
+            variant["name"] = remote_variant["name"]
+        if remote_variant.get("price") is not None:
+            variant["amount"] = f"{float(remote_variant['price']):.2f}"
+        if remote_variant.get("stock_count") is not None:
+            variant["stock"] = int(remote_variant["stock_count"])
@@ -0,0 +1,107 @@
+import time
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+from src.utils.sellauth_client import SellAuthUnavailable
+
+
+class CouponCache:
+    """Local copy of the shop's coupons, synced periodically from SellAuth.
+
+    Lets the purchase modal reject unknown, expired or used-up codes and show the
+    discounted price before an invoice is created. Until the first successful sync
+    every code is accepted and left for SellAuth to check at checkout.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.coupons = {}  # CODE -> normalised coupon dict
+        self.fetched_at = 0.0
+
+    @property
+    def synced(self) -> bool:
+        return bool(self.fetched_at)
+
+    async def refresh(self) -> bool:
+        try:
+            remote = await self.client.get_coupons()
+        except SellAuthUnavailable as e:
+            print(f"Coupon sync skipped: {e}")
+            return False
+        if remote is None:
+            return False
+
+        self.coupons = {}
+        for raw in remote:
+            coupon = self._normalise(raw)
+            if coupon:
+                self.coupons[coupon["code"].upper()] = coupon
+        self.fetched_at = time.monotonic()
+        print(f"Coupons synced: {len(self.coupons)} codes")
+        return True
+
+    def validate(self, code: str, product_id=None) -> Tuple[Optional[dict], Optional[str]]:
+        """Check a code locally, returns (coupon, None) or (None, error message)"""
+        if not self.synced:
+            return None, None  # Nothing to check against yet, SellAuth decides
+        coupon = self.coupons.get(code.strip().upper())
+        if not coupon:
+            return None, "That coupon code doesn't exist."
+        if coupon["disabled"]:
+            return None, "That coupon is no longer active."
+        if coupon["expires_at"] and coupon["expires_at"] < datetime.now(timezone.utc):
+            return None, "That coupon has expired."
+        if coupon["max_uses"] and coupon["uses"] >= coupon["max_uses"]:
+            return None, "That coupon has reached its usage limit."
+        if coupon["product_ids"] and product_id is not None and str(product_id) not in coupon["product_ids"]:
+            return None, "That coupon can't be used on this product."
+        return coupon, None
+
+    @staticmethod
+    def apply(coupon: Optional[dict], amount) -> float:
+        """Price after the coupon's discount, never below zero"""
+        amount = float(amount)
+        if not coupon:
+            return amount
+        if coupon["type"] == "percentage":
+            amount -= amount * coupon["discount"] / 100
+        else:
+            amount -= coupon["discount"]
+        return round(max(amount, 0.0), 2)
+
+    @staticmethod
+    def describe(coupon: dict) -> str:
+        if coupon["type"] == "percentage":
+            return f"{coupon['discount']:g}% off"
+        return f"${coupon['discount']:.2f} off"
+
+    @staticmethod
+    def _normalise(raw: dict) -> Optional[dict]:
+        code = raw.get("code")
+        if not code:
+            return None
+
+        expires_at = raw.get("expiration_date") or raw.get("expires_at")
+        if expires_at:
+            try:
+                expires_at = datetime.fromisoformat(str(expires_at).replace("Z", "+00:00"))
+                if expires_at.tzinfo is None:
+                    expires_at = expires_at.replace(tzinfo=timezone.utc)
+            except ValueError:
+                expires_at = None
+
+        products = raw.get("products") or raw.get("product_ids") or []
+        product_ids = {str(p.get("id") if isinstance(p, dict) else p) for p in products}
+        if raw.get("global"):
+            product_ids = set()
+
+        discount_type = str(raw.get("type") or raw.get("discount_type") or "percentage").lower()
+        return {
+            "code": str(code),
+            "type": "percentage" if discount_type.startswith("percent") else "fixed",
+            "discount": float(raw.get("discount") or 0),
+            "expires_at": expires_at or None,
+            "max_uses": int(raw.get("max_uses") or 0),
+            "uses": int(raw.get("uses") or raw.get("used") or 0),
+            "product_ids": product_ids,
+            "disabled": bool(raw.get("disabled")) or raw.get("active") is False,
+        }
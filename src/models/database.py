@@ -1,16 +1,46 @@
 import sqlite3
 from pathlib import Path
 import logging
+import json
 from typing import List, Dict
 from datetime import datetime, timedelta
 
 class Database:
-    def __init__(self, db_path: str = "database.db"):
+    def __init__(self, db_path: str = "database.db", archive_path: str = "archive.db"):
         self.db_path = db_path
+        self.archive_path = archive_path
+        self.write_buffer = None  # Optional WriteBehindBuffer for small writes
         self.init_db()
 
-    def connect(self):
-        return sqlite3.connect(self.db_path)
+    def connect(self, attach_archive: bool = False):
+        """Open a connection, optionally with the archive database attached as `archive`"""
+        conn = sqlite3.connect(self.db_path)
+        if attach_archive and self.has_archive:
+            conn.execute("ATTACH DATABASE ? AS archive", (self.archive_path,))
+        return conn
+
+    @property
+    def has_archive(self) -> bool:
+        return bool(self.archive_path) and Path(self.archive_path).exists()
+
+    def _write(self, write, key=None, action: str = "write"):
+        """Run `write(conn)` through the write-behind buffer if set, otherwise right away"""
+        if self.write_buffer is not None:
+            self.write_buffer.put(write, key)
+            return True
+        try:
+            with self.connect() as conn:
+                write(conn)
+                conn.commit()
+            return True
+        except Exception as e:
+            logging.error(f"Failed to {action}: {e}")
+            return False
+
+    def flush_writes(self):
+        """Commit buffered writes so the following read sees them"""
+        if self.write_buffer is not None and self.write_buffer.pending:
+            self.write_buffer.flush_sync()
 
     def init_db(self):
         """Initialize the database with required tables"""
@@ -26,55 +56,558 @@ class Database:
                     notification_sent BOOLEAN DEFAULT FALSE
                 )
             """)
+            self._add_column(conn, "subscriptions", "status", "TEXT DEFAULT 'active'")
+            self._add_column(conn, "subscriptions", "variant_key", "TEXT")
+            self._add_column(conn, "subscriptions", "gateway", "TEXT")
+            self._add_column(conn, "subscriptions", "amount", "REAL DEFAULT 0")
+            self._add_column(conn, "subscriptions", "tenant_id", "TEXT DEFAULT 'default'")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_subscriptions_invoice ON subscriptions (invoice_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_subscriptions_discord ON subscriptions (discord_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_subscriptions_expiry ON subscriptions (expiry_date, id)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS keys (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    variant_key TEXT NOT NULL,
+                    product_key TEXT NOT NULL,
+                    used BOOLEAN DEFAULT FALSE,
+                    used_by TEXT,
+                    used_at TIMESTAMP,
+                    discord_name TEXT
+                )
+            """)
+            self._add_column(conn, "keys", "discord_name", "TEXT")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS button_keys (
+                    invoice_id TEXT PRIMARY KEY,
+                    product_key TEXT NOT NULL
+                )
+            """)
+            self._add_column(conn, "button_keys", "created_at", "TIMESTAMP")
+            self._add_column(conn, "button_keys", "expires_at", "TIMESTAMP")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_button_keys_expires ON button_keys (expires_at)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS purchases (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    discord_id TEXT NOT NULL,
+                    discord_name TEXT,
+                    invoice_id TEXT NOT NULL,
+                    product_key TEXT,
+                    variant_key TEXT,
+                    purchase_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    expiry_date TIMESTAMP,
+                    status TEXT DEFAULT 'active'
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_purchases_invoice ON purchases (invoice_id)")
+            # Covers the keyset-paginated history query, so pages never touch the table
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_purchases_user_date
+                ON purchases (discord_id, purchase_date DESC, id DESC, variant_key, product_key, expiry_date, status)
+            """)
+            self._add_column(conn, "purchases", "gateway", "TEXT")
+            self._add_column(conn, "purchases", "amount", "REAL DEFAULT 0")
+            self._add_column(conn, "purchases", "tenant_id", "TEXT DEFAULT 'default'")
+            # Rollups from before they were split per tenant are derived data, so they're dropped and rebuilt
+            rollup_columns = [row[1] for row in conn.execute("PRAGMA table_info(sales_rollups)")]
+            rebuild_rollups = bool(rollup_columns) and "tenant_id" not in rollup_columns
+            if rebuild_rollups:
+                conn.execute("DROP TABLE sales_rollups")
+                conn.execute("DROP TABLE IF EXISTS sales_rollup_invoices")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sales_rollups (
+                    tenant_id TEXT NOT NULL DEFAULT 'default',
+                    day TEXT NOT NULL,
+                    variant_key TEXT NOT NULL,
+                    gateway TEXT NOT NULL,
+                    sales INTEGER NOT NULL DEFAULT 0,
+                    revenue REAL NOT NULL DEFAULT 0,
+                    PRIMARY KEY (tenant_id, day, variant_key, gateway)
+                )
+            """)
+            # Invoices already counted in sales_rollups, so either writer can roll up first
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sales_rollup_invoices (
+                    tenant_id TEXT NOT NULL DEFAULT 'default',
+                    invoice_id TEXT NOT NULL,
+                    PRIMARY KEY (tenant_id, invoice_id)
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS payment_events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    invoice_id TEXT,
+                    event_type TEXT NOT NULL,
+                    discord_id TEXT,
+                    details TEXT,
+                    created_at TIMESTAMP NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_payment_events_invoice ON payment_events (invoice_id, id)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS job_state (
+                    name TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS purchase_sessions (
+                    discord_id TEXT PRIMARY KEY,
+                    product_name TEXT NOT NULL,
+                    email TEXT NOT NULL,
+                    coupon TEXT,
+                    variant_key TEXT,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            # Sessions hold buyer emails, so they expire and get purged (rows without expires_at count as expired)
+            self._add_column(conn, "purchase_sessions", "expires_at", "TIMESTAMP")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_purchase_sessions_expires ON purchase_sessions (expires_at)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS tenants (
+                    id TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    shop_id TEXT NOT NULL,
+                    api_key TEXT NOT NULL,
+                    guild_id INTEGER NOT NULL,
+                    customer_role_id INTEGER DEFAULT 0,
+                    webhook_secret TEXT,
+                    products_json TEXT,
+                    enabled BOOLEAN DEFAULT TRUE,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            # Purchase DMs that failed: pending rows are retried, dead rows wait for an admin replay
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS delivery_retries (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    invoice_id TEXT NOT NULL,
+                    discord_id TEXT NOT NULL,
+                    tenant_id TEXT DEFAULT 'default',
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 1,
+                    last_error TEXT,
+                    next_attempt_at TIMESTAMP NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE (kind, invoice_id)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_delivery_retries_due ON delivery_retries (status, next_attempt_at)")
             conn.commit()
+        if rebuild_rollups:
+            self.rebuild_sales_rollups()
+
+    @staticmethod
+    def _add_column(conn, table: str, column: str, definition: str):
+        """Add a column to an existing table, ignoring it if it's already there"""
+        try:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        except sqlite3.OperationalError:
+            pass  # Column already exists
+
+    @staticmethod
+    def _rollup_sale(conn, invoice_id: str, variant_key: str, gateway: str, amount: float, tenant_id: str):
+        """Count a sale in its tenant's sales_rollups once per invoice, inside the caller's transaction"""
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO sales_rollup_invoices (tenant_id, invoice_id) VALUES (?, ?)",
+            (tenant_id or "default", str(invoice_id))
+        )
+        if cursor.rowcount == 0:
+            return
+        conn.execute("""
+            INSERT INTO sales_rollups (tenant_id, day, variant_key, gateway, sales, revenue)
+            VALUES (?, date('now', 'localtime'), ?, ?, 1, ?)
+            ON CONFLICT (tenant_id, day, variant_key, gateway)
+            DO UPDATE SET sales = sales + 1, revenue = revenue + excluded.revenue
+        """, (tenant_id or "default", variant_key or "UNKNOWN", gateway or "UNKNOWN", float(amount or 0)))
+
+    def add_subscription(self, discord_id: str, discord_name: str, invoice_id: str, duration_days: int = 30,
+                         variant_key: str = None, gateway: str = None, amount: float = 0, tenant_id: str = "default"):
+        """Add a new subscription (a no-op if the invoice was already recorded)"""
+        expiry_date = datetime.now() + timedelta(days=duration_days)
+
+        def write(conn):
+            cursor = conn.execute("""
+                INSERT INTO subscriptions 
+                (discord_id, discord_name, invoice_id, expiry_date, variant_key, gateway, amount, tenant_id)
+                SELECT ?, ?, ?, ?, ?, ?, ?, ?
+                WHERE NOT EXISTS (SELECT 1 FROM subscriptions WHERE invoice_id = ?)
+            """, (discord_id, discord_name, str(invoice_id), expiry_date, variant_key, gateway,
+                  float(amount or 0), tenant_id, str(invoice_id)))
+            if cursor.rowcount:
+                self._rollup_sale(conn, invoice_id, variant_key, gateway, amount, tenant_id)
 
-    def add_subscription(self, discord_id: str, discord_name: str, invoice_id: str, duration_days: int = 30):
-        """Add a new subscription"""
+        return self._write(write, ("subscription", str(invoice_id)), "add subscription")
+
+    def get_subscription_by_invoice(self, invoice_id: str):
+        """Get (discord_id, purchase_date, expiry_date) for a recorded invoice"""
+        self.flush_writes()
+        try:
+            with self.connect() as conn:
+                cursor = conn.execute("""
+                    SELECT discord_id, purchase_date, expiry_date
+                    FROM subscriptions
+                    WHERE invoice_id = ?
+                """, (str(invoice_id),))
+                return cursor.fetchone()
+        except Exception as e:
+            logging.error(f"Failed to get subscription: {e}")
+            return None
+
+    def get_user_subscriptions(self, discord_id: str, limit: int = 5):
+        """Get a user's most recent real (not backfilled) subscriptions as (invoice_id, purchase_date, expiry_date)"""
+        self.flush_writes()
+        try:
+            with self.connect() as conn:
+                cursor = conn.execute("""
+                    SELECT invoice_id, purchase_date, expiry_date
+                    FROM subscriptions
+                    WHERE discord_id = ?
+                    AND COALESCE(gateway, '') != 'backfill'
+                    ORDER BY purchase_date DESC
+                    LIMIT ?
+                """, (str(discord_id), limit))
+                return cursor.fetchall()
+        except Exception as e:
+            logging.error(f"Failed to get user subscriptions: {e}")
+            return []
+
+    def get_active_subscriber_ids(self, tenant_id: str = None):
+        """Get the Discord ids of everyone with a subscription that hasn't expired, optionally for one tenant.
+
+        Returns None if the lookup fails, so callers can't mistake an error for "nobody is subscribed".
+        """
+        self.flush_writes()
+        try:
+            with self.connect() as conn:
+                cursor = conn.execute("""
+                    SELECT DISTINCT discord_id
+                    FROM subscriptions
+                    WHERE expiry_date > ?
+                    AND (? IS NULL OR COALESCE(tenant_id, 'default') = ?)
+                """, (datetime.now(), tenant_id, tenant_id))
+                return {int(row[0]) for row in cursor.fetchall()}
+        except Exception as e:
+            logging.error(f"Failed to get active subscribers: {e}")
+            return None
+
+    def backfill_subscriptions(self, discord_ids, tenant_id: str, duration_days: int):
+        """Give members with no subscription on record for `tenant_id` one lasting `duration_days`.
+
+        Backfilled rows use a `backfill:` invoice id and the "backfill" gateway, and aren't
+        counted as sales. Returns the ids that were backfilled, or None on error.
+        """
+        self.flush_writes()
+        expiry_date = datetime.now() + timedelta(days=duration_days)
+        try:
+            with self.connect() as conn:
+                known = {int(row[0]) for row in conn.execute(
+                    "SELECT DISTINCT discord_id FROM subscriptions WHERE COALESCE(tenant_id, 'default') = ?",
+                    (tenant_id,)
+                )}
+                backfilled = [discord_id for discord_id in discord_ids if int(discord_id) not in known]
+                conn.executemany("""
+                    INSERT INTO subscriptions
+                    (discord_id, discord_name, invoice_id, expiry_date, gateway, amount, tenant_id)
+                    VALUES (?, '', ?, ?, 'backfill', 0, ?)
+                """, [(str(discord_id), f"backfill:{tenant_id}:{discord_id}", expiry_date, tenant_id)
+                      for discord_id in backfilled])
+                conn.commit()
+                return {int(discord_id) for discord_id in backfilled}
+        except Exception as e:
+            logging.error(f"Failed to backfill subscriptions: {e}")
+            return None
+
+    def expire_subscriptions_batch(self, limit: int) -> list:
+        """Mark the next batch of lapsed subscriptions as expired.
+
+        Rows are walked in (expiry_date, id) order from a watermark stored in job_state.
+        The status update and the watermark move commit in one transaction, so every
+        expiry is processed exactly once, even across restarts.
+        Returns the expired rows as (id, discord_id, invoice_id, tenant_id).
+        """
+        self.flush_writes()
+        try:
+            with self.connect() as conn:
+                row = conn.execute(
+                    "SELECT value FROM job_state WHERE name = 'expiry_watermark'"
+                ).fetchone()
+                last_expiry, last_id = json.loads(row[0]) if row else ("", 0)
+
+                rows = conn.execute("""
+                    SELECT id, discord_id, invoice_id, expiry_date, COALESCE(tenant_id, 'default')
+                    FROM subscriptions
+                    WHERE (expiry_date, id) > (?, ?)
+                    AND expiry_date <= ?
+                    ORDER BY expiry_date, id
+                    LIMIT ?
+                """, (last_expiry, last_id, datetime.now(), limit)).fetchall()
+                if not rows:
+                    return []
+
+                ids = [(r[0],) for r in rows]
+                conn.executemany(
+                    "UPDATE subscriptions SET status = 'expired' WHERE id = ? AND status = 'active'",
+                    ids
+                )
+
+                last = rows[-1]
+                conn.execute(
+                    "INSERT OR REPLACE INTO job_state (name, value) VALUES ('expiry_watermark', ?)",
+                    (json.dumps([str(last[3]), last[0]]),)
+                )
+                conn.commit()
+                return [(r[0], r[1], r[2], r[4]) for r in rows]
+        except Exception as e:
+            logging.error(f"Failed to expire subscriptions: {e}")
+            return []
+
+    def get_due_reminders(self, lead_days: int, after: tuple = None, limit: int = 50) -> list:
+        """Get a page of active, un-notified, not backfilled subscriptions expiring within `lead_days`.
+
+        Pages are keyed on (expiry_date, id) after `after`, using idx_subscriptions_expiry.
+        Returns rows as (id, discord_id, invoice_id, expiry_date).
+        """
+        self.flush_writes()
+        now = datetime.now()
+        last_expiry, last_id = after or ("", 0)
+        try:
+            with self.connect() as conn:
+                cursor = conn.execute("""
+                    SELECT id, discord_id, invoice_id, expiry_date
+                    FROM subscriptions
+                    WHERE (expiry_date, id) > (?, ?)
+                    AND expiry_date > ? AND expiry_date <= ?
+                    AND notification_sent = FALSE
+                    AND status = 'active'
+                    AND COALESCE(gateway, '') != 'backfill'
+                    ORDER BY expiry_date, id
+                    LIMIT ?
+                """, (last_expiry, last_id, now, now + timedelta(days=lead_days), limit))
+                return cursor.fetchall()
+        except Exception as e:
+            logging.error(f"Failed to get due reminders: {e}")
+            return []
+
+    def mark_notifications_sent(self, subscription_ids: list) -> bool:
+        """Mark expiry reminders as handled for these subscription ids, in one transaction"""
+        if not subscription_ids:
+            return True
+        try:
+            with self.connect() as conn:
+                conn.executemany(
+                    "UPDATE subscriptions SET notification_sent = TRUE WHERE id = ?",
+                    [(sub_id,) for sub_id in subscription_ids]
+                )
+                conn.commit()
+                return True
+        except Exception as e:
+            logging.error(f"Failed to mark notifications sent: {e}")
+            return False
+
+    def save_purchase_session(self, discord_id: str, product_name: str, email: str, coupon: str = None,
+                              variant_key: str = None, ttl_hours: float = 24):
+        """Store the in-progress /buy state that the persistent purchase view reads back for `ttl_hours`"""
         try:
             with self.connect() as conn:
-                expiry_date = datetime.now() + timedelta(days=duration_days)
                 conn.execute("""
-                    INSERT INTO subscriptions 
-                    (discord_id, discord_name, invoice_id, expiry_date)
-                    VALUES (?, ?, ?, ?)
-                """, (discord_id, discord_name, invoice_id, expiry_date))
+                    INSERT OR REPLACE INTO purchase_sessions
+                    (discord_id, product_name, email, coupon, variant_key, updated_at, expires_at)
+                    VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP, ?)
+                """, (discord_id, product_name, email, coupon, variant_key,
+                      datetime.now() + timedelta(hours=ttl_hours)))
                 conn.commit()
                 return True
         except Exception as e:
-            logging.error(f"Failed to add subscription: {e}")
+            logging.error(f"Failed to save purchase session: {e}")
+            return False
+
+    def set_session_variant(self, discord_id: str, variant_key: str):
+        """Update the plan chosen in a purchase session"""
+        try:
+            with self.connect() as conn:
+                cursor = conn.execute("""
+                    UPDATE purchase_sessions
+                    SET variant_key = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE discord_id = ? AND expires_at > ?
+                """, (variant_key, discord_id, datetime.now()))
+                conn.commit()
+                return cursor.rowcount > 0
+        except Exception as e:
+            logging.error(f"Failed to update purchase session: {e}")
             return False
 
-    def get_expiring_subscriptions(self):
-        """Get subscriptions expiring in ~2 days that haven't been notified"""
+    def get_purchase_session(self, discord_id: str) -> dict:
+        """Get the in-progress /buy state for a user"""
+        try:
+            with self.connect() as conn:
+                cursor = conn.execute("""
+                    SELECT product_name, email, coupon, variant_key
+                    FROM purchase_sessions
+                    WHERE discord_id = ? AND expires_at > ?
+                """, (discord_id, datetime.now()))
+                row = cursor.fetchone()
+                if not row:
+                    return None
+                return {
+                    "product_name": row[0],
+                    "email": row[1],
+                    "coupon": row[2],
+                    "variant_key": row[3]
+                }
+        except Exception as e:
+            logging.error(f"Failed to get purchase session: {e}")
+            return None
+
+    def get_tenants(self) -> list:
+        """Get every enabled tenant as a dict of its tenants row"""
         try:
             with self.connect() as conn:
+                conn.row_factory = sqlite3.Row
                 cursor = conn.execute("""
-                    SELECT discord_id, discord_name, expiry_date 
-                    FROM subscriptions 
-                    WHERE notification_sent = FALSE 
-                    AND expiry_date BETWEEN datetime('now', '+1 day', '+23 hours') 
-                    AND datetime('now', '+2 days', '+1 hour')
+                    SELECT id, name, shop_id, api_key, guild_id, customer_role_id, webhook_secret, products_json
+                    FROM tenants
+                    WHERE enabled = TRUE
+                    ORDER BY created_at, id
                 """)
-                return cursor.fetchall()
+                return [dict(row) for row in cursor.fetchall()]
         except Exception as e:
-            logging.error(f"Failed to get expiring subscriptions: {e}")
+            logging.error(f"Failed to get tenants: {e}")
             return []
 
-    def mark_notification_sent(self, discord_id: str):
-        """Mark that expiry notification has been sent"""
+    def save_tenant(self, tenant_id: str, name: str, shop_id: str, api_key: str, guild_id: int,
+                    customer_role_id: int = 0, webhook_secret: str = None, products: dict = None,
+                    enabled: bool = True) -> bool:
+        """Add or update a tenant (takes effect on the next start or /tenants reload)"""
         try:
             with self.connect() as conn:
                 conn.execute("""
-                    UPDATE subscriptions 
-                    SET notification_sent = TRUE 
-                    WHERE discord_id = ?
-                """, (discord_id,))
+                    INSERT INTO tenants
+                    (id, name, shop_id, api_key, guild_id, customer_role_id, webhook_secret, products_json, enabled)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (id) DO UPDATE SET
+                        name = excluded.name, shop_id = excluded.shop_id, api_key = excluded.api_key,
+                        guild_id = excluded.guild_id, customer_role_id = excluded.customer_role_id,
+                        webhook_secret = excluded.webhook_secret, products_json = excluded.products_json,
+                        enabled = excluded.enabled
+                """, (tenant_id, name, str(shop_id), api_key, int(guild_id), int(customer_role_id or 0),
+                      webhook_secret, json.dumps(products) if products else None, enabled))
+                conn.commit()
+                return True
+        except Exception as e:
+            logging.error(f"Failed to save tenant: {e}")
+            return False
+
+    def add_delivery_retry(self, kind: str, invoice_id: str, discord_id: str, tenant_id: str, payload: str,
+                           error: str, next_attempt_at: datetime) -> bool:
+        """Queue a failed delivery for retry (a no-op if this delivery is already queued)"""
+        try:
+            with self.connect() as conn:
+                conn.execute("""
+                    INSERT INTO delivery_retries
+                    (kind, invoice_id, discord_id, tenant_id, payload, last_error, next_attempt_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (kind, invoice_id) DO NOTHING
+                """, (kind, str(invoice_id), str(discord_id), tenant_id, payload, error, next_attempt_at))
                 conn.commit()
                 return True
         except Exception as e:
-            logging.error(f"Failed to mark notification sent: {e}")
+            logging.error(f"Failed to queue delivery retry: {e}")
             return False
 
+    def claim_due_delivery_retries(self, limit: int = 50, lease_seconds: float = 300) -> list:
+        """Claim pending deliveries whose next attempt is due, oldest first.
+
+        Claimed rows have their next attempt pushed `lease_seconds` ahead in the same
+        transaction, so a concurrent batch (or another process) can't pick them up too.
+        If the claimer dies before saving the outcome, the rows come due again after the lease.
+        """
+        now = datetime.now()
+        try:
+            with self.connect() as conn:
+                conn.row_factory = sqlite3.Row
+                conn.execute("BEGIN IMMEDIATE")
+                rows = [dict(row) for row in conn.execute("""
+                    SELECT id, kind, invoice_id, discord_id, tenant_id, payload, attempts
+                    FROM delivery_retries
+                    WHERE status = 'pending' AND next_attempt_at <= ?
+                    ORDER BY next_attempt_at, id
+                    LIMIT ?
+                """, (now, limit))]
+                conn.executemany(
+                    "UPDATE delivery_retries SET next_attempt_at = ? WHERE id = ?",
+                    [(now + timedelta(seconds=lease_seconds), row["id"]) for row in rows]
+                )
+                conn.commit()
+                return rows
+        except Exception as e:
+            logging.error(f"Failed to claim due delivery retries: {e}")
+            return []
+
+    def save_delivery_attempts(self, delivered: list, failed: list) -> bool:
+        """Drop delivered rows and store failed ones as (status, attempts, last_error, next_attempt_at, id)"""
+        try:
+            with self.connect() as conn:
+                conn.executemany("DELETE FROM delivery_retries WHERE id = ?", [(i,) for i in delivered])
+                conn.executemany("""
+                    UPDATE delivery_retries
+                    SET status = ?, attempts = ?, last_error = ?, next_attempt_at = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                """, failed)
+                conn.commit()
+                return True
+        except Exception as e:
+            logging.error(f"Failed to save delivery attempts: {e}")
+            return False
+
+    def get_dead_deliveries(self, limit: int = 25, tenant_id: str = None) -> list:
+        """Get dead-lettered deliveries (for one tenant, or all of them), most recent first"""
+        try:
+            with self.connect() as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.execute("""
+                    SELECT id, kind, invoice_id, discord_id, tenant_id, attempts, last_error, updated_at
+                    FROM delivery_retries
+                    WHERE status = 'dead' AND (? IS NULL OR COALESCE(tenant_id, 'default') = ?)
+                    ORDER BY updated_at DESC, id DESC
+                    LIMIT ?
+                """, (tenant_id, tenant_id, limit))
+                return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logging.error(f"Failed to get dead deliveries: {e}")
+            return []
+
+    def replay_dead_deliveries(self, retry_id: int = None, tenant_id: str = None) -> int:
+        """Make one dead delivery (or all of them, optionally for one tenant) due again with a fresh attempt budget"""
+        try:
+            with self.connect() as conn:
+                cursor = conn.execute("""
+                    UPDATE delivery_retries
+                    SET status = 'pending', attempts = 0, next_attempt_at = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE status = 'dead' AND (? IS NULL OR id = ?)
+                    AND (? IS NULL OR COALESCE(tenant_id, 'default') = ?)
+                """, (datetime.now(), retry_id, retry_id, tenant_id, tenant_id))
+                conn.commit()
+                return cursor.rowcount
+        except Exception as e:
+            logging.error(f"Failed to replay dead deliveries: {e}")
+            return 0
+
+    def count_delivery_retries(self, tenant_id: str = None) -> dict:
+        """Number of delivery_retries rows per status, for one tenant or all of them"""
+        try:
+            with self.connect() as conn:
+                return dict(conn.execute("""
+                    SELECT status, COUNT(*) FROM delivery_retries
+                    WHERE ? IS NULL OR COALESCE(tenant_id, 'default') = ?
+                    GROUP BY status
+                """, (tenant_id, tenant_id)).fetchall())
+        except Exception as e:
+            logging.error(f"Failed to count delivery retries: {e}")
+            return {}
+
     def add_keys(self, variant_key: str, keys: List[str]) -> bool:
         """Add new keys to the database"""
         try:
@@ -122,14 +655,6 @@ class Database:
             with sqlite3.connect(self.db_path) as conn:
                 cursor = conn.cursor()
                 
-                # First, add discord_name column if it doesn't exist
-                try:
-                    cursor.execute("""
-                        ALTER TABLE keys ADD COLUMN discord_name TEXT;
-                    """)
-                except sqlite3.OperationalError:
-                    pass  # Column already exists
-                
                 cursor.execute(
                     """
                     SELECT id, product_key 
@@ -171,21 +696,21 @@ class Database:
             logging.error(f"Failed to get and use key: {e}")
             return None
 
-    def store_button_key(self, invoice_id: str, product_key: str):
-        """Store a key for button interaction"""
-        try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute(
-                    "INSERT OR REPLACE INTO button_keys (invoice_id, product_key) VALUES (?, ?)",
-                    (invoice_id, product_key)
-                )
-                conn.commit()
-        except Exception as e:
-            logging.error(f"Failed to store button key: {e}")
+    def store_button_key(self, invoice_id: str, product_key: str, ttl_days: int = 30):
+        """Store a key for button interaction, kept for `ttl_days`"""
+        expires_at = datetime.now() + timedelta(days=ttl_days)
+
+        def write(conn):
+            conn.execute("""
+                INSERT OR REPLACE INTO button_keys (invoice_id, product_key, created_at, expires_at)
+                VALUES (?, ?, CURRENT_TIMESTAMP, ?)
+            """, (invoice_id, product_key, expires_at))
+
+        self._write(write, ("button_key", str(invoice_id)), "store button key")
 
     def get_button_key(self, invoice_id: str) -> str:
-        """Get a key stored for button interaction"""
+        """Get a key stored for button interaction (falls back to the archive)"""
+        self.flush_writes()
         try:
             with sqlite3.connect(self.db_path) as conn:
                 cursor = conn.cursor()
@@ -194,13 +719,52 @@ class Database:
                     (invoice_id,)
                 )
                 result = cursor.fetchone()
-                return result[0] if result else None
+            if not result and self.has_archive:
+                with self.connect(attach_archive=True) as conn:
+                    result = conn.execute(
+                        "SELECT product_key FROM archive.button_keys WHERE invoice_id = ?",
+                        (invoice_id,)
+                    ).fetchone()
+            return result[0] if result else None
         except Exception as e:
             logging.error(f"Failed to get button key: {e}")
             return None
 
-    def record_purchase(self, discord_id: str, discord_name: str, invoice_id: str, product_key: str, variant_key: str, duration_days: int = 30):
-        """Record a purchase in the database"""
+    def purge_expired_button_keys(self, limit: int) -> int:
+        """Delete up to `limit` expired button keys, returns how many were deleted"""
+        self.flush_writes()
+        try:
+            with self.connect() as conn:
+                cursor = conn.execute("""
+                    DELETE FROM button_keys WHERE invoice_id IN (
+                        SELECT invoice_id FROM button_keys WHERE expires_at < ? LIMIT ?
+                    )
+                """, (datetime.now(), limit))
+                conn.commit()
+                return cursor.rowcount
+        except Exception as e:
+            logging.error(f"Failed to purge button keys: {e}")
+            return 0
+
+    def purge_expired_purchase_sessions(self, limit: int) -> int:
+        """Delete up to `limit` expired purchase sessions, returns how many were deleted"""
+        try:
+            with self.connect() as conn:
+                cursor = conn.execute("""
+                    DELETE FROM purchase_sessions WHERE discord_id IN (
+                        SELECT discord_id FROM purchase_sessions
+                        WHERE expires_at IS NULL OR expires_at <= ? LIMIT ?
+                    )
+                """, (datetime.now(), limit))
+                conn.commit()
+                return cursor.rowcount
+        except Exception as e:
+            logging.error(f"Failed to purge purchase sessions: {e}")
+            return 0
+
+    def record_purchase(self, discord_id: str, discord_name: str, invoice_id: str, product_key: str, variant_key: str, duration_days: int = 30,
+                        gateway: str = None, amount: float = 0, tenant_id: str = "default"):
+        """Record a purchase in the database (a no-op if this invoice/key was already recorded)"""
         try:
             with sqlite3.connect(self.db_path) as conn:
                 cursor = conn.cursor()
@@ -213,9 +777,19 @@ class Database:
                         invoice_id, 
                         product_key, 
                         variant_key,
-                        expiry_date
-                    ) VALUES (?, ?, ?, ?, ?, datetime('now', '+' || ? || ' days'))
-                """, (discord_id, discord_name, invoice_id, product_key, variant_key, duration_days))
+                        expiry_date,
+                        gateway,
+                        amount,
+                        tenant_id
+                    )
+                    SELECT ?, ?, ?, ?, ?, datetime('now', '+' || ? || ' days'), ?, ?, ?
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM purchases WHERE invoice_id = ? AND product_key IS ?
+                    )
+                """, (discord_id, discord_name, str(invoice_id), product_key, variant_key, duration_days,
+                      gateway, float(amount or 0), tenant_id, str(invoice_id), product_key))
+                if cursor.rowcount:
+                    self._rollup_sale(conn, invoice_id, variant_key, gateway, amount, tenant_id)
                 
                 conn.commit()
                 return True
@@ -223,23 +797,149 @@ class Database:
             logging.error(f"Failed to record purchase: {e}")
             return False
 
-    def get_user_purchases(self, discord_id: str) -> list:
+    def get_sales_stats(self, days: int = 30, tenant_id: str = None) -> dict:
+        """Summarise sales_rollups over the last `days` days, for one tenant or all of them"""
+        self.flush_writes()
+        try:
+            with self.connect() as conn:
+                since = (datetime.now() - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+                today = datetime.now().strftime("%Y-%m-%d")
+                tenant = "AND (? IS NULL OR tenant_id = ?)"
+                total = conn.execute(
+                    f"SELECT COALESCE(SUM(sales), 0), COALESCE(SUM(revenue), 0) FROM sales_rollups WHERE day >= ? {tenant}",
+                    (since, tenant_id, tenant_id)
+                ).fetchone()
+                today_total = conn.execute(
+                    f"SELECT COALESCE(SUM(sales), 0), COALESCE(SUM(revenue), 0) FROM sales_rollups WHERE day = ? {tenant}",
+                    (today, tenant_id, tenant_id)
+                ).fetchone()
+                by_variant = conn.execute(f"""
+                    SELECT variant_key, SUM(sales), SUM(revenue) FROM sales_rollups
+                    WHERE day >= ? {tenant} GROUP BY variant_key ORDER BY SUM(revenue) DESC
+                """, (since, tenant_id, tenant_id)).fetchall()
+                by_gateway = conn.execute(f"""
+                    SELECT gateway, SUM(sales), SUM(revenue) FROM sales_rollups
+                    WHERE day >= ? {tenant} GROUP BY gateway ORDER BY SUM(revenue) DESC
+                """, (since, tenant_id, tenant_id)).fetchall()
+                return {
+                    "total": total,
+                    "today": today_total,
+                    "by_variant": by_variant,
+                    "by_gateway": by_gateway
+                }
+        except Exception as e:
+            logging.error(f"Failed to get sales stats: {e}")
+            return None
+
+    def rebuild_sales_rollups(self, tenant_id: str = None) -> int:
+        """Rebuild sales_rollups (for one tenant, or all of them) from subscriptions and purchases, returns invoices counted"""
+        self.flush_writes()
+        try:
+            with self.connect() as conn:
+                tenant = (tenant_id, tenant_id)
+                conn.execute("DELETE FROM sales_rollups WHERE ? IS NULL OR tenant_id = ?", tenant)
+                conn.execute("DELETE FROM sales_rollup_invoices WHERE ? IS NULL OR tenant_id = ?", tenant)
+                # One row per invoice, preferring the subscription record
+                conn.execute("""
+                    CREATE TEMP TABLE rollup_source AS
+                    SELECT COALESCE(tenant_id, 'default') AS tenant_id, invoice_id,
+                           date(purchase_date, 'localtime') AS day,
+                           COALESCE(variant_key, 'UNKNOWN') AS variant_key,
+                           COALESCE(gateway, 'UNKNOWN') AS gateway,
+                           COALESCE(amount, 0) AS amount
+                    FROM subscriptions
+                    WHERE COALESCE(gateway, '') != 'backfill'
+                    AND (? IS NULL OR COALESCE(tenant_id, 'default') = ?)
+                    UNION ALL
+                    SELECT COALESCE(MAX(tenant_id), 'default'), invoice_id,
+                           date(MIN(purchase_date), 'localtime'),
+                           COALESCE(MAX(variant_key), 'UNKNOWN'),
+                           COALESCE(MAX(gateway), 'UNKNOWN'),
+                           COALESCE(MAX(amount), 0)
+                    FROM purchases
+                    WHERE invoice_id NOT IN (SELECT invoice_id FROM subscriptions)
+                    AND (? IS NULL OR COALESCE(tenant_id, 'default') = ?)
+                    GROUP BY invoice_id
+                """, tenant + tenant)
+                conn.execute("""
+                    INSERT OR IGNORE INTO sales_rollup_invoices (tenant_id, invoice_id)
+                    SELECT tenant_id, invoice_id FROM rollup_source
+                """)
+                conn.execute("""
+                    INSERT INTO sales_rollups (tenant_id, day, variant_key, gateway, sales, revenue)
+                    SELECT tenant_id, day, variant_key, gateway, COUNT(*), SUM(amount)
+                    FROM (SELECT * FROM rollup_source GROUP BY tenant_id, invoice_id)
+                    GROUP BY tenant_id, day, variant_key, gateway
+                """)
+                count = conn.execute(
+                    "SELECT COUNT(*) FROM sales_rollup_invoices WHERE ? IS NULL OR tenant_id = ?", tenant
+                ).fetchone()[0]
+                conn.execute("DROP TABLE rollup_source")
+                conn.commit()
+                return count
+        except Exception as e:
+            logging.error(f"Failed to rebuild sales rollups: {e}")
+            return -1
+
+    def _purchases_source(self, include_archive: bool) -> str:
+        """FROM clause for purchase lookups, spanning the archive when it exists"""
+        if include_archive and self.has_archive:
+            return """(
+                SELECT id, discord_id, variant_key, product_key, purchase_date, expiry_date, status FROM main.purchases
+                UNION ALL
+                SELECT id, discord_id, variant_key, product_key, purchase_date, expiry_date, status FROM archive.purchases
+            )"""
+        return "purchases"
+
+    def get_user_purchases(self, discord_id: str, include_archive: bool = True) -> list:
         """Get all purchases for a user"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connect(attach_archive=include_archive) as conn:
                 cursor = conn.cursor()
-                cursor.execute("""
+                cursor.execute(f"""
                     SELECT 
                         variant_key,
                         product_key,
                         purchase_date,
                         expiry_date,
                         status
-                    FROM purchases 
+                    FROM {self._purchases_source(include_archive)}
                     WHERE discord_id = ?
-                    ORDER BY purchase_date DESC
+                    ORDER BY purchase_date DESC, id DESC
                 """, (discord_id,))
                 return cursor.fetchall()
         except Exception as e:
             logging.error(f"Failed to get user purchases: {e}")
+            return []
+
+    def get_purchase_page(self, discord_id: str, before: tuple = None, limit: int = 5, include_archive: bool = True,
+                          tenant_id: str = None) -> list:
+        """Get one page of a user's purchases (optionally only one tenant's), newest first, using keyset pagination.
+
+        `before` is the (purchase_date, id) of the last row on the previous page.
+        Rows are (id, variant_key, product_key, purchase_date, expiry_date, status).
+        The hot and archive tables are each queried with the same bound and limit, so both
+        seek their (discord_id, purchase_date, id) index, and the two pages are merged here.
+        """
+        try:
+            with self.connect(attach_archive=include_archive) as conn:
+                tables = ["main.purchases"]
+                if include_archive and self.has_archive:
+                    tables.append("archive.purchases")
+                keyset = "AND (purchase_date, id) < (?, ?)" if before else ""
+                tenant = "AND COALESCE(tenant_id, 'default') = ?" if tenant_id else ""
+                params = (str(discord_id), *(before or ()), *((tenant_id,) if tenant_id else ()))
+                rows = []
+                for table in tables:
+                    rows += conn.execute(f"""
+                        SELECT id, variant_key, product_key, purchase_date, expiry_date, status
+                        FROM {table}
+                        WHERE discord_id = ? {keyset} {tenant}
+                        ORDER BY purchase_date DESC, id DESC
+                        LIMIT ?
+                    """, (*params, limit)).fetchall()
+                rows.sort(key=lambda row: (row[3] or "", row[0]), reverse=True)
+                return rows[:limit]
+        except Exception as e:
+            logging.error(f"Failed to get purchase page: {e}")
             return [] 
\ No newline at end of file
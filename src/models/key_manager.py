@@ -1,12 +1,46 @@
 import logging
 from typing import Dict, List
 from src.models.database import Database
+from src.models.ledger import KEY_CLAIMED
+from src.utils.cache import LRUCache
+from src.config.settings import BUTTON_KEY_TTL_DAYS, BUTTON_KEY_CACHE_SIZE, BUTTON_KEY_CACHE_TTL
+
+
+class ButtonKeyStore:
+    """Write-through LRU cache in front of the button_keys table.
+
+    Keys are cached as they are stored, so button interactions on recent deliveries
+    are answered from memory; only misses (evicted or pre-restart keys) read SQLite.
+    """
+
+    def __init__(self, db: Database, maxsize: int = BUTTON_KEY_CACHE_SIZE, ttl: float = BUTTON_KEY_CACHE_TTL):
+        self.db = db
+        self.cache = LRUCache(maxsize, ttl)
+
+    def __setitem__(self, invoice_id, product_key):
+        self.cache.set(invoice_id, product_key)
+        self.db.store_button_key(invoice_id, product_key, BUTTON_KEY_TTL_DAYS)
+
+    def __getitem__(self, invoice_id):
+        product_key = self.cache.get(invoice_id)
+        if product_key is None:
+            product_key = self.db.get_button_key(invoice_id)
+            if product_key is not None:
+                self.cache.set(invoice_id, product_key)
+        return product_key
+
+    def stats(self) -> dict:
+        return {"size": len(self.cache), "hits": self.cache.hits, "misses": self.cache.misses,
+                "hit_rate": self.cache.hit_rate}
+
 
 class KeyManagement:
     """Handles all key-related operations"""
     
-    def __init__(self):
-        self.db = Database()
+    def __init__(self, db: Database = None, ledger=None):
+        self.db = db or Database()
+        self.ledger = ledger
+        self.button_keys = ButtonKeyStore(self.db)
         
         # Set up logging
         logging.basicConfig(
@@ -22,24 +56,11 @@ class KeyManagement:
         print(f"Loaded keys for variants: {list(keys.keys())}")  # Debug
         return keys
     
-    def get_and_use_key(self, variant_key: str, user_id: str, user_name: str = None) -> str:
+    def get_and_use_key(self, variant_key: str, user_id: str, user_name: str = None, invoice_id: str = None) -> str:
         """Get a key and mark it as used"""
         print(f"Attempting to get key for variant {variant_key} and user {user_id}")  # Debug
         key = self.db.get_and_use_key(variant_key, user_id, user_name)
         print(f"Retrieved key: {'Found' if key else 'None'}")  # Debug
+        if key and self.ledger:
+            self.ledger.record(KEY_CLAIMED, invoice_id, user_id, variant_key=variant_key)
         return key
-
-    @property
-    def button_keys(self):
-        """Property to maintain compatibility with existing code"""
-        class ButtonKeyProxy:
-            def __init__(self, db):
-                self.db = db
-            
-            def __setitem__(self, invoice_id, product_key):
-                self.db.store_button_key(invoice_id, product_key)
-            
-            def __getitem__(self, invoice_id):
-                return self.db.get_button_key(invoice_id)
-        
-        return ButtonKeyProxy(self.db) 
\ No newline at end of file
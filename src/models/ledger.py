@@ -0,0 +1,95 @@
+import asyncio
+import json
+import logging
+from datetime import datetime
+from src.config.settings import LEDGER_FLUSH_INTERVAL, LEDGER_MAX_BATCH
+
+# Event types recorded in payment_events
+INVOICE_CREATED = "invoice_created"
+WEBHOOK_RECEIVED = "webhook_received"
+STATUS_POLLED = "status_polled"
+KEY_CLAIMED = "key_claimed"
+DM_SENT = "dm_sent"
+ROLE_GRANTED = "role_granted"
+ROLE_REVOKED = "role_revoked"
+REMINDER_SENT = "reminder_sent"
+REMINDER_FAILED = "reminder_failed"
+DELIVERY_FAILED = "delivery_failed"
+DELIVERY_DEAD = "delivery_dead"
+
+
+class PaymentLedger:
+    """Append-only log of payment events with group commit.
+
+    `record()` only appends to an in-memory buffer. A background task writes the whole
+    buffer in one transaction LEDGER_FLUSH_INTERVAL seconds after the first event (or
+    sooner once LEDGER_MAX_BATCH events are waiting), so a burst of events costs one
+    fsync per batch instead of one per event. With nothing recorded the task just waits.
+    """
+
+    def __init__(self, db, flush_interval: float = LEDGER_FLUSH_INTERVAL, max_batch: int = LEDGER_MAX_BATCH):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._buffer = []
+        self._wakeup = asyncio.Event()  # Set by every record()
+        self._full = asyncio.Event()  # Set once max_batch events are waiting
+        self._task = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def record(self, event_type: str, invoice_id=None, discord_id=None, **details):
+        self._buffer.append((
+            str(invoice_id) if invoice_id is not None else None,
+            event_type,
+            str(discord_id) if discord_id is not None else None,
+            json.dumps(details, default=str) if details else None,
+            datetime.now()
+        ))
+        self._wakeup.set()
+        if len(self._buffer) >= self.max_batch:
+            self._full.set()
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            self._full.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Write everything buffered so far in one transaction"""
+        if not self._buffer:
+            return
+        batch, self._buffer = self._buffer, []
+        await asyncio.to_thread(self._write, batch)
+
+    def flush_sync(self):
+        """Blocking flush for shutdown paths"""
+        batch, self._buffer = self._buffer, []
+        if batch:
+            self._write(batch)
+
+    async def drain(self):
+        """Stop the background flusher and write whatever is left"""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    def _write(self, batch: list):
+        try:
+            with self.db.connect() as conn:
+                conn.executemany("""
+                    INSERT INTO payment_events (invoice_id, event_type, discord_id, details, created_at)
+                    VALUES (?, ?, ?, ?, ?)
+                """, batch)
+                conn.commit()
+        except Exception as e:
+            logging.error(f"Failed to write {len(batch)} ledger events: {e}")
@@ -8,6 +8,7 @@ class ProductDelivery:
     def __init__(self, bot: discord.Client, key_manager):
         self.bot = bot
         self.key_manager = key_manager
+        self._delivery_view = None
         self.ICON_URL = "https://media.discordapp.net/attachments/1237105773138542763/1338023352790683739/logox.png?ex=67ad875a&is=67ac35da&hm=54647bdf1b78af6b677a6b0b214fd49e3d4f80918d5e3e132c3e5f2f76c6ee37&=&format=webp&quality=lossless&width=1024&height=1024"
 
     async def create_delivery_embed(self, product_key: str, invoice_id: str) -> discord.Embed:
@@ -95,7 +96,14 @@ class ProductDelivery:
         return embed
 
     def create_delivery_view(self, invoice_id: str, product_key: str) -> View:
-        """Create the delivery view with enhanced buttons"""
+        """Return the delivery view with enhanced buttons"""
+        self.key_manager.button_keys[f"copy_{invoice_id}"] = product_key
+        if self._delivery_view is None:
+            self._delivery_view = self._build_delivery_view()
+        return self._delivery_view
+
+    def _build_delivery_view(self) -> View:
+        """Build the link-only delivery view once, it's identical for every delivery"""
         view = discord.ui.View(timeout=None)  # Buttons never expire
         
         # Support Guide Button
@@ -113,9 +121,7 @@ class ProductDelivery:
             emoji="🛟",
             url="https://discord.gg/zwiftresells"
         ))
-        
-        self.key_manager.button_keys[f"copy_{invoice_id}"] = product_key
-        return view 
+        return view
 
     async def send_success_message(self, user: discord.User, invoice_id: str):
         embed = discord.Embed(
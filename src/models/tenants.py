@@ -0,0 +1,159 @@
+import json
+from itertools import zip_longest
+from src.models.catalog import ProductCatalog
+from src.models.coupons import CouponCache
+from src.utils.sellauth_client import SellAuthClient
+from src.config.settings import SELLAUTH_API_KEY, SHOP_ID, GUILD_ID, CUSTOMER_ROLE_ID, WEBHOOK_SECRET
+
+# The storefront configured through .env, always present so single-shop setups need no rows
+DEFAULT_TENANT_ID = "default"
+
+
+class Tenant:
+    """One storefront: a SellAuth shop sold in one guild, with its own client, catalog and coupons"""
+
+    def __init__(self, tenant_id: str, name: str, shop_id: str, api_key: str, guild_id: int,
+                 role_id: int = 0, webhook_secret: str = None, products: dict = None):
+        self.id = tenant_id
+        self.name = name
+        self.shop_id = str(shop_id)
+        self.guild_id = int(guild_id or 0)
+        self.role_id = int(role_id or 0)
+        self.webhook_secret = webhook_secret
+        self.products = products  # Catalog seed, None means src.config.constants.PRODUCTS
+        self.config = (self.shop_id, api_key, self.guild_id, self.role_id, webhook_secret, products)
+        self.sellauth = SellAuthClient(api_key, shop_id, name=f"sellauth:{tenant_id}")
+        self.catalog = ProductCatalog(self.sellauth, seed=products)
+        self.coupons = CouponCache(self.sellauth)
+        self.active_invoices = {}  # invoice_id -> discord user id, polled by check_invoice_status
+        self.purchase_view = None  # Persistent view, registered by the commands cog
+        self.poll_offset = 0
+
+    @classmethod
+    def from_settings(cls) -> "Tenant":
+        return cls(DEFAULT_TENANT_ID, "Default", SHOP_ID, SELLAUTH_API_KEY, GUILD_ID, CUSTOMER_ROLE_ID, WEBHOOK_SECRET)
+
+    @classmethod
+    def from_row(cls, row: dict) -> "Tenant":
+        products = json.loads(row["products_json"]) if row.get("products_json") else None
+        return cls(
+            row["id"], row["name"], row["shop_id"], row["api_key"], row["guild_id"],
+            row.get("customer_role_id"), row.get("webhook_secret"), products
+        )
+
+    def next_poll_batch(self, limit: int) -> list:
+        """Up to `limit` tracked invoices as (invoice_id, user_id), continuing where the last batch stopped"""
+        items = list(self.active_invoices.items())
+        if not items:
+            return []
+        start = self.poll_offset % len(items)
+        batch = (items[start:] + items[:start])[:limit]
+        self.poll_offset = start + len(batch)
+        return batch
+
+
+class TenantRegistry:
+    """Every storefront served by this process, looked up by id, guild or tracked invoice.
+
+    The default tenant comes from .env; the rest are rows in the tenants table. Each
+    tenant keeps its own SellAuth client (connection pool and circuit breaker), so one
+    shop's outage or backlog never blocks another's. `owns_guild` limits guild-bound
+    work to the tenants whose guild this process's shards receive.
+    """
+
+    def __init__(self, db, owns_guild=None):
+        self.db = db
+        self.owns_guild = owns_guild or (lambda guild_id: True)
+        self.default = Tenant.from_settings()
+        self.tenants = {DEFAULT_TENANT_ID: self.default}
+        self._by_guild = {}
+        self._poll_cursor = 0
+        self.load()
+
+    def load(self) -> list:
+        """(Re)load tenants from the DB, returns the tenants that were replaced or removed.
+
+        Tenants whose configuration didn't change keep their client, catalog and
+        tracked invoices. The caller should close the returned tenants' clients.
+        """
+        tenants = {DEFAULT_TENANT_ID: self.default}
+        for row in self.db.get_tenants():
+            if row["id"] == DEFAULT_TENANT_ID:
+                print("Ignoring tenants row 'default', the default tenant is configured in .env")
+                continue
+            if not row.get("webhook_secret"):
+                print(f"Ignoring tenant {row['id']}, it has no webhook secret")
+                continue
+            current = self.tenants.get(row["id"])
+            tenant = Tenant.from_row(row)
+            if current and current.config == tenant.config:
+                tenant = current
+            elif current:
+                tenant.active_invoices.update(current.active_invoices)
+            tenants[tenant.id] = tenant
+
+        retired = [tenant for tenant_id, tenant in self.tenants.items() if tenants.get(tenant_id) is not tenant]
+        self.tenants = tenants
+
+        # A guild belongs to the first tenant that claims it, .env only fills in unclaimed guilds
+        self._by_guild = {}
+        for tenant in list(tenants.values())[1:] + [self.default]:
+            if not tenant.guild_id:
+                continue
+            if tenant.guild_id in self._by_guild:
+                print(f"Tenant {tenant.id} shares guild {tenant.guild_id} with {self._by_guild[tenant.guild_id].id}, ignoring it there")
+                continue
+            self._by_guild[tenant.guild_id] = tenant
+
+        print(f"Loaded {len(tenants)} tenants")
+        return retired
+
+    def __iter__(self):
+        return iter(list(self.tenants.values()))
+
+    def __len__(self) -> int:
+        return len(self.tenants)
+
+    def get(self, tenant_id: str):
+        return self.tenants.get(tenant_id or DEFAULT_TENANT_ID)
+
+    def for_guild(self, guild_id) -> Tenant:
+        """The tenant selling in `guild_id`, or the default tenant (e.g. in DMs)"""
+        return self._by_guild.get(int(guild_id or 0), self.default)
+
+    def for_invoice(self, invoice_id):
+        """The tenant tracking `invoice_id`, or None"""
+        for tenant in self.tenants.values():
+            if invoice_id in tenant.active_invoices:
+                return tenant
+        return None
+
+    def owned(self) -> list:
+        """Tenants whose guild belongs to this process"""
+        return [tenant for tenant in self.tenants.values() if self.owns_guild(tenant.guild_id)]
+
+    def guild_ids(self, owned: bool = False) -> list:
+        return [guild_id for guild_id in self._by_guild if not owned or self.owns_guild(guild_id)]
+
+    def poll_schedule(self, per_tenant: int) -> list:
+        """This tick's invoice checks as (tenant, invoice_id, user_id), interleaved across tenants.
+
+        Every owned tenant with tracked invoices and a closed breaker gets up to `per_tenant`
+        checks, taken in turns starting from a different tenant each tick, so a shop
+        with a large backlog can't push the others' invoices back.
+        """
+        tenants = [t for t in self.owned() if t.active_invoices and not t.sellauth.breaker.is_open()]
+        if not tenants:
+            return []
+        start = self._poll_cursor % len(tenants)
+        self._poll_cursor += 1
+        tenants = tenants[start:] + tenants[:start]
+
+        batches = [[(tenant, invoice_id, user_id) for invoice_id, user_id in tenant.next_poll_batch(per_tenant)]
+                   for tenant in tenants]
+        return [check for turn in zip_longest(*batches) for check in turn if check is not None]
+
+    async def close(self, tenants: list = None):
+        """Close the SellAuth clients of `tenants` (all of them by default)"""
+        for tenant in tenants if tenants is not None else self:
+            await tenant.sellauth.close()
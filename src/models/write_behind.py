@@ -0,0 +1,111 @@
+import asyncio
+import itertools
+import logging
+import threading
+from collections import OrderedDict
+from src.config.settings import WRITE_BEHIND_INTERVAL, WRITE_BEHIND_MAX_PENDING
+
+
+class WriteBehindBuffer:
+    """Collects small DB writes and commits them together.
+
+    Each write is a callable that takes an open connection. Writes with the same `key`
+    coalesce (only the latest runs), so repeated upserts of one row cost one statement.
+    Everything pending is committed in a single transaction WRITE_BEHIND_INTERVAL seconds
+    after the first write, or as soon as WRITE_BEHIND_MAX_PENDING writes are waiting;
+    with nothing queued the flusher just waits. A batch that fails to commit goes back
+    in the buffer and is retried on the next flush.
+    `flush_sync()` gives callers read-your-writes, and `drain()` empties the buffer on
+    shutdown.
+    """
+
+    def __init__(self, db, interval: float = WRITE_BEHIND_INTERVAL, max_pending: int = WRITE_BEHIND_MAX_PENDING):
+        self.db = db
+        self.interval = interval
+        self.max_pending = max_pending
+        self.flushed_batches = 0
+        self.flushed_writes = 0
+        self._ops = OrderedDict()
+        self._lock = threading.Lock()  # Guards _ops
+        self._write_lock = threading.Lock()  # Keeps batches committing in order
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()  # Set by every put()
+        self._full = asyncio.Event()  # Set once max_pending writes are waiting
+        self._task = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def put(self, write, key=None):
+        """Queue `write(conn)`; a later write with the same key replaces this one"""
+        with self._lock:
+            if key is None:
+                key = ("_", next(self._counter))
+            else:
+                self._ops.pop(key, None)
+            self._ops[key] = write
+            full = len(self._ops) >= self.max_pending
+        self._wakeup.set()
+        if full:
+            self._full.set()
+
+    @property
+    def pending(self) -> int:
+        return len(self._ops)
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            self._full.clear()
+            await self.flush()
+            if self._ops:
+                self._wakeup.set()  # A failed batch was requeued, try again after another interval
+
+    async def flush(self):
+        if self._ops:
+            await asyncio.to_thread(self.flush_sync)
+
+    def flush_sync(self):
+        """Commit everything queued so far before returning"""
+        with self._write_lock:
+            with self._lock:
+                batch, self._ops = self._ops, OrderedDict()
+            if not batch:
+                return
+            try:
+                with self.db.connect() as conn:
+                    for key, write in batch.items():
+                        try:
+                            write(conn)
+                        except Exception as e:
+                            logging.error(f"Buffered write {key} failed: {e}")
+                    conn.commit()
+                self.flushed_batches += 1
+                self.flushed_writes += len(batch)
+            except Exception as e:
+                logging.error(f"Failed to flush {len(batch)} buffered writes, retrying on the next flush: {e}")
+                self._requeue(batch)
+
+    def _requeue(self, batch: OrderedDict):
+        """Put a failed batch back in front of the buffer, keeping writes queued since then"""
+        with self._lock:
+            merged = OrderedDict((key, write) for key, write in batch.items() if key not in self._ops)
+            merged.update(self._ops)
+            self._ops = merged
+
+    async def drain(self):
+        """Stop the background flusher and write whatever is left"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.to_thread(self.flush_sync)
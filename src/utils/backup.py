@@ -0,0 +1,86 @@
+import gzip
+import shutil
+import sqlite3
+import time
+from datetime import datetime
+from pathlib import Path
+from src.config.settings import (
+    DATABASE_PATH, ARCHIVE_DATABASE_PATH, BACKUP_DIR, BACKUP_KEEP, BACKUP_PAGES_PER_STEP, BACKUP_STEP_SLEEP
+)
+
+
+class BackupError(Exception):
+    """Raised when a snapshot fails its integrity check"""
+
+
+class BackupManager:
+    """Online SQLite snapshots using the backup API.
+
+    The copy runs a few pages at a time with a short sleep between steps, so the bot's
+    writers only ever wait for one step. Each snapshot is checked with
+    `PRAGMA integrity_check`, gzipped, and only the newest `keep` are kept. The hot
+    database and the archive database (once it exists) each get their own snapshot,
+    prefix and rotation.
+    """
+
+    def __init__(self, db_path: str = DATABASE_PATH, archive_path: str = ARCHIVE_DATABASE_PATH,
+                 backup_dir: str = BACKUP_DIR, keep: int = BACKUP_KEEP):
+        self.sources = {"database": db_path, "archive": archive_path}
+        self.backup_dir = Path(backup_dir)
+        self.keep = keep
+        self.last_result = None
+
+    def run(self) -> dict:
+        """Take, verify, compress and rotate one snapshot of each database (blocking, run it in a thread)"""
+        started = time.monotonic()
+        self.backup_dir.mkdir(parents=True, exist_ok=True)
+        stamp = f"{datetime.now():%Y%m%d-%H%M%S}"
+
+        files = []
+        for prefix, path in self.sources.items():
+            if prefix != "database" and not (path and Path(path).exists()):
+                continue  # The archive is only created by the first archive run
+            compressed = self.snapshot(path, self.backup_dir / f"{prefix}-{stamp}.db")
+            self.rotate(prefix)
+            files.append({"path": str(compressed), "size": compressed.stat().st_size})
+
+        self.last_result = {
+            "files": files,
+            "duration": time.monotonic() - started,
+            "finished_at": datetime.now()
+        }
+        for file in files:
+            print(f"Backup written to {file['path']} ({file['size']} bytes)")
+        print(f"Backup finished in {self.last_result['duration']:.1f}s")
+        return self.last_result
+
+    @staticmethod
+    def snapshot(source_path: str, snapshot: Path) -> Path:
+        """Copy `source_path` to `snapshot`, verify it and gzip it, returns the .gz path"""
+        source = sqlite3.connect(source_path)
+        target = sqlite3.connect(snapshot)
+        try:
+            source.backup(target, pages=BACKUP_PAGES_PER_STEP, sleep=BACKUP_STEP_SLEEP)
+            result = target.execute("PRAGMA integrity_check").fetchone()[0]
+        finally:
+            target.close()
+            source.close()
+
+        if result != "ok":
+            snapshot.unlink(missing_ok=True)
+            raise BackupError(f"Integrity check failed for {source_path}: {result}")
+
+        compressed = snapshot.with_suffix(".db.gz")
+        with open(snapshot, "rb") as raw, gzip.open(compressed, "wb") as packed:
+            shutil.copyfileobj(raw, packed)
+        snapshot.unlink()
+        return compressed
+
+    def rotate(self, prefix: str = "database"):
+        snapshots = sorted(self.backup_dir.glob(f"{prefix}-*.db.gz"), reverse=True)
+        for old in snapshots[self.keep:]:
+            old.unlink()
+
+
+if __name__ == "__main__":
+    BackupManager().run()
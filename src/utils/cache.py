@@ -0,0 +1,105 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Small dict cache whose entries expire after `ttl` seconds, holding at most `maxsize` of them.
+
+    Every entry gets the same ttl, so insertion order is expiry order: each set() drops
+    expired entries from the front, and the oldest entries go first when the cache is full.
+    Keys that are never read again (e.g. one-off invoice ids) therefore can't pile up.
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    def set(self, key, value):
+        now = time.monotonic()
+        self._data[key] = (value, now + self.ttl)
+        self._data.move_to_end(key)
+        while self._data:
+            oldest = next(iter(self._data.values()))
+            if oldest[1] >= now and len(self._data) <= self.maxsize:
+                break
+            self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        self._data.pop(key, None)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class LRUCache:
+    """Bounded cache that evicts the least recently used entry and expires entries after `ttl` seconds"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None or entry[1] < time.monotonic():
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def set(self, key, value):
+        self._data[key] = (value, time.monotonic() + self.ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        self._data.pop(key, None)
+
+    def purge_expired(self) -> int:
+        now = time.monotonic()
+        expired = [key for key, (_, expires_at) in self._data.items() if expires_at < now]
+        for key in expired:
+            del self._data[key]
+        return len(expired)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into one in-flight coroutine"""
+
+    def __init__(self):
+        self._inflight = {}
+
+    async def do(self, key, factory):
+        """Await `factory()` once per key, every concurrent caller gets the same result"""
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(factory())
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(future)
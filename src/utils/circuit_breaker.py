@@ -0,0 +1,107 @@
+import time
+from collections import deque
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the circuit is open"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} circuit is open, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Closed / open / half-open circuit breaker driven by a rolling failure rate"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate_threshold: float = 0.5,
+        minimum_calls: int = 5,
+        window_size: int = 20,
+        open_seconds: float = 30.0,
+        half_open_max_calls: int = 2
+    ):
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.minimum_calls = minimum_calls
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self._outcomes = deque(maxlen=window_size)  # True = success
+        self._half_open_calls = 0
+        self._half_open_successes = 0
+        self._generation = 0  # Bumped on every transition, so stale slot releases are ignored
+
+    @property
+    def failure_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return self._outcomes.count(False) / len(self._outcomes)
+
+    @property
+    def retry_after(self) -> float:
+        """Seconds until an open circuit lets a probe call through"""
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self.opened_at + self.open_seconds - time.monotonic())
+
+    def is_open(self) -> bool:
+        """True while calls would be rejected (moves to half-open once the timeout passed)"""
+        if self.state == self.OPEN and self.retry_after <= 0:
+            self._transition(self.HALF_OPEN)
+        return self.state == self.OPEN
+
+    def before_call(self) -> int:
+        """Reserve a call slot or raise CircuitOpenError, returns a token for release()"""
+        if self.is_open():
+            raise CircuitOpenError(self.name, self.retry_after)
+        if self.state == self.HALF_OPEN:
+            if self._half_open_calls >= self.half_open_max_calls:
+                raise CircuitOpenError(self.name, self.open_seconds)
+            self._half_open_calls += 1
+        return self._generation
+
+    def release(self, token: int):
+        """Give back a slot whose call ended without an outcome (e.g. it was cancelled)"""
+        if self.state == self.HALF_OPEN and token == self._generation and self._half_open_calls > 0:
+            self._half_open_calls -= 1
+
+    def record_success(self):
+        if self.state == self.HALF_OPEN:
+            self._half_open_successes += 1
+            if self._half_open_successes >= self.half_open_max_calls:
+                self._transition(self.CLOSED)
+            return
+        self._outcomes.append(True)
+
+    def record_failure(self):
+        if self.state == self.HALF_OPEN:
+            self._transition(self.OPEN)
+            return
+        self._outcomes.append(False)
+        if (
+            self.state == self.CLOSED
+            and len(self._outcomes) >= self.minimum_calls
+            and self.failure_rate >= self.failure_rate_threshold
+        ):
+            self._transition(self.OPEN)
+
+    def _transition(self, state: str):
+        if state == self.state:
+            return
+        print(f"Circuit {self.name}: {self.state} -> {state} (failure rate {self.failure_rate:.0%})")
+        self.state = state
+        self._generation += 1
+        self._half_open_calls = 0
+        self._half_open_successes = 0
+        if state == self.OPEN:
+            self.opened_at = time.monotonic()
+        elif state == self.CLOSED:
+            self._outcomes.clear()
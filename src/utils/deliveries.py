@@ -0,0 +1,138 @@
+import asyncio
+import json
+import random
+from datetime import datetime, timedelta
+import discord
+from src.models import ledger
+from src.utils import outbound
+from src.config.settings import (
+    DELIVERY_RETRY_BASE_SECONDS, DELIVERY_RETRY_MAX_SECONDS, DELIVERY_MAX_ATTEMPTS, DELIVERY_RETRY_BATCH
+)
+
+# Delivery kinds, also the `message` of their DM_SENT ledger events
+PURCHASE_CONFIRMATION = "purchase_confirmation"  # Webhook, completed invoice
+PURCHASE_COMPLETED = "purchase_completed"  # Invoice status poller
+DYNAMIC_DELIVERY = "dynamic_delivery"  # Webhook, dynamic delivery
+
+
+class DeliveryFailed(Exception):
+    """Raised when a delivery DM can't be sent"""
+
+
+class DeliveryRetries:
+    """Sends purchase DMs and keeps retrying the ones that fail.
+
+    A DM that can't be sent (unknown user, DMs closed, Discord errors) is stored in
+    delivery_retries with its embed. The worker re-attempts due rows in batches with
+    exponential backoff, and after `max_attempts` failures the row is dead-lettered
+    until an admin replays it. The customer role is granted straight away and the order
+    is recorded as soon as the user can be fetched, so only the DM itself waits.
+    """
+
+    def __init__(self, bot, base: float = DELIVERY_RETRY_BASE_SECONDS, max_delay: float = DELIVERY_RETRY_MAX_SECONDS,
+                 max_attempts: int = DELIVERY_MAX_ATTEMPTS, batch_size: int = DELIVERY_RETRY_BATCH):
+        self.bot = bot
+        self.base = base
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self.batch_size = batch_size
+
+    def backoff(self, attempts: int) -> float:
+        """Seconds to wait after `attempts` failures, with up to 10% jitter so retries don't bunch up"""
+        delay = min(self.max_delay, self.base * 2 ** max(0, attempts - 1))
+        return delay * random.uniform(1.0, 1.1)
+
+    async def deliver(self, kind: str, user_id, invoice_id, embed: discord.Embed, tenant=None,
+                      order: dict = None) -> bool:
+        """DM `embed` to the buyer, queueing a retry if it fails. Returns True if it was sent now.
+
+        `order` holds record_order's keyword arguments, the order is recorded once the
+        user is known. The tenant's customer role is granted either way.
+        """
+        tenant = tenant or self.bot.tenants.default
+        self.bot.role_manager.grant(user_id, tenant.guild_id, tenant.role_id, invoice_id=invoice_id)
+        try:
+            user = await self.bot.member_cache.fetch_user(user_id)
+            if user is not None and order is not None:
+                self.bot.record_order(user, invoice_id, tenant=tenant, **order)
+                order = None
+            await self._send(kind, user, user_id, invoice_id, embed, outbound.DELIVERY)
+            return True
+        except Exception as e:
+            self.schedule(kind, user_id, invoice_id, embed, self._describe(e), tenant, order)
+            return False
+
+    def schedule(self, kind: str, user_id, invoice_id, embed: discord.Embed, error: str, tenant=None,
+                 order: dict = None):
+        """Store a failed delivery for its first retry"""
+        tenant = tenant or self.bot.tenants.default
+        delay = self.backoff(1)
+        payload = json.dumps({"embed": embed.to_dict(), "order": order}, default=str)
+        self.bot.db.add_delivery_retry(
+            kind, invoice_id, user_id, tenant.id, payload, error, datetime.now() + timedelta(seconds=delay)
+        )
+        self.bot.ledger.record(ledger.DELIVERY_FAILED, invoice_id, user_id, kind=kind, attempts=1, error=error)
+        print(f"Could not send {kind} for invoice {invoice_id} to {user_id} ({error}), retrying in {delay:.0f}s")
+
+    async def run_batch(self) -> int:
+        """Re-attempt the deliveries that are due, returns how many were attempted.
+
+        Rows are claimed before sending, so overlapping batches (the worker and
+        /replaydelivery) never DM the same delivery twice.
+        """
+        rows = self.bot.db.claim_due_delivery_retries(self.batch_size)
+        if not rows:
+            return 0
+
+        errors = await asyncio.gather(*(self._retry(row) for row in rows))
+        delivered, failed = [], []
+        now = datetime.now()
+        for row, error in zip(rows, errors):
+            if error is None:
+                delivered.append(row["id"])
+                continue
+            attempts = row["attempts"] + 1
+            if attempts >= self.max_attempts:
+                failed.append(("dead", attempts, error, now, row["id"]))
+                self.bot.ledger.record(
+                    ledger.DELIVERY_DEAD, row["invoice_id"], row["discord_id"], kind=row["kind"], attempts=attempts, error=error
+                )
+                print(f"Gave up on {row['kind']} for invoice {row['invoice_id']} after {attempts} attempts: {error}")
+            else:
+                failed.append(("pending", attempts, error, now + timedelta(seconds=self.backoff(attempts)), row["id"]))
+
+        self.bot.db.save_delivery_attempts(delivered, failed)
+        if delivered:
+            print(f"Delivered {len(delivered)} of {len(rows)} retried purchase DMs")
+        return len(rows)
+
+    async def _retry(self, row: dict):
+        """One more attempt at a stored delivery, returns None on success or the error"""
+        payload = json.loads(row["payload"])
+        tenant = self.bot.tenants.get(row["tenant_id"]) or self.bot.tenants.default
+        try:
+            self.bot.member_cache.invalidate_user(row["discord_id"])  # Don't reuse a cached "not found"
+            user = await self.bot.member_cache.fetch_user(row["discord_id"])
+            if user is not None and payload.get("order") is not None:
+                # Idempotent per invoice, so repeating it after a failed send is harmless
+                self.bot.record_order(user, row["invoice_id"], tenant=tenant, **payload["order"])
+            embed = discord.Embed.from_dict(payload["embed"])
+            await self._send(row["kind"], user, row["discord_id"], row["invoice_id"], embed, outbound.RETRY)
+            return None
+        except Exception as e:
+            return self._describe(e)
+
+    async def _send(self, kind: str, user, user_id, invoice_id, embed: discord.Embed, priority: int):
+        if user is None:
+            raise DeliveryFailed(f"User {user_id} not found")
+        await self.bot.outbound.submit(priority, "dm", lambda: user.send(embed=embed))
+        print(f"Sent {kind} DM to {user.name} ({user.id})")
+        self.bot.ledger.record(ledger.DM_SENT, invoice_id, user_id, message=kind)
+
+    @staticmethod
+    def _describe(error: Exception) -> str:
+        if isinstance(error, discord.Forbidden):
+            return "DMs closed"
+        if isinstance(error, DeliveryFailed):
+            return str(error)
+        return f"{error.__class__.__name__}: {error}"[:500]
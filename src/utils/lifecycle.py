@@ -0,0 +1,153 @@
+import asyncio
+import functools
+import signal
+import time
+from contextlib import asynccontextmanager
+import discord
+from discord import app_commands
+from discord.ext import tasks
+from src.config.settings import SHUTDOWN_DEADLINE
+
+RESTARTING_MESSAGE = "🔄 The bot is restarting, please try again in a few seconds."
+
+
+async def reject_if_closing(interaction: discord.Interaction) -> bool:
+    """Answer the interaction with a restart notice if the bot is shutting down"""
+    if interaction.client.lifecycle.accepting:
+        return False
+    await interaction.response.send_message(RESTARTING_MESSAGE, ephemeral=True)
+    return True
+
+
+class LifecycleTree(app_commands.CommandTree):
+    """Command tree that stops running commands once shutdown has started"""
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return not await reject_if_closing(interaction)
+
+
+def graceful(func):
+    """Loop body decorator: on shutdown a running iteration is allowed to finish instead of being cancelled"""
+    @functools.wraps(func)
+    async def wrapper(bot, *args, **kwargs):
+        async with bot.lifecycle.iteration(func.__name__):
+            return await func(bot, *args, **kwargs)
+    return wrapper
+
+
+class Lifecycle:
+    """Coordinates a graceful shutdown of the bot.
+
+    On SIGTERM/SIGINT (or any `bot.close()`), new webhooks and interactions are turned
+    away and the background loops are stopped, so nothing new gets queued. Running loop
+    iterations and tracked work (webhooks, invoice-creating interactions) finish, then
+    queued role edits, outbound DMs and buffered DB writes are drained, and finally the
+    webhook server and SellAuth sessions are closed. Waiting stops at SHUTDOWN_DEADLINE
+    seconds so a stuck call can't hold a deploy hostage.
+    """
+
+    def __init__(self, bot, deadline: float = SHUTDOWN_DEADLINE):
+        self.bot = bot
+        self.deadline = deadline
+        self.accepting = True
+        self.in_flight = 0
+        self._shutdown_task = None
+        self._close_task = None
+        self.iterating = set()  # Names of @graceful loops in the middle of an iteration
+
+    def install_signal_handlers(self):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(sig, self._on_signal, sig)
+            except (NotImplementedError, RuntimeError):
+                pass  # Not supported on this platform (e.g. Windows), Ctrl+C still works
+
+    def _on_signal(self, sig):
+        print(f"\nReceived {signal.Signals(sig).name}, shutting down...")
+        # Keep a reference, the event loop only holds tasks weakly
+        if self._close_task is None:
+            self._close_task = asyncio.create_task(self.bot.close())
+
+    @asynccontextmanager
+    async def track(self):
+        """Count a unit of work as in flight so shutdown waits for it"""
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+
+    @asynccontextmanager
+    async def iteration(self, name: str):
+        """Mark a loop iteration as running (and in flight) until it returns"""
+        self.iterating.add(name)
+        try:
+            async with self.track():
+                yield
+        finally:
+            self.iterating.discard(name)
+
+    def shutdown(self) -> asyncio.Task:
+        """Start the shutdown once, every caller awaits the same task"""
+        if self._shutdown_task is None:
+            self._shutdown_task = asyncio.create_task(self._shutdown())
+        return self._shutdown_task
+
+    async def _shutdown(self):
+        started = time.monotonic()
+        self.accepting = False
+
+        def remaining() -> float:
+            return max(0.0, self.deadline - (time.monotonic() - started))
+
+        # Stop the loops before draining so they don't keep queueing work
+        self.stop_loops()
+
+        while self.in_flight and remaining():
+            await asyncio.sleep(0.05)
+
+        # Roles go through the outbound queue and both write to the DB, so drain in this order
+        for name, drain in (
+            ("role changes", self.bot.role_manager.drain),
+            ("outbound Discord calls", self.bot.outbound.drain),
+            ("buffered writes", self.bot.db.write_buffer.drain),
+            ("ledger events", self.bot.ledger.drain),
+        ):
+            try:
+                await asyncio.wait_for(drain(), timeout=remaining())
+            except asyncio.TimeoutError:
+                print(f"Shutdown deadline reached while draining {name}")
+            except Exception as e:
+                print(f"Error draining {name}: {e}")
+
+        # Local writes are quick, never drop them even when the deadline has passed
+        self.bot.db.write_buffer.flush_sync()
+        self.bot.ledger.flush_sync()
+
+        self.cancel_loops()
+        self.bot.watchdog.stop()
+
+        if self.bot.webhook_handler:
+            await self.bot.webhook_handler.stop()
+        await self.bot.tenants.close()
+        print(f"Shutdown drained in {time.monotonic() - started:.1f}s")
+
+    def _loops(self) -> dict:
+        return {name: getattr(self.bot, name) for name, value in vars(type(self.bot)).items() if isinstance(value, tasks.Loop)}
+
+    def stop_loops(self):
+        """Let @graceful loops finish their running iteration (it's tracked as in flight), cancel the rest.
+
+        A stopped loop that is sleeping would still run one more iteration when it wakes up,
+        so only loops that are mid-iteration are stopped rather than cancelled.
+        """
+        for name, loop in self._loops().items():
+            if name in self.iterating:
+                loop.stop()
+            else:
+                loop.cancel()
+
+    def cancel_loops(self):
+        for loop in self._loops().values():
+            loop.cancel()
@@ -0,0 +1,70 @@
+import discord
+from src.utils.cache import LRUCache
+from src.config.settings import (
+    INTENT_MEMBERS, INTENT_MESSAGE_CONTENT, MEMBER_CACHE_FLAGS, MEMBER_LRU_SIZE, MEMBER_LRU_TTL
+)
+
+_MISSING = object()  # Cached "not found" so unknown ids don't hit the API every time
+
+
+def build_intents() -> discord.Intents:
+    intents = discord.Intents.default()
+    intents.guilds = True
+    intents.members = INTENT_MEMBERS
+    intents.message_content = INTENT_MESSAGE_CONTENT
+    return intents
+
+
+def build_member_cache_flags(intents: discord.Intents) -> discord.MemberCacheFlags:
+    """MEMBER_CACHE_FLAGS: "none" (default), "joined" or "all" (everything the intents allow)"""
+    if MEMBER_CACHE_FLAGS == "all":
+        return discord.MemberCacheFlags.from_intents(intents)
+    if MEMBER_CACHE_FLAGS == "joined" and intents.members:
+        return discord.MemberCacheFlags(joined=True)
+    return discord.MemberCacheFlags.none()
+
+
+class MemberCache:
+    """Small LRU in front of on-demand user and member fetches.
+
+    With the gateway member cache disabled, `get_user`/`get_member` usually miss, so
+    lookups fall back to REST. This keeps the most recently used results (and misses)
+    for MEMBER_LRU_TTL seconds so repeat deliveries and reconciliation don't refetch.
+    """
+
+    def __init__(self, bot, maxsize: int = MEMBER_LRU_SIZE, ttl: float = MEMBER_LRU_TTL):
+        self.bot = bot
+        self.users = LRUCache(maxsize, ttl)
+        self.members = LRUCache(maxsize, ttl)
+
+    async def fetch_user(self, user_id: int):
+        """Return the user, or None if it doesn't exist"""
+        user_id = int(user_id)
+        user = self.bot.get_user(user_id) or self.users.get(user_id)
+        if user is None:
+            try:
+                user = await self.bot.fetch_user(user_id)
+            except discord.NotFound:
+                user = _MISSING
+            self.users.set(user_id, user)
+        return None if user is _MISSING else user
+
+    async def fetch_member(self, guild: discord.Guild, member_id: int):
+        """Return the guild member, or None if they aren't in the guild"""
+        member_id = int(member_id)
+        member = guild.get_member(member_id) or self.members.get((guild.id, member_id))
+        if member is None:
+            try:
+                member = await guild.fetch_member(member_id)
+            except discord.NotFound:
+                member = _MISSING
+            self.members.set((guild.id, member_id), member)
+        return None if member is _MISSING else member
+
+    def invalidate_user(self, user_id: int):
+        """Forget a user (or a cached miss) so the next lookup asks Discord again"""
+        self.users.invalidate(int(user_id))
+
+    def invalidate(self, guild_id: int, member_id: int):
+        """Forget a member after their roles change"""
+        self.members.invalidate((guild_id, int(member_id)))
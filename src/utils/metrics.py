@@ -0,0 +1,50 @@
+import functools
+import time
+from collections import defaultdict, deque
+
+
+class LatencyRecorder:
+    """Keeps the most recent samples of a timing so percentiles can be reported"""
+
+    def __init__(self, max_samples: int = 1000):
+        self.samples = deque(maxlen=max_samples)
+        self.count = 0
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+        self.count += 1
+
+    def percentile(self, p: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def summary(self) -> str:
+        return (
+            f"n={self.count} p50={self.percentile(50) * 1000:.0f}ms "
+            f"p95={self.percentile(95) * 1000:.0f}ms max={max(self.samples, default=0) * 1000:.0f}ms"
+        )
+
+
+# Process-wide timings, keyed by metric name
+timings = defaultdict(LatencyRecorder)
+
+
+def record_timing(name: str, seconds: float):
+    timings[name].record(seconds)
+
+
+def timed(name: str):
+    """Record every run of the decorated coroutine function under `name`"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = time.monotonic()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                record_timing(name, time.monotonic() - started)
+        return wrapper
+    return decorator
@@ -0,0 +1,113 @@
+import asyncio
+import itertools
+import time
+import discord
+from src.utils.metrics import record_timing
+from src.config.settings import OUTBOUND_ROUTE_LIMITS, OUTBOUND_MAX_RETRIES, OUTBOUND_BACKOFF_SECONDS
+
+# Priority classes, lower runs first
+DELIVERY = 0
+ROLE = 1
+RETRY = 2
+REMINDER = 3
+BROADCAST = 4
+CLASS_NAMES = {DELIVERY: "delivery", ROLE: "role", RETRY: "retry", REMINDER: "reminder", BROADCAST: "broadcast"}
+
+
+class OutboundScheduler:
+    """Priority queues for outbound Discord REST calls.
+
+    Callers `await submit(priority, route, factory)` and get the call's result (or its
+    exception) back. Each route ("dm", "roles", ...) has its own priority queue served by
+    as many workers as the route's concurrency limit, so a free worker always takes the
+    highest-priority job waiting for that route. When Discord answers 429, delivery
+    retries, reminders and broadcasts are held back until the retry-after has passed,
+    while fresh deliveries and role edits keep going. Queue wait is recorded per class as `outbound_wait.<class>`
+    timings.
+    """
+
+    def __init__(self, route_limits: dict = OUTBOUND_ROUTE_LIMITS):
+        self.route_limits = route_limits
+        self._queues = {}  # route -> PriorityQueue
+        self._workers = []
+        self._seq = itertools.count()
+        self._backoff_until = 0.0
+        self._active = 0  # Jobs running or parked for a backoff
+
+    async def submit(self, priority: int, route: str, factory):
+        """Queue `factory()` (a coroutine function) and wait for its result"""
+        future = asyncio.get_running_loop().create_future()
+        self._put((priority, next(self._seq), time.monotonic(), route, factory, future, 0))
+        return await future
+
+    @property
+    def pending(self) -> int:
+        return sum(queue.qsize() for queue in self._queues.values())
+
+    def _put(self, job: tuple):
+        route = job[3]
+        queue = self._queues.get(route)
+        if queue is None:
+            queue = self._queues[route] = asyncio.PriorityQueue()
+            for _ in range(self.route_limits.get(route, 1)):
+                self._workers.append(asyncio.create_task(self._run(queue)))
+        queue.put_nowait(job)
+
+    async def _run(self, queue: asyncio.PriorityQueue):
+        while True:
+            job = await queue.get()
+            priority, _, queued_at, route, factory, future, attempt = job
+            if future.done():
+                continue  # Caller gave up
+
+            delay = self._backoff_until - time.monotonic()
+            if priority >= RETRY and delay > 0:
+                # Park it without holding a worker
+                self._active += 1
+                asyncio.get_running_loop().call_later(delay, self._unpark, job)
+                continue
+
+            if attempt == 0:
+                record_timing(f"outbound_wait.{CLASS_NAMES[priority]}", time.monotonic() - queued_at)
+            self._active += 1
+            try:
+                result = await factory()
+            except Exception as e:
+                retry_after = self._retry_after(e)
+                if retry_after is not None:
+                    self._backoff_until = max(self._backoff_until, time.monotonic() + retry_after)
+                    if priority >= RETRY and attempt < OUTBOUND_MAX_RETRIES:
+                        self._put((priority, next(self._seq), queued_at, route, factory, future, attempt + 1))
+                        continue
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+            finally:
+                self._active -= 1
+
+    def _unpark(self, job: tuple):
+        self._active -= 1
+        self._put(job)
+
+    async def drain(self):
+        """Wait for every queued and running call to finish, then stop the workers"""
+        while self.pending or self._active:
+            await asyncio.sleep(0.05)
+        for worker in self._workers:
+            worker.cancel()
+        self._workers = []
+        self._queues = {}
+
+    @staticmethod
+    def _retry_after(error: Exception):
+        """Seconds to back off for a rate-limit error, None for anything else"""
+        if isinstance(error, discord.RateLimited):
+            return error.retry_after
+        if isinstance(error, discord.HTTPException) and error.status == 429:
+            try:
+                return float(error.response.headers.get("Retry-After", OUTBOUND_BACKOFF_SECONDS))
+            except (AttributeError, TypeError, ValueError):
+                return OUTBOUND_BACKOFF_SECONDS
+        return None
@@ -0,0 +1,27 @@
+from src.config.settings import (
+    POLL_MIN_SECONDS, POLL_BASE_SECONDS, POLL_MAX_SECONDS, POLL_TARGET_LATENCY
+)
+
+
+def next_poll_interval(latency: float, active_count: int, retry_after: float = 0.0) -> float:
+    """Work out the next poll interval from API latency and the number of tracked invoices.
+
+    No invoices means nothing to wait for, so we idle at the max interval. A handful of
+    invoices polls faster than the base, a large backlog or a slow API backs off so each
+    tick doesn't pile up more requests than SellAuth can answer.
+    """
+    if retry_after:
+        return min(POLL_MAX_SECONDS, max(POLL_MIN_SECONDS, retry_after))
+    if active_count == 0:
+        return POLL_MAX_SECONDS
+
+    interval = POLL_BASE_SECONDS
+    if active_count <= 3:
+        interval /= 2
+    elif active_count > 20:
+        interval *= active_count / 20
+
+    if latency > POLL_TARGET_LATENCY:
+        interval *= latency / POLL_TARGET_LATENCY
+
+    return min(POLL_MAX_SECONDS, max(POLL_MIN_SECONDS, interval))
@@ -0,0 +1,103 @@
+import asyncio
+import collections
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from src.utils.metrics import timings
+from src.config.settings import PROFILE_SAMPLE_INTERVAL
+
+# Background loops whose per-run timings are included in every report
+PROFILED_LOOPS = ("check_invoices", "check_invoice_status", "check_expiring_subs")
+
+
+class ProfilerBusy(Exception):
+    """Raised when a profile is requested while another one is running"""
+
+
+class Profiler:
+    """Time-boxed sampling profiler for the event loop thread.
+
+    A helper thread samples the loop thread's stack every PROFILE_SAMPLE_INTERVAL
+    seconds, so the bot keeps running at full speed apart from the sampling itself.
+    Allocations are compared with tracemalloc snapshots taken at the start and end.
+    """
+
+    def __init__(self, interval: float = PROFILE_SAMPLE_INTERVAL, top: int = 25):
+        self.interval = interval
+        self.top = top
+        self._lock = asyncio.Lock()
+
+    async def run(self, seconds: float) -> str:
+        """Profile the loop for `seconds` and return a plain-text report"""
+        if self._lock.locked():
+            raise ProfilerBusy("A profile is already running")
+        async with self._lock:
+            own = collections.Counter()
+            cumulative = collections.Counter()
+            stop = threading.Event()
+            sampler = threading.Thread(
+                target=self._sample, args=(threading.get_ident(), stop, own, cumulative),
+                name="profiler", daemon=True
+            )
+
+            started_tracing = not tracemalloc.is_tracing()
+            if started_tracing:
+                tracemalloc.start(5)
+            before = tracemalloc.take_snapshot()
+            started = time.monotonic()
+            sampler.start()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                stop.set()
+                await asyncio.to_thread(sampler.join)
+                after = tracemalloc.take_snapshot()
+                if started_tracing:
+                    tracemalloc.stop()
+
+            return self._report(time.monotonic() - started, own, cumulative, after.compare_to(before, "lineno"))
+
+    def _sample(self, thread_id: int, stop: threading.Event, own: collections.Counter, cumulative: collections.Counter):
+        while not stop.wait(self.interval):
+            frame = sys._current_frames().get(thread_id)
+            if frame is None:
+                continue
+            own[self._location(frame, frame.f_lineno)] += 1
+            seen = set()
+            while frame is not None:
+                key = self._location(frame, frame.f_code.co_firstlineno)
+                if key not in seen:
+                    cumulative[key] += 1
+                    seen.add(key)
+                frame = frame.f_back
+
+    @staticmethod
+    def _location(frame, line: int) -> str:
+        path = frame.f_code.co_filename
+        try:
+            path = os.path.relpath(path)
+        except ValueError:
+            pass  # Different drive on Windows
+        return f"{frame.f_code.co_name} ({path}:{line})"
+
+    def _report(self, duration: float, own, cumulative, allocations) -> str:
+        samples = sum(own.values()) or 1
+        lines = [
+            f"Profile taken {datetime.now():%Y-%m-%d %H:%M:%S} over {duration:.1f}s "
+            f"({sum(own.values())} samples every {self.interval * 1000:.0f}ms)",
+            "",
+            "== Top functions by own time (where the loop thread was) ==",
+        ]
+        lines += [f"{count / samples:6.1%}  {location}" for location, count in own.most_common(self.top)]
+        lines += ["", "== Top functions by cumulative time (anywhere on the stack) =="]
+        lines += [f"{count / samples:6.1%}  {location}" for location, count in cumulative.most_common(self.top)]
+        lines += ["", "== Top allocation sites since the start (tracemalloc diff) =="]
+        lines += [str(stat) for stat in allocations[:self.top]]
+        lines += ["", "== Background loop timings =="]
+        for name in PROFILED_LOOPS:
+            recorder = timings.get(f"loop.{name}")
+            lines.append(f"{name}: {recorder.summary() if recorder else 'no runs yet'}")
+        return "\n".join(lines) + "\n"
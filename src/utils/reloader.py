@@ -0,0 +1,102 @@
+import hashlib
+import importlib
+import json
+from pathlib import Path
+import discord
+
+# Modules re-imported before the extensions, so the cogs pick up their new contents
+RELOAD_MODULES = ("src.config.constants", "src.utils.views")
+
+# Files whose changes trigger a reload when file watching is enabled
+ROOT = Path(__file__).resolve().parents[2]
+WATCHED_PATHS = (ROOT / "src/config/constants.py", ROOT / "src/utils/views.py", ROOT / "src/cogs")
+
+# Admin commands acting on the whole process, only synced to the operator's guild (the .env GUILD_ID)
+OPERATOR_COMMANDS = ("tenants", "reload", "profile", "lag", "diagnostics", "backup")
+
+
+class Reloader:
+    """Reloads the product constants, views and cogs in place, without reconnecting.
+
+    Running interactions keep the objects they already hold. Persistent views are
+    re-registered by the reloaded cogs under the same custom ids, and slash commands
+    are only re-synced with a tenant guild when its payload actually changed. Tenant
+    guilds other than the operator's never get the OPERATOR_COMMANDS.
+    """
+
+    def __init__(self, bot, guild_ids: list = None):
+        self.bot = bot
+        self.guild_ids = guild_ids  # None syncs every tenant guild this process owns
+        self.synced_signatures = {}  # guild id -> signature of the last sync
+        self._mtimes = self._scan()
+
+    def guilds(self) -> list:
+        guild_ids = self.guild_ids if self.guild_ids is not None else self.bot.tenants.guild_ids(owned=True)
+        return [discord.Object(id=guild_id) for guild_id in guild_ids]
+
+    def signature(self, guild: discord.abc.Snowflake) -> str:
+        """Hash of the guild's command payloads, as they would be sent to Discord"""
+        payload = []
+        for command in self.bot.tree.get_commands(guild=guild):
+            try:
+                payload.append(command.to_dict(self.bot.tree))
+            except TypeError:
+                payload.append(command.to_dict())  # discord.py < 2.4
+        payload.sort(key=lambda c: (c.get("type", 1), c["name"]))
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+    async def sync_if_changed(self) -> bool:
+        """Sync each guild's commands only if they differ from its last sync, returns True if any synced"""
+        synced = False
+        operator_guild_id = self.bot.tenants.default.guild_id
+        for guild in self.guilds():
+            self.bot.tree.copy_global_to(guild=guild)
+            if guild.id != operator_guild_id:
+                for name in OPERATOR_COMMANDS:
+                    self.bot.tree.remove_command(name, guild=guild)
+            signature = self.signature(guild)
+            if signature == self.synced_signatures.get(guild.id):
+                continue
+            try:
+                commands = await self.bot.tree.sync(guild=guild)
+            except discord.HTTPException as e:
+                print(f"Could not sync commands to guild {guild.id}: {e}")
+                continue
+            self.synced_signatures[guild.id] = signature
+            synced = True
+            print(f"Synced {len(commands)} commands to guild {guild.id}")
+        return synced
+
+    async def reload(self) -> dict:
+        """Re-read constants, rebuild the catalog seeds and reload every extension"""
+        for name in RELOAD_MODULES:
+            importlib.reload(importlib.import_module(name))
+        constants = importlib.import_module("src.config.constants")
+        for tenant in self.bot.tenants:
+            if tenant.products is None:  # Tenants with their own catalog in the DB don't use the constants
+                tenant.catalog.reseed(constants.PRODUCTS)
+
+        extensions = list(self.bot.extensions)
+        for extension in extensions:
+            await self.bot.reload_extension(extension)
+
+        synced = await self.sync_if_changed()
+        self._mtimes = self._scan()
+        print(f"Reloaded {len(extensions)} extensions (commands {'re-synced' if synced else 'unchanged'})")
+        return {"extensions": extensions, "synced": synced, "catalog_version": self.bot.catalog.version}
+
+    def changed(self) -> bool:
+        """True if a watched file was modified since the last reload"""
+        return self._scan() != self._mtimes
+
+    @staticmethod
+    def _scan() -> dict:
+        mtimes = {}
+        for path in WATCHED_PATHS:
+            files = path.glob("*.py") if path.is_dir() else [path]
+            for file in files:
+                try:
+                    mtimes[str(file)] = file.stat().st_mtime
+                except OSError:
+                    pass
+        return mtimes
@@ -0,0 +1,154 @@
+import asyncio
+from collections import OrderedDict
+import discord
+from src.models import ledger
+from src.utils import outbound
+from src.models.tenants import DEFAULT_TENANT_ID
+from src.config.settings import GUILD_ID, CUSTOMER_ROLE_ID, ROLE_OP_INTERVAL
+from src.config.settings import ROLE_RECONCILE_REVOKE, ROLE_RECONCILE_MAX_REVOKES, ROLE_BACKFILL_DAYS
+
+
+class RoleManager:
+    """Queues customer role grants/revocations and applies them at a steady pace.
+
+    Operations are keyed by (guild, member, role) so repeated requests for the same
+    member collapse into one, and the last request wins (a grant followed by a revoke
+    only sends the revoke). Roles are edited through the REST route directly, so no
+    member fetch is needed first.
+    """
+
+    def __init__(self, bot, interval: float = ROLE_OP_INTERVAL, revoke_stale: bool = ROLE_RECONCILE_REVOKE,
+                 max_revokes: int = ROLE_RECONCILE_MAX_REVOKES):
+        self.bot = bot
+        self.interval = interval
+        self.revoke_stale = revoke_stale
+        self.max_revokes = max_revokes
+        self._pending = OrderedDict()  # (guild_id, member_id, role_id) -> ("add" | "remove", invoice_id)
+        self._wakeup = asyncio.Event()
+        self._worker = None
+        self._busy = False
+
+    def start(self):
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+    def grant(self, member_id: int, guild_id: int = GUILD_ID, role_id: int = CUSTOMER_ROLE_ID, invoice_id=None):
+        self._queue(int(member_id), guild_id, role_id, "add", invoice_id)
+
+    def revoke(self, member_id: int, guild_id: int = GUILD_ID, role_id: int = CUSTOMER_ROLE_ID, invoice_id=None):
+        self._queue(int(member_id), guild_id, role_id, "remove", invoice_id)
+
+    def _queue(self, member_id: int, guild_id: int, role_id: int, action: str, invoice_id=None):
+        if not guild_id or not role_id:
+            return
+        key = (guild_id, member_id, role_id)
+        self._pending.pop(key, None)
+        self._pending[key] = (action, invoice_id)
+        self._wakeup.set()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    async def _run(self):
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            (guild_id, member_id, role_id), (action, invoice_id) = self._pending.popitem(last=False)
+            self._busy = True
+            try:
+                await self._apply(guild_id, member_id, role_id, action, invoice_id)
+            finally:
+                self._busy = False
+            await asyncio.sleep(self.interval)
+
+    async def drain(self):
+        """Apply every queued role change, then stop the worker"""
+        while self._pending or self._busy:
+            await asyncio.sleep(self.interval)
+        if self._worker:
+            self._worker.cancel()
+
+    async def _apply(self, guild_id: int, member_id: int, role_id: int, action: str, invoice_id=None):
+        try:
+            if action == "add":
+                await self.bot.outbound.submit(outbound.ROLE, "roles", lambda: self.bot.http.add_role(
+                    guild_id, member_id, role_id, reason="Customer purchase"
+                ))
+                print(f"Added customer role to {member_id}")
+                self.bot.member_cache.invalidate(guild_id, member_id)
+                self.bot.ledger.record(ledger.ROLE_GRANTED, invoice_id, member_id, guild_id=guild_id, role_id=role_id)
+            else:
+                await self.bot.outbound.submit(outbound.ROLE, "roles", lambda: self.bot.http.remove_role(
+                    guild_id, member_id, role_id, reason="Subscription expired"
+                ))
+                print(f"Removed customer role from {member_id}")
+                self.bot.member_cache.invalidate(guild_id, member_id)
+                self.bot.ledger.record(ledger.ROLE_REVOKED, invoice_id, member_id, guild_id=guild_id, role_id=role_id)
+        except discord.NotFound:
+            pass  # Member left the guild
+        except Exception as e:
+            print(f"Error applying role {action} for {member_id}: {e}")
+
+    async def _role_holders(self, guild: discord.Guild, role: discord.Role):
+        """Ids of members holding `role`, or None without the members intent.
+
+        Uses the member cache if the guild is chunked, otherwise streams the member list
+        page by page over REST and keeps only the ids.
+        """
+        if guild.chunked:
+            return {member.id for member in role.members if not member.bot}
+        if not self.bot.intents.members:
+            return None
+        return {member.id async for member in guild.fetch_members(limit=None) if not member.bot and role in member.roles}
+
+    async def reconcile(self, guild_id: int = GUILD_ID, role_id: int = CUSTOMER_ROLE_ID, tenant_id: str = None):
+        """Diff the role's holders against active subscriptions (of `tenant_id` if given) and queue the fixes.
+
+        Holders with no subscription on record are backfilled rather than revoked, and
+        revocations only happen with ROLE_RECONCILE_REVOKE, at most `max_revokes` per run.
+        """
+        guild = self.bot.get_guild(guild_id)
+        role = guild.get_role(role_id) if guild else None
+        if not role:
+            return
+
+        active = self.bot.db.get_active_subscriber_ids(tenant_id)
+        if active is None:
+            print(f"Skipping role reconciliation in {guild_id}, active subscriptions couldn't be loaded")
+            return
+        holders = await self._role_holders(guild, role)
+
+        # Without the member list stale holders can't be found, so only missing grants are fixed
+        stale = set()
+        if holders is not None and holders - active:
+            backfilled = self.bot.db.backfill_subscriptions(
+                holders - active, tenant_id or DEFAULT_TENANT_ID, ROLE_BACKFILL_DAYS
+            )
+            if backfilled is None:
+                print(f"Not revoking roles in {guild_id}, subscriptions couldn't be backfilled")
+            else:
+                if backfilled:
+                    print(f"Backfilled {len(backfilled)} subscriptions for role holders with none on record")
+                stale = holders - active - backfilled
+        if stale and not self.revoke_stale:
+            print(f"Role reconciliation: {len(stale)} holders without an active subscription kept (ROLE_RECONCILE_REVOKE is off)")
+            stale = set()
+        elif len(stale) > self.max_revokes:
+            print(f"Role reconciliation: {len(stale)} stale holders, revoking {self.max_revokes} this run")
+            stale = set(sorted(stale)[:self.max_revokes])
+        missing = []
+        for member_id in active - (holders or set()):
+            member = await self.bot.member_cache.fetch_member(guild, member_id)
+            if member and role not in member.roles:
+                missing.append(member_id)
+        for member_id in missing:
+            self.grant(member_id, guild_id, role_id)
+        for member_id in stale:
+            self.revoke(member_id, guild_id, role_id)
+
+        if missing or stale:
+            print(f"Role reconciliation: {len(missing)} to grant, {len(stale)} to revoke")
@@ -0,0 +1,144 @@
+import asyncio
+import time
+import aiohttp
+from src.config.settings import (
+    SELLAUTH_API_BASE, SELLAUTH_TIMEOUT, SELLAUTH_BREAKER_FAILURE_RATE,
+    SELLAUTH_BREAKER_MIN_CALLS, SELLAUTH_BREAKER_OPEN_SECONDS, INVOICE_CACHE_TTL, INVOICE_CACHE_SIZE
+)
+from src.utils.circuit_breaker import CircuitBreaker, CircuitOpenError
+from src.utils.cache import TTLCache, SingleFlight
+
+
+class SellAuthUnavailable(Exception):
+    """Raised when SellAuth can't be reached (breaker open, timeout or server error)"""
+
+
+class SellAuthClient:
+    """aiohttp client for one shop's SellAuth calls, guarded by its own circuit breaker"""
+
+    def __init__(self, api_key: str, shop_id: str, base_url: str = SELLAUTH_API_BASE, name: str = "sellauth"):
+        self.api_key = api_key
+        self.shop_id = shop_id
+        self.base_url = base_url
+        self.timeout = aiohttp.ClientTimeout(total=SELLAUTH_TIMEOUT)
+        self.breaker = CircuitBreaker(
+            name,
+            failure_rate_threshold=SELLAUTH_BREAKER_FAILURE_RATE,
+            minimum_calls=SELLAUTH_BREAKER_MIN_CALLS,
+            open_seconds=SELLAUTH_BREAKER_OPEN_SECONDS
+        )
+        self.latency = 0.0  # EWMA of successful call latency in seconds
+        self.invoice_cache = TTLCache(INVOICE_CACHE_TTL, INVOICE_CACHE_SIZE)
+        self._invoice_flight = SingleFlight()
+        self._session = None
+
+    @property
+    def headers(self) -> dict:
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Accept": "application/json",
+            "Content-Type": "application/json"
+        }
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=self.timeout)
+        return self._session
+
+    def _record_latency(self, elapsed: float):
+        self.latency = elapsed if not self.latency else 0.8 * self.latency + 0.2 * elapsed
+
+    async def request(self, method: str, url: str, **kwargs):
+        """Send a request and return (status, json-or-None)"""
+        status, data, _ = await self.request_with_headers(method, url, **kwargs)
+        return status, data
+
+    async def request_with_headers(self, method: str, url: str, **kwargs):
+        """Send a request and return (status, json-or-None, response headers)"""
+        if not url.startswith("http"):
+            url = f"{self.base_url}{url}"
+        try:
+            slot = self.breaker.before_call()
+        except CircuitOpenError as e:
+            raise SellAuthUnavailable(str(e)) from e
+
+        started = time.monotonic()
+        try:
+            headers = {**self.headers, **kwargs.pop("headers", {})}
+            async with self._get_session().request(method, url, headers=headers, **kwargs) as response:
+                try:
+                    data = await response.json(content_type=None)
+                except (aiohttp.ContentTypeError, ValueError):
+                    data = None
+                status = response.status
+                response_headers = dict(response.headers)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.breaker.record_failure()
+            raise SellAuthUnavailable(f"{e.__class__.__name__}: {e}") from e
+        except BaseException:
+            # Cancelled (e.g. an abandoned speculative invoice) or failed locally: no verdict on
+            # SellAuth, but the half-open probe slot must be freed or the breaker never closes
+            self.breaker.release(slot)
+            raise
+
+        if status >= 500 or status == 429:
+            self.breaker.record_failure()
+            raise SellAuthUnavailable(f"SellAuth returned HTTP {status}")
+
+        self.breaker.record_success()
+        self._record_latency(time.monotonic() - started)
+        return status, data, response_headers
+
+    async def create_checkout(self, payload: dict) -> dict:
+        """Create a checkout session, returns the response body or None"""
+        status, data = await self.request("POST", f"/shops/{self.shop_id}/checkout", json=payload)
+        print(f"SELLAUTH Response Status: {status}")
+        print(f"SELLAUTH Response: {data}")
+        return data if status == 200 else None
+
+    async def get_invoice(self, invoice_id: str, max_age: float = None) -> dict:
+        """Fetch a single invoice, returns None if it doesn't exist
+
+        Responses are cached for INVOICE_CACHE_TTL seconds and concurrent lookups of the
+        same invoice (e.g. /status and the poller) share a single HTTP call.
+        Pass max_age=0 to bypass the cache.
+        """
+        key = str(invoice_id)
+        if max_age != 0:
+            cached = self.invoice_cache.get(key)
+            if cached is not None:
+                return cached
+
+        async def fetch():
+            status, data = await self.request("GET", f"/shops/{self.shop_id}/invoices/{key}")
+            if status == 200:
+                self.invoice_cache.set(key, data)
+                return data
+            return None
+
+        return await self._invoice_flight.do(key, fetch)
+
+    async def get_products(self, etag: str = None, last_modified: str = None):
+        """Conditionally fetch the product list, returns (status, products, headers)"""
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        status, data, response_headers = await self.request_with_headers(
+            "GET", f"/shops/{self.shop_id}/products", headers=headers
+        )
+        if isinstance(data, dict):
+            data = data.get("data", [])
+        return status, data, response_headers
+
+    async def get_coupons(self):
+        """Fetch the shop's coupons, returns a list or None"""
+        status, data = await self.request("GET", f"/shops/{self.shop_id}/coupons")
+        if isinstance(data, dict):
+            data = data.get("data", [])
+        return data if status == 200 and isinstance(data, list) else None
+
+    async def close(self):
+        if self._session and not self._session.closed:
+            await self._session.close()
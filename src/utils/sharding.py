@@ -0,0 +1,56 @@
+from src.config.settings import SHARDING, SHARD_COUNT, SHARD_IDS
+
+
+def shard_id_for(guild_id: int, shard_count: int) -> int:
+    """The shard Discord sends `guild_id`'s events to"""
+    return (int(guild_id) >> 22) % shard_count
+
+
+class ShardPlan:
+    """Which gateway shards this process runs, and so which guilds it owns.
+
+    "off" is a single unsharded connection and "auto" runs every shard in this process,
+    so every guild is local either way. With SHARD_IDS (set by launcher.py) the shards
+    are split across processes: guild-bound work (invoice polling, role reconciliation,
+    command sync) runs in the process owning the guild's shard, and process-wide work
+    (expiries, reminders, archival, backups, the webhook server) only in the primary
+    process, the one running shard 0. DMs and role edits are plain REST calls, so they
+    can be sent from any process.
+    """
+
+    def __init__(self, mode: str = SHARDING, shard_count: int = SHARD_COUNT, shard_ids: list = SHARD_IDS):
+        if shard_ids and not shard_count:
+            raise ValueError("SHARD_IDS needs SHARD_COUNT, start split processes with launcher.py")
+        if mode not in ("off", "auto"):
+            raise ValueError(f"Unknown SHARDING mode {mode!r}, expected off or auto")
+        self.mode = "process" if shard_ids else mode
+        self.shard_count = shard_count or None  # None lets discord.py ask for the recommended count
+        self.shard_ids = sorted(shard_ids) or None
+
+    @property
+    def sharded(self) -> bool:
+        return self.mode != "off"
+
+    @property
+    def primary(self) -> bool:
+        return not self.shard_ids or 0 in self.shard_ids
+
+    def owns_guild(self, guild_id) -> bool:
+        """True if this process receives the guild's events (guildless work belongs to the primary)"""
+        if not self.shard_ids:
+            return True
+        if not guild_id:
+            return self.primary
+        return shard_id_for(guild_id, self.shard_count) in self.shard_ids
+
+    def bot_options(self) -> dict:
+        """Keyword arguments for AutoShardedBot"""
+        return {"shard_count": self.shard_count, "shard_ids": self.shard_ids} if self.sharded else {}
+
+    def describe(self) -> str:
+        if self.mode == "off":
+            return "unsharded"
+        if self.mode == "auto":
+            return f"all {self.shard_count or 'recommended'} shards in this process"
+        role = "primary" if self.primary else "secondary"
+        return f"shards {self.shard_ids} of {self.shard_count} ({role} process)"
@@ -0,0 +1,106 @@
+import asyncio
+import time
+from collections import Counter
+from src.config.settings import SPECULATIVE_INVOICE_TTL
+from src.utils.sellauth_client import SellAuthUnavailable
+
+
+class SpeculativeInvoices:
+    """Creates the likely invoice while the user is still picking a payment method.
+
+    When the purchase modal is submitted we guess the gateway (the most popular one so
+    far) and start the checkout call straight away. If the user then picks that gateway
+    the invoice is usually ready; any other choice discards the guess. Speculative
+    invoices aren't polled until claimed, and unclaimed ones are dropped after
+    SPECULATIVE_INVOICE_TTL. SellAuth has no cancel endpoint, so abandoned invoices
+    just stay pending there until they expire.
+    """
+
+    def __init__(self, bot, ttl: int = SPECULATIVE_INVOICE_TTL):
+        self.bot = bot
+        self.ttl = ttl
+        self.gateway_choices = Counter()
+        self.hits = 0
+        self.misses = 0
+        self._pending = {}  # user_id -> (key, task, created_at)
+
+    @staticmethod
+    def make_key(user_id: str, checkout_data: dict, tenant=None) -> tuple:
+        return (
+            tenant.id if tenant else None,
+            str(user_id),
+            checkout_data["email"].lower(),
+            checkout_data.get("coupon") or "",
+            str(checkout_data["cart"][0]["variantId"]),
+            checkout_data["gateway"]
+        )
+
+    def predicted_gateway(self) -> str:
+        if not self.gateway_choices:
+            return "STRIPE"
+        return self.gateway_choices.most_common(1)[0][0]
+
+    def start(self, user_id: str, checkout_data: dict, tenant=None):
+        """Begin creating the invoice in `tenant`'s shop in the background"""
+        tenant = tenant or self.bot.tenants.default
+        if tenant.sellauth.breaker.is_open():
+            return
+        self.discard(user_id)
+        task = asyncio.create_task(self.bot.create_sellauth_invoice(
+            user_id=str(user_id),
+            product_id=checkout_data["cart"][0]["productId"],
+            checkout_data=checkout_data,
+            track=False,
+            tenant=tenant
+        ))
+        self._pending[str(user_id)] = (self.make_key(user_id, checkout_data, tenant), task, time.monotonic())
+
+    async def claim(self, user_id: str, checkout_data: dict, tenant=None) -> dict:
+        """Return the speculative invoice if it matches this checkout in `tenant`'s shop, otherwise None"""
+        tenant = tenant or self.bot.tenants.default
+        self.gateway_choices[checkout_data["gateway"]] += 1
+        entry = self._pending.pop(str(user_id), None)
+        if not entry:
+            return None
+
+        key, task, _ = entry
+        if key != self.make_key(user_id, checkout_data, tenant):
+            self.misses += 1
+            self._abandon(task)
+            return None
+
+        try:
+            invoice = await task
+        except SellAuthUnavailable:
+            raise
+        except Exception as e:
+            print(f"Speculative invoice failed for {user_id}: {e}")
+            invoice = None
+
+        if invoice and invoice.get("invoice_id"):
+            self.hits += 1
+            tenant.active_invoices[invoice["invoice_id"]] = str(user_id)
+            return invoice
+        self.misses += 1
+        return None
+
+    def discard(self, user_id: str):
+        entry = self._pending.pop(str(user_id), None)
+        if entry:
+            self._abandon(entry[1])
+
+    def expire(self):
+        """Drop speculative invoices nobody claimed in time"""
+        now = time.monotonic()
+        for user_id, (_, task, created_at) in list(self._pending.items()):
+            if now - created_at > self.ttl:
+                del self._pending[user_id]
+                self._abandon(task)
+
+    def _abandon(self, task: asyncio.Task):
+        if not task.done():
+            task.cancel()
+        elif not task.cancelled() and not task.exception():
+            invoice = task.result()
+            if invoice and invoice.get("invoice_id"):
+                print(f"Abandoned speculative invoice {invoice['invoice_id']}")
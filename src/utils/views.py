@@ -1,15 +1,20 @@
 import discord
 from discord.ui import Select, View, Button
 from src.config.constants import EMOJIS, SELLAPP_API_KEY
+from src.utils.lifecycle import reject_if_closing
+from src.models.catalog import ProductCatalog
 import aiohttp
 
 class VariantSelect(discord.ui.Select):
     def __init__(self, variants: dict):
+        """`variants` comes from `bot.catalog.get_variants(...)`, so no network round-trip here"""
         options = []
         for variant_id, variant_data in variants.items():
+            stock = ProductCatalog.stock_label(variant_data)
+            stock_text = f" · {stock}" if stock else ""
             option = discord.SelectOption(
-                label=f"{variant_data['name']} (${variant_data['amount']})",
-                description=variant_data['description'][:100],
+                label=f"{variant_data['name']} (${variant_data['amount']})"[:100],
+                description=(variant_data['description'] + stock_text)[:100],
                 emoji=variant_data['emoji'],
                 value=variant_data['id']
             )
@@ -78,7 +83,7 @@ class VariantSelect(discord.ui.Select):
         embed.add_field(
             name="📋 Subscription Details",
             value=(
-                f"• Duration: {selected_variant['name'].split('[')[1].split(']')[0]}\n"
+                f"• Duration: {selected_variant['name'].split('[')[-1].split(']')[0]}\n"
                 f"• Billing: One-time payment\n"
                 f"• Activation: Instant upon payment\n"
                 "• Renewal: Manual"
@@ -179,6 +184,68 @@ class VariantView(View):
                 VariantButton(
                     variant_id=variant_id,
                     name=variant_data["name"],
-                    price=variant_data["price"]
+                    price=float(variant_data["amount"])
                 )
-            ) 
\ No newline at end of file
+            )
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return not await reject_if_closing(interaction)
+
+
+class HistoryView(View):
+    """Purchase history pager using keyset pagination (no OFFSET scans)"""
+
+    PAGE_SIZE = 5
+
+    def __init__(self, db, target: discord.abc.User, viewer_id: int, tenant_id: str = None):
+        super().__init__(timeout=300)
+        self.db = db
+        self.target = target
+        self.viewer_id = viewer_id
+        self.tenant_id = tenant_id  # Only this tenant's purchases, None shows all of them
+        self.cursors = [None]  # Keyset cursor for the start of each visited page
+        self.rows = []
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user.id != self.viewer_id:
+            await interaction.response.send_message("❌ This menu isn't yours.", ephemeral=True)
+            return False
+        return True
+
+    def load_page(self):
+        # Fetch one extra row to know whether there is a next page
+        self.rows = self.db.get_purchase_page(str(self.target.id), self.cursors[-1], self.PAGE_SIZE + 1,
+                                              tenant_id=self.tenant_id)
+        self.previous_page.disabled = len(self.cursors) == 1
+        self.next_page.disabled = len(self.rows) <= self.PAGE_SIZE
+        self.rows = self.rows[:self.PAGE_SIZE]
+
+    def build_embed(self) -> discord.Embed:
+        embed = discord.Embed(
+            title=f"{EMOJIS['receipt']} Purchase History - {self.target.name}",
+            color=discord.Color.blue()
+        )
+        if not self.rows:
+            embed.description = "No purchases found."
+        for _, variant_key, product_key, purchase_date, expiry_date, status in self.rows:
+            masked = f"`{product_key[:4]}…{product_key[-4:]}`" if product_key else "—"
+            embed.add_field(
+                name=f"{variant_key} · {purchase_date}",
+                value=f"**Status:** {status or 'active'}\n**Expires:** {expiry_date}\n**Key:** {masked}",
+                inline=False
+            )
+        embed.set_footer(text=f"Page {len(self.cursors)}")
+        return embed
+
+    @discord.ui.button(label="Previous", style=discord.ButtonStyle.secondary, emoji="◀️")
+    async def previous_page(self, interaction: discord.Interaction, button: Button):
+        self.cursors.pop()
+        self.load_page()
+        await interaction.response.edit_message(embed=self.build_embed(), view=self)
+
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.secondary, emoji="▶️")
+    async def next_page(self, interaction: discord.Interaction, button: Button):
+        last = self.rows[-1]
+        self.cursors.append((last[3], last[0]))
+        self.load_page()
+        await interaction.response.edit_message(embed=self.build_embed(), view=self)
@@ -0,0 +1,112 @@
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from src.utils.metrics import record_timing
+from src.config.settings import WATCHDOG_INTERVAL, WATCHDOG_THRESHOLD, WATCHDOG_KEEP
+
+ROOT = str(Path(__file__).resolve().parents[2])
+
+
+class LoopWatchdog:
+    """Measures event loop lag and finds the code that blocks it.
+
+    A heartbeat task on the loop records how late each `interval` sleep wakes up
+    (exported as the `loop.lag` timing). A watchdog thread notices when the heartbeat
+    is overdue by more than `threshold`, captures the loop thread's stack while it's
+    still blocked, and once the loop recovers the stall is charged to the innermost
+    frame from our own code. The `keep` worst call sites and most recent stalls are
+    kept for /lag.
+    """
+
+    def __init__(self, interval: float = WATCHDOG_INTERVAL, threshold: float = WATCHDOG_THRESHOLD,
+                 keep: int = WATCHDOG_KEEP):
+        self.interval = interval
+        self.threshold = threshold
+        self.keep = keep
+        self.max_lag = 0.0
+        self.offenders = {}  # call site -> {"count", "worst", "total", "stack", "last"}
+        self.recent = deque(maxlen=keep)  # (finished_at, lag, call site)
+        self._lock = threading.Lock()
+        self._last_beat = time.monotonic()
+        self._stall = None  # (call site, stack) captured by the watchdog thread
+        self._stop = threading.Event()
+        self._thread = None
+        self._task = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._last_beat = time.monotonic()
+            self._task = asyncio.create_task(self._heartbeat())
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._watch, args=(threading.get_ident(),), name="loop-watchdog", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _heartbeat(self):
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - started - self.interval)
+            record_timing("loop.lag", lag)
+            with self._lock:
+                self._last_beat = now
+                stall, self._stall = self._stall, None
+            if stall and lag >= self.threshold:
+                self._record(lag, *stall)
+
+    def _watch(self, loop_thread_id: int):
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                overdue = time.monotonic() - self._last_beat - self.interval
+                if overdue < self.threshold or self._stall is not None:
+                    continue
+            frame = sys._current_frames().get(loop_thread_id)
+            if frame is None:
+                continue
+            stack = traceback.extract_stack(frame)
+            with self._lock:
+                self._stall = (self._call_site(stack), "".join(stack.format()))
+
+    @staticmethod
+    def _call_site(stack: traceback.StackSummary) -> str:
+        """Innermost frame from our own code, or the innermost frame if there is none"""
+        for entry in reversed(stack):
+            if entry.filename.startswith(ROOT) and "/site-packages/" not in entry.filename:
+                return f"{entry.name} ({entry.filename[len(ROOT) + 1:]}:{entry.lineno})"
+        entry = stack[-1]
+        return f"{entry.name} ({entry.filename}:{entry.lineno})"
+
+    def _record(self, lag: float, site: str, stack: str):
+        self.max_lag = max(self.max_lag, lag)
+        self.recent.append((datetime.now(), lag, site))
+        offender = self.offenders.get(site)
+        if offender is None:
+            offender = self.offenders[site] = {"count": 0, "worst": 0.0, "total": 0.0, "stack": stack, "last": None}
+        offender["count"] += 1
+        offender["total"] += lag
+        offender["last"] = datetime.now()
+        if lag >= offender["worst"]:
+            offender["worst"] = lag
+            offender["stack"] = stack
+        if len(self.offenders) > self.keep:
+            mildest = min(self.offenders, key=lambda key: self.offenders[key]["worst"])
+            del self.offenders[mildest]
+        print(f"Event loop blocked for {lag * 1000:.0f}ms in {site}")
+
+    def worst(self, limit: int = 10) -> list:
+        """Call sites ordered by their worst stall, as (site, offender dict)"""
+        return sorted(self.offenders.items(), key=lambda item: item[1]["worst"], reverse=True)[:limit]
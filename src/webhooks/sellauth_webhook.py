@@ -4,21 +4,35 @@ import hashlib
 import json
 from datetime import datetime
 import discord
-from src.config.settings import WEBHOOK_SECRET, GUILD_ID, CUSTOMER_ROLE_ID
+from src.config.settings import WEBHOOK_SECRET, PROFILE_MAX_SECONDS, PROFILE_PORT
+from src.models import ledger
+from src.models.tenants import DEFAULT_TENANT_ID
+from src.utils import deliveries
+from src.utils.profiler import ProfilerBusy
 
 class SellAuthWebhook:
     def __init__(self, bot):
         self.bot = bot
         self.app = web.Application()
-        self.app.router.add_post('/webhook/sellauth', self.handle_webhook)
+        self.app.router.add_post('/webhook/sellauth', self.handle_webhook)  # Default tenant
+        self.app.router.add_post('/webhook/sellauth/{tenant}', self.handle_webhook)
+        # Debug routes get their own loopback-only app, so a reverse proxy in front of the webhook can't reach them
+        self.debug_app = web.Application()
+        self.debug_app.router.add_get('/debug/profile', self.handle_profile)
+        self.runner = None
+        self.debug_runner = None
 
-    def verify_signature(self, signature: str, body: str) -> bool:
-        """Verify the webhook signature from SellAuth"""
+    def verify_signature(self, signature: str, body: str, secret: str = WEBHOOK_SECRET) -> bool:
+        """Verify the webhook signature from SellAuth against the tenant's secret"""
+        if not secret:
+            # An HMAC keyed with "" can be computed by anyone
+            print("No webhook secret configured, refusing to verify")
+            return False
         try:
             print(f"Verifying signature: {signature}")
-            print(f"Webhook secret: {WEBHOOK_SECRET[:5]}...") # Print first 5 chars for safety
+            print(f"Webhook secret: {secret[:5]}...") # Print first 5 chars for safety
             computed_sig = hmac.new(
-                WEBHOOK_SECRET.encode(),
+                secret.encode(),
                 body.encode(),
                 hashlib.sha256
             ).hexdigest()
@@ -28,77 +42,82 @@ class SellAuthWebhook:
             print(f"Signature verification error: {e}")
             return False
 
-    async def handle_dynamic_delivery(self, data: dict) -> str:
+    @staticmethod
+    def order_details(data: dict) -> dict:
+        """record_order's keyword arguments for a completed invoice, so role reconciliation and expiry see it"""
+        item = data.get('item') or {}
+        return {
+            "variant_id": data.get('variant_id') or item.get('variant_id'),
+            "product_name": (item.get('variant') or {}).get('name') or (item.get('product') or {}).get('name', ''),
+            "gateway": data.get('gateway'),
+            "amount": data.get('price_usd') or data.get('price') or 0
+        }
+
+    @staticmethod
+    def dynamic_delivery_embed(data: dict) -> discord.Embed:
+        """Build the welcome DM for a dynamic delivery"""
+        embed = discord.Embed(
+            title="🎉 Welcome to Generator Access!",
+            description="Your purchase has been confirmed and your access is now active.",
+            color=discord.Color.green(),
+            timestamp=discord.utils.utcnow()
+        )
+
+        # Add purchase details
+        embed.add_field(
+            name="📦 Order Details",
+            value=(
+                f"**Product:** {data.get('item', {}).get('product', {}).get('name', 'Generator')}\n"
+                f"**Price Paid:** ${data.get('price', '0.00')} {data.get('currency', 'USD')}\n"
+                f"**Order ID:** `{data.get('id', 'N/A')}`"
+            ),
+            inline=False
+        )
+
+        # Add dates
+        purchase_date = datetime.utcnow()
+        if "MONTHLY" in data.get('item', {}).get('product', {}).get('name', ''):
+            renewal_date = purchase_date.timestamp() + (30 * 24 * 60 * 60)
+        else:
+            renewal_date = purchase_date.timestamp() + (7 * 24 * 60 * 60)
+
+        embed.add_field(
+            name="📅 Important Dates",
+            value=(
+                f"**Purchase Date:** <t:{int(purchase_date.timestamp())}:F>\n"
+                f"**Renewal Date:** <t:{int(renewal_date)}:F>"
+            ),
+            inline=False
+        )
+
+        # Add support info
+        embed.add_field(
+            name="❓ Need Help?",
+            value="If you need any assistance, please contact our support team.",
+            inline=False
+        )
+
+        embed.set_thumbnail(url="https://media.discordapp.net/attachments/1237105773138542763/1338023352790683739/logox.png?ex=67beaada&is=67bd595a&hm=ad826a3a6f7feaa5ac53780b6cff9d7e02e3c33fd966f690da4065ce9bc89b48&=&format=webp&quality=lossless&width=1024&height=1024")
+        return embed
+
+    async def handle_dynamic_delivery(self, data: dict, tenant=None) -> str:
         """Handle dynamic delivery webhook event"""
         try:
             # Extract discord_id from customer data
             discord_id = data.get('customer', {}).get('discord_id')
             if discord_id:
-                user_id = int(discord_id)
-                user = await self.bot.fetch_user(user_id)
-                
-                if user:
-                    # Create and send welcome embed
-                    embed = discord.Embed(
-                        title="🎉 Welcome to Generator Access!",
-                        description="Your purchase has been confirmed and your access is now active.",
-                        color=discord.Color.green(),
-                        timestamp=discord.utils.utcnow()
-                    )
-
-                    # Add purchase details
-                    embed.add_field(
-                        name="📦 Order Details",
-                        value=(
-                            f"**Product:** {data.get('item', {}).get('product', {}).get('name', 'Generator')}\n"
-                            f"**Price Paid:** ${data.get('price', '0.00')} {data.get('currency', 'USD')}\n"
-                            f"**Order ID:** `{data.get('id', 'N/A')}`"
-                        ),
-                        inline=False
-                    )
-
-                    # Add dates
-                    purchase_date = datetime.utcnow()
-                    if "MONTHLY" in data.get('item', {}).get('product', {}).get('name', ''):
-                        renewal_date = purchase_date.timestamp() + (30 * 24 * 60 * 60)
-                    else:
-                        renewal_date = purchase_date.timestamp() + (7 * 24 * 60 * 60)
-
-                    embed.add_field(
-                        name="📅 Important Dates",
-                        value=(
-                            f"**Purchase Date:** <t:{int(purchase_date.timestamp())}:F>\n"
-                            f"**Renewal Date:** <t:{int(renewal_date)}:F>"
-                        ),
-                        inline=False
-                    )
-
-                    # Add support info
-                    embed.add_field(
-                        name="❓ Need Help?",
-                        value="If you need any assistance, please contact our support team.",
-                        inline=False
-                    )
-
-                    embed.set_thumbnail(url="https://media.discordapp.net/attachments/1237105773138542763/1338023352790683739/logox.png?ex=67beaada&is=67bd595a&hm=ad826a3a6f7feaa5ac53780b6cff9d7e02e3c33fd966f690da4065ce9bc89b48&=&format=webp&quality=lossless&width=1024&height=1024")
-
-                    await user.send(embed=embed)
-
-                    # Add role if configured
-                    if GUILD_ID and CUSTOMER_ROLE_ID:
-                        try:
-                            guild = self.bot.get_guild(GUILD_ID)
-                            if guild:
-                                member = await guild.fetch_member(user_id)
-                                if member:
-                                    role = guild.get_role(CUSTOMER_ROLE_ID)
-                                    if role:
-                                        await member.add_roles(role)
-                        except Exception as e:
-                            print(f"Error adding role: {e}")
-
-                    # Return success message
+                # Records the order, grants the role and DMs the buyer (or queues the DM for retry)
+                delivered = await self.bot.deliveries.deliver(
+                    deliveries.DYNAMIC_DELIVERY,
+                    int(discord_id),
+                    data.get('invoice_id') or data.get('id'),
+                    self.dynamic_delivery_embed(data),
+                    tenant,
+                    order=self.order_details(data)
+                )
+                if delivered:
                     return "Welcome message sent and role assigned successfully"
+                return "Role assigned, welcome message queued for retry"
 
             return "No Discord ID found or invalid"
 
@@ -107,9 +126,18 @@ class SellAuthWebhook:
             return f"Error processing delivery: {str(e)}"
 
     async def handle_webhook(self, request: web.Request) -> web.Response:
-        """Handle incoming webhook from SellAuth"""
+        """Handle incoming webhook from SellAuth (503 while shutting down so SellAuth retries)"""
+        if not self.bot.lifecycle.accepting:
+            return web.Response(status=503, text="Shutting down", headers={"Retry-After": "30"})
+        tenant = self.bot.tenants.get(request.match_info.get("tenant", DEFAULT_TENANT_ID))
+        if tenant is None:
+            return web.Response(status=404, text="Unknown tenant")
+        async with self.bot.lifecycle.track():
+            return await self._handle_webhook(request, tenant)
+
+    async def _handle_webhook(self, request: web.Request, tenant) -> web.Response:
         try:
-            print("\n=== New Webhook Request ===")
+            print(f"\n=== New Webhook Request ({tenant.id}) ===")
             print(f"Headers: {dict(request.headers)}")
             
             # Get signature from headers - check multiple possible header names
@@ -120,6 +148,10 @@ class SellAuthWebhook:
                 request.headers.get('x-signature')
             )
             
+            if not tenant.webhook_secret:
+                print(f"Tenant {tenant.id} has no webhook secret, rejecting webhook")
+                return web.Response(status=503, text="Webhook secret not configured")
+
             if not signature:
                 print("No signature found in headers. Available headers:", dict(request.headers))
                 return web.Response(status=401, text="No signature provided")
@@ -129,7 +161,7 @@ class SellAuthWebhook:
             print(f"Request body: {body}")
 
             # Verify signature
-            if not self.verify_signature(signature, body):
+            if not self.verify_signature(signature, body, tenant.webhook_secret):
                 print("Signature verification failed")
                 print(f"Received signature: {signature}")
                 return web.Response(status=401, text="Invalid signature")
@@ -137,6 +169,14 @@ class SellAuthWebhook:
             # Parse webhook data
             data = json.loads(body)
             print(f"Parsed data: {json.dumps(data, indent=2)}")
+            self.bot.ledger.record(
+                ledger.WEBHOOK_RECEIVED,
+                data.get('invoice_id') or data.get('id'),
+                data.get('discord_user_id') or (data.get('customer') or {}).get('discord_id'),
+                status=data.get('status'),
+                gateway=data.get('gateway'),
+                tenant=tenant.id
+            )
             
             # Check for completed status
             if data.get('status') == 'completed':
@@ -148,11 +188,11 @@ class SellAuthWebhook:
                 
                 if discord_id:
                     print(f"Found Discord ID: {discord_id}")
-                    success = await self.send_purchase_confirmation(discord_id, data)
+                    success = await self.send_purchase_confirmation(discord_id, data, tenant)
                     if success:
                         return web.Response(text="Purchase confirmation sent successfully")
                     else:
-                        return web.Response(text="Failed to send purchase confirmation")
+                        return web.Response(text="Purchase confirmation queued for retry")
                 else:
                     print("No Discord ID found in webhook data")
             
@@ -164,92 +204,108 @@ class SellAuthWebhook:
             print(traceback.format_exc())
             return web.Response(status=500, text=f"Internal server error: {str(e)}")
 
+    async def handle_profile(self, request: web.Request) -> web.Response:
+        """Profile the event loop for ?seconds=N (default 10) and return the text report"""
+        try:
+            seconds = min(max(float(request.query.get("seconds", 10)), 1), PROFILE_MAX_SECONDS)
+        except ValueError:
+            return web.Response(status=400, text="seconds must be a number")
+        try:
+            report = await self.bot.profiler.run(seconds)
+        except ProfilerBusy as e:
+            return web.Response(status=409, text=str(e))
+        return web.Response(text=report)
+
     async def start(self):
         """Start the webhook server"""
-        runner = web.AppRunner(self.app)
-        await runner.setup()
-        site = web.TCPSite(runner, 'localhost', 8080)
+        self.runner = web.AppRunner(self.app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, 'localhost', 8080)
         await site.start()
+        if PROFILE_PORT:
+            self.debug_runner = web.AppRunner(self.debug_app)
+            await self.debug_runner.setup()
+            await web.TCPSite(self.debug_runner, '127.0.0.1', PROFILE_PORT).start()
         print(f"""
 === Webhook Server Started ===
-URL: http://localhost:8080/webhook/sellauth
-Webhook Secret: {WEBHOOK_SECRET[:5]}... (first 5 chars)
+URL: http://localhost:8080/webhook/sellauth (default tenant)
+     http://localhost:8080/webhook/sellauth/<tenant id> ({len(self.bot.tenants) - 1} more tenants)
+Webhook Secret: {WEBHOOK_SECRET[:5] + '... (first 5 chars)' if WEBHOOK_SECRET else 'NOT SET, default tenant webhooks will be rejected'}
+Profiler: {f"http://127.0.0.1:{PROFILE_PORT}/debug/profile" if PROFILE_PORT else "disabled"}
 Listening for requests...
 """)
 
-    async def send_purchase_confirmation(self, user_id: str, data: dict) -> bool:
-        """Send purchase confirmation DM to user"""
-        try:
-            print(f"Attempting to send DM to user {user_id}")
-            user = await self.bot.fetch_user(int(user_id))
-            
-            if user:
-                embed = discord.Embed(
-                    title="🎉 Purchase Confirmed!",
-                    description="Thank you for your purchase! Your order has been completed successfully.",
-                    color=discord.Color.green(),
-                    timestamp=discord.utils.utcnow()
-                )
+    async def stop(self):
+        """Stop the webhook server and release its ports"""
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
+        if self.debug_runner:
+            await self.debug_runner.cleanup()
+            self.debug_runner = None
 
-                # Add purchase details
-                product_name = data.get('item', {}).get('product', {}).get('name', 'Generator')
-                embed.add_field(
-                    name="📦 Order Details",
-                    value=(
-                        f"**Product:** {product_name}\n"
-                        f"**Price:** ${data.get('price', '0.00')} {data.get('currency', 'USD')}\n"
-                        f"**Order ID:** `{data.get('id', 'N/A')}`\n"
-                        f"**Payment Method:** {data.get('gateway', 'N/A')}"
-                    ),
-                    inline=False
-                )
+    @staticmethod
+    def purchase_confirmation_embed(data: dict) -> discord.Embed:
+        """Build the purchase confirmation DM for a completed invoice"""
+        embed = discord.Embed(
+            title="🎉 Purchase Confirmed!",
+            description="Thank you for your purchase! Your order has been completed successfully.",
+            color=discord.Color.green(),
+            timestamp=discord.utils.utcnow()
+        )
 
-                # Add dates
-                purchase_date = datetime.utcnow()
-                if "MONTHLY" in product_name.upper():
-                    renewal_date = purchase_date.timestamp() + (30 * 24 * 60 * 60)  # 30 days
-                else:
-                    renewal_date = purchase_date.timestamp() + (7 * 24 * 60 * 60)  # 7 days
-
-                embed.add_field(
-                    name="📅 Important Dates",
-                    value=(
-                        f"**Purchase Date:** <t:{int(purchase_date.timestamp())}:F>\n"
-                        f"**Renewal Date:** <t:{int(renewal_date)}:F>"
-                    ),
-                    inline=False
-                )
+        # Add purchase details
+        product_name = data.get('item', {}).get('product', {}).get('name', 'Generator')
+        embed.add_field(
+            name="📦 Order Details",
+            value=(
+                f"**Product:** {product_name}\n"
+                f"**Price:** ${data.get('price', '0.00')} {data.get('currency', 'USD')}\n"
+                f"**Order ID:** `{data.get('id', 'N/A')}`\n"
+                f"**Payment Method:** {data.get('gateway', 'N/A')}"
+            ),
+            inline=False
+        )
 
-                embed.add_field(
-                    name="❓ Need Help?",
-                    value="If you need any assistance, please contact our support team.",
-                    inline=False
-                )
+        # Add dates
+        purchase_date = datetime.utcnow()
+        if "MONTHLY" in product_name.upper():
+            renewal_date = purchase_date.timestamp() + (30 * 24 * 60 * 60)  # 30 days
+        else:
+            renewal_date = purchase_date.timestamp() + (7 * 24 * 60 * 60)  # 7 days
+
+        embed.add_field(
+            name="📅 Important Dates",
+            value=(
+                f"**Purchase Date:** <t:{int(purchase_date.timestamp())}:F>\n"
+                f"**Renewal Date:** <t:{int(renewal_date)}:F>"
+            ),
+            inline=False
+        )
+
+        embed.add_field(
+            name="❓ Need Help?",
+            value="If you need any assistance, please contact our support team.",
+            inline=False
+        )
+
+        embed.set_thumbnail(url="https://media.discordapp.net/attachments/1253797403157331978/1326286397182840832/PFP.gif")
+        return embed
 
-                embed.set_thumbnail(url="https://media.discordapp.net/attachments/1253797403157331978/1326286397182840832/PFP.gif")
-
-                await user.send(embed=embed)
-                print(f"Successfully sent DM to user {user_id}")
-
-                # Add role if configured
-                if GUILD_ID and CUSTOMER_ROLE_ID:
-                    try:
-                        guild = self.bot.get_guild(GUILD_ID)
-                        if guild:
-                            member = await guild.fetch_member(int(user_id))
-                            if member:
-                                role = guild.get_role(CUSTOMER_ROLE_ID)
-                                if role:
-                                    await member.add_roles(role)
-                                    print(f"Added role to user {user_id}")
-                    except Exception as e:
-                        print(f"Error adding role: {e}")
-
-                return True
-            else:
-                print(f"Could not find user with ID {user_id}")
-                return False
+    async def send_purchase_confirmation(self, user_id: str, data: dict, tenant=None) -> bool:
+        """Send purchase confirmation DM to user, returns False if it was queued for retry instead"""
+        try:
+            print(f"Attempting to send DM to user {user_id}")
+            # Records the order, grants the role and DMs the buyer (or queues the DM for retry)
+            return await self.bot.deliveries.deliver(
+                deliveries.PURCHASE_CONFIRMATION,
+                user_id,
+                data.get('invoice_id') or data.get('id'),
+                self.purchase_confirmation_embed(data),
+                tenant,
+                order=self.order_details(data)
+            )
 
         except Exception as e:
             print(f"Error sending purchase confirmation: {e}")
-            return False 
\ No newline at end of file
+            return False
\ No newline at end of file
@@ -0,0 +1,7 @@
+import pytest
+from src.models.database import Database
+
+
+@pytest.fixture
+def db(tmp_path):
+    return Database(str(tmp_path / "test.db"), archive_path=str(tmp_path / "archive.db"))
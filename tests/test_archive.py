@@ -0,0 +1,15 @@
+from src.models.archive import Archiver
+
+
+def auto_vacuum(db):
+    with db.connect() as conn:
+        return conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+
+
+def test_enable_incremental_vacuum_once(db):
+    archiver = Archiver(db, after_days=30, batch_size=100)
+    assert auto_vacuum(db) == 0
+    assert archiver.enable_incremental_vacuum()
+    assert auto_vacuum(db) == 2
+    assert archiver.enable_incremental_vacuum()  # Already on, no VACUUM
+
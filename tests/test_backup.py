@@ -0,0 +1,26 @@
+import gzip
+from pathlib import Path
+import pytest
+
+pytest.importorskip("dotenv")  # backup reads its defaults from settings
+from src.models.archive import Archiver
+from src.utils.backup import BackupManager
+
+
+def names(result):
+    return [Path(file["path"]).name for file in result["files"]]
+
+
+def test_backs_up_and_rotates_hot_and_archive_databases(db, tmp_path):
+    backup_dir = tmp_path / "backups"
+    backups = BackupManager(db.db_path, db.archive_path, backup_dir=str(backup_dir), keep=1)
+    # No archive until the first archive run creates it
+    assert [name.split("-")[0] for name in names(backups.run())] == ["database"]
+
+    Archiver(db, after_days=30, batch_size=100).ensure_archive_schema()
+    for prefix in ("database", "archive"):
+        (backup_dir / f"{prefix}-20000101-000000.db.gz").write_bytes(gzip.compress(b""))
+    latest = names(backups.run())
+
+    assert [name.split("-")[0] for name in latest] == ["database", "archive"]
+    assert sorted(path.name for path in backup_dir.iterdir()) == sorted(latest)
@@ -0,0 +1,76 @@
+import pytest
+from src.utils import cache
+from src.utils.cache import TTLCache, LRUCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, "monotonic", clock)
+    return clock
+
+
+def test_ttl_cache_expires_entries(clock):
+    ttl = TTLCache(ttl=10)
+    ttl.set("a", 1)
+    assert ttl.get("a") == 1
+    clock.now += 11
+    assert ttl.get("a") is None
+    assert len(ttl) == 0
+
+
+def test_ttl_cache_sweeps_expired_keys_that_are_never_read(clock):
+    ttl = TTLCache(ttl=10)
+    for invoice_id in range(100):
+        ttl.set(invoice_id, {})
+    clock.now += 11
+    ttl.set("new", {})
+    assert len(ttl) == 1
+
+
+def test_ttl_cache_is_bounded(clock):
+    ttl = TTLCache(ttl=10, maxsize=3)
+    for key in "abcd":
+        ttl.set(key, key)
+    assert len(ttl) == 3
+    assert ttl.get("a") is None
+    assert ttl.get("d") == "d"
+
+
+def test_ttl_cache_rewrite_renews_entry(clock):
+    ttl = TTLCache(ttl=10, maxsize=2)
+    ttl.set("a", 1)
+    ttl.set("b", 2)
+    ttl.set("a", 3)  # Now the newest entry
+    ttl.set("c", 4)
+    assert ttl.get("a") == 3
+    assert ttl.get("b") is None
+
+
+def test_lru_cache_evicts_least_recently_used(clock):
+    lru = LRUCache(maxsize=2, ttl=10)
+    lru.set("a", 1)
+    lru.set("b", 2)
+    assert lru.get("a") == 1
+    lru.set("c", 3)
+    assert lru.get("b") is None
+    assert lru.get("a") == 1
+    assert lru.hits == 2 and lru.misses == 1
+
+
+def test_lru_cache_purges_expired(clock):
+    lru = LRUCache(maxsize=10, ttl=10)
+    lru.set("a", 1)
+    clock.now += 5
+    lru.set("b", 2)
+    clock.now += 6
+    assert lru.purge_expired() == 1
+    assert lru.get("b") == 2
@@ -0,0 +1,106 @@
+import pytest
+from src.utils import circuit_breaker
+from src.utils.circuit_breaker import CircuitBreaker, CircuitOpenError
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", clock)
+    return clock
+
+
+def make_breaker(**kwargs):
+    options = dict(failure_rate_threshold=0.5, minimum_calls=4, window_size=10, open_seconds=30, half_open_max_calls=2)
+    options.update(kwargs)
+    return CircuitBreaker("test", **options)
+
+
+def trip(breaker):
+    for _ in range(breaker.minimum_calls):
+        breaker.before_call()
+        breaker.record_failure()
+
+
+def test_stays_closed_below_minimum_calls(clock):
+    breaker = make_breaker()
+    for _ in range(3):
+        breaker.before_call()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_opens_at_failure_rate_threshold(clock):
+    breaker = make_breaker()
+    for ok in (True, True, False, False):
+        breaker.before_call()
+        breaker.record_success() if ok else breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_half_open_after_timeout_then_closes_on_successful_probes(clock):
+    breaker = make_breaker()
+    trip(breaker)
+    clock.now += 30
+    assert not breaker.is_open()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+    breaker.before_call()
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()  # Only half_open_max_calls probes at a time
+    breaker.record_success()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.failure_rate == 0
+
+
+def test_failed_probe_reopens(clock):
+    breaker = make_breaker()
+    trip(breaker)
+    clock.now += 30
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.retry_after == 30
+
+
+def test_released_probe_slot_can_be_reused(clock):
+    breaker = make_breaker()
+    trip(breaker)
+    clock.now += 30
+    first = breaker.before_call()
+    second = breaker.before_call()
+    # Both probes cancelled: without releasing their slots the breaker would reject forever
+    breaker.release(first)
+    breaker.release(second)
+    breaker.before_call()
+    breaker.before_call()
+    breaker.record_success()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_release_from_an_earlier_half_open_period_is_ignored(clock):
+    breaker = make_breaker()
+    trip(breaker)
+    clock.now += 30
+    stale = breaker.before_call()
+    breaker.before_call()
+    breaker.record_failure()  # Reopens
+    clock.now += 30
+    breaker.before_call()
+    breaker.before_call()
+    breaker.release(stale)
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
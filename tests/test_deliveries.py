@@ -0,0 +1,138 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import pytest
+
+
+def queue(db, invoice_id, due_in=-1, kind="purchase_confirmation", tenant_id="default"):
+    payload = json.dumps({"embed": {"title": "Thanks"}, "order": None})
+    db.add_delivery_retry(kind, invoice_id, "42", tenant_id, payload, "DMs closed",
+                          datetime.now() + timedelta(seconds=due_in))
+
+
+def test_duplicate_delivery_is_queued_once(db):
+    queue(db, "inv1")
+    queue(db, "inv1")
+    queue(db, "inv1", kind="dynamic_delivery")
+    assert db.count_delivery_retries() == {"pending": 2}
+
+
+def test_claim_returns_due_rows_oldest_first(db):
+    queue(db, "later", due_in=-10)
+    queue(db, "earlier", due_in=-20)
+    queue(db, "not_due", due_in=3600)
+    assert [row["invoice_id"] for row in db.claim_due_delivery_retries(10)] == ["earlier", "later"]
+
+
+def test_claimed_rows_are_not_claimed_again(db):
+    queue(db, "inv1")
+    assert len(db.claim_due_delivery_retries(10)) == 1
+    # A second batch running at the same time (e.g. /replaydelivery) gets nothing
+    assert db.claim_due_delivery_retries(10) == []
+
+
+def test_claim_lease_expires(db):
+    queue(db, "inv1")
+    assert len(db.claim_due_delivery_retries(10, lease_seconds=-1)) == 1
+    assert len(db.claim_due_delivery_retries(10)) == 1
+
+
+def test_save_attempts_deletes_delivered_and_dead_letters_failed(db):
+    queue(db, "ok")
+    queue(db, "retry")
+    queue(db, "dead")
+    ids = {row["invoice_id"]: row["id"] for row in db.claim_due_delivery_retries(10)}
+    now = datetime.now()
+    db.save_delivery_attempts([ids["ok"]], [
+        ("pending", 2, "DMs closed", now + timedelta(minutes=5), ids["retry"]),
+        ("dead", 8, "DMs closed", now, ids["dead"]),
+    ])
+    assert db.count_delivery_retries() == {"pending": 1, "dead": 1}
+    assert [row["invoice_id"] for row in db.get_dead_deliveries()] == ["dead"]
+    assert db.claim_due_delivery_retries(10) == []
+
+
+def test_replay_makes_dead_rows_due_with_fresh_budget(db):
+    queue(db, "a")
+    queue(db, "b")
+    rows = db.claim_due_delivery_retries(10)
+    db.save_delivery_attempts([], [("dead", 8, "DMs closed", datetime.now(), row["id"]) for row in rows])
+
+    assert db.replay_dead_deliveries(rows[0]["id"]) == 1
+    assert db.replay_dead_deliveries(rows[0]["id"]) == 0
+    assert db.replay_dead_deliveries() == 1
+    claimed = db.claim_due_delivery_retries(10)
+    assert len(claimed) == 2
+    assert all(row["attempts"] == 0 for row in claimed)
+
+
+def test_dead_letters_are_scoped_to_a_tenant(db):
+    queue(db, "mine")
+    queue(db, "theirs", tenant_id="other")
+    rows = db.claim_due_delivery_retries(10)
+    db.save_delivery_attempts([], [("dead", 8, "DMs closed", datetime.now(), row["id"]) for row in rows])
+
+    assert [row["invoice_id"] for row in db.get_dead_deliveries(tenant_id="other")] == ["theirs"]
+    assert db.count_delivery_retries("default") == {"dead": 1}
+    theirs = db.get_dead_deliveries(tenant_id="other")[0]["id"]
+    assert db.replay_dead_deliveries(theirs, tenant_id="default") == 0
+    assert db.replay_dead_deliveries(tenant_id="default") == 1
+    assert db.count_delivery_retries("other") == {"dead": 1}
+
+
+class FakeRetriesBot:
+    """Just enough of the bot for DeliveryRetries: DMs fail while `dms_open` is False"""
+
+    def __init__(self, db):
+        self.db = db
+        self.dms_open = False
+        self.sent = []
+        self.events = []
+        default = SimpleNamespace(id="default", guild_id=1, role_id=2)
+        self.tenants = SimpleNamespace(default=default, get=lambda tenant_id: default)
+        self.ledger = SimpleNamespace(record=lambda event, *args, **kwargs: self.events.append(event))
+        self.member_cache = SimpleNamespace(fetch_user=self.fetch_user, invalidate_user=lambda user_id: None)
+        self.outbound = SimpleNamespace(submit=self.submit)
+
+    async def fetch_user(self, user_id):
+        return SimpleNamespace(id=int(user_id), name="buyer", send=self.send)
+
+    async def send(self, embed):
+        if not self.dms_open:
+            raise RuntimeError("Cannot send messages to this user")
+        self.sent.append(embed)
+
+    async def submit(self, priority, bucket, call):
+        return await call()
+
+
+@pytest.fixture
+def retries(db):
+    pytest.importorskip("discord")
+    from src.utils.deliveries import DeliveryRetries
+    return DeliveryRetries(FakeRetriesBot(db), base=60, max_delay=600, max_attempts=3)
+
+
+def test_backoff_doubles_up_to_the_cap(retries):
+    for attempts, expected in ((1, 60), (2, 120), (3, 240), (4, 480), (5, 600), (10, 600)):
+        assert expected <= retries.backoff(attempts) <= expected * 1.1
+
+
+def test_failed_retries_are_dead_lettered_after_max_attempts(retries, db):
+    retries.base = 0  # Reschedule failures as due right away
+    queue(db, "inv1")
+    assert asyncio.run(retries.run_batch()) == 1
+    assert db.count_delivery_retries() == {"pending": 1}
+    assert asyncio.run(retries.run_batch()) == 1
+    assert db.count_delivery_retries() == {"dead": 1}
+    assert asyncio.run(retries.run_batch()) == 0
+    assert retries.bot.events[-1] == "delivery_dead"
+
+
+def test_successful_retry_removes_the_row(retries, db):
+    queue(db, "inv1")
+    retries.bot.dms_open = True
+    assert asyncio.run(retries.run_batch()) == 1
+    assert db.count_delivery_retries() == {}
+    assert len(retries.bot.sent) == 1
@@ -0,0 +1,42 @@
+def add(db, discord_id, invoice_id, days, tenant_id="default"):
+    db.add_subscription(discord_id, "buyer", invoice_id, duration_days=days, tenant_id=tenant_id)
+
+
+def test_expires_lapsed_subscriptions_in_batches(db):
+    for n in range(5):
+        add(db, str(n), f"inv{n}", -(10 - n))
+    add(db, "9", "current", 30)
+
+    first = db.expire_subscriptions_batch(3)
+    second = db.expire_subscriptions_batch(3)
+    assert [row[2] for row in first] == ["inv0", "inv1", "inv2"]
+    assert [row[2] for row in second] == ["inv3", "inv4"]
+    assert db.expire_subscriptions_batch(3) == []
+
+
+def test_each_expiry_is_returned_once(db):
+    add(db, "1", "inv1", -1)
+    assert len(db.expire_subscriptions_batch(10)) == 1
+    # The watermark lives in job_state, so later sweeps only see newer expiries
+    add(db, "2", "inv2", -1)
+    assert [row[2] for row in db.expire_subscriptions_batch(10)] == ["inv2"]
+
+
+def test_expired_rows_carry_their_tenant(db):
+    add(db, "1", "inv1", -1, tenant_id="shop2")
+    assert db.expire_subscriptions_batch(10) == [(1, "1", "inv1", "shop2")]
+
+
+def test_renewal_keeps_member_active(db):
+    add(db, "1", "old", -1)
+    add(db, "1", "renewal", 30)
+    assert [row[2] for row in db.expire_subscriptions_batch(10)] == ["old"]
+    assert db.get_active_subscriber_ids() == {1}
+
+
+def test_backfilled_subscriptions_get_no_reminders_or_history(db):
+    add(db, "1", "real", 1)
+    db.backfill_subscriptions(["1", "2"], "default", 1)
+    assert [row[2] for row in db.get_due_reminders(2)] == ["real"]
+    assert [row[0] for row in db.get_user_subscriptions("1")] == ["real"]
+    assert db.get_user_subscriptions("2") == []
@@ -0,0 +1,43 @@
+import asyncio
+import pytest
+
+pytest.importorskip("dotenv")  # the ledger reads its defaults from settings
+from src.models.ledger import PaymentLedger, DM_SENT
+
+
+def events(db):
+    with db.connect() as conn:
+        return [row[0] for row in conn.execute("SELECT invoice_id FROM payment_events ORDER BY id")]
+
+
+def test_events_are_written_in_one_batch_after_the_interval(db):
+    async def scenario():
+        ledger = PaymentLedger(db, flush_interval=0.02)
+        writes = []
+        write = ledger._write
+        ledger._write = lambda batch: (writes.append(len(batch)), write(batch))
+        ledger.start()
+        await asyncio.sleep(0.05)
+        assert writes == []  # Idle: nothing recorded, nothing written
+
+        for invoice_id in ("a", "b", "c"):
+            ledger.record(DM_SENT, invoice_id, 1)
+        await asyncio.sleep(0.06)
+        assert writes == [3]
+        await ledger.drain()
+
+    asyncio.run(scenario())
+    assert events(db) == ["a", "b", "c"]
+
+
+def test_full_batch_is_written_without_waiting(db):
+    async def scenario():
+        ledger = PaymentLedger(db, flush_interval=60, max_batch=2)
+        ledger.start()
+        ledger.record(DM_SENT, "a", 1)
+        ledger.record(DM_SENT, "b", 1)
+        await asyncio.sleep(0.05)
+        assert events(db) == ["a", "b"]
+        await ledger.drain()
+
+    asyncio.run(scenario())
@@ -0,0 +1,80 @@
+import asyncio
+import pytest
+
+discord = pytest.importorskip("discord")
+from src.utils import outbound
+from src.utils.outbound import OutboundScheduler
+
+
+async def run_in_order(scheduler, jobs):
+    """Hold the route's only worker, queue `jobs` as (priority, name), then release it"""
+    order = []
+    gate = asyncio.Event()
+
+    async def blocker():
+        await gate.wait()
+
+    def job(name):
+        async def call():
+            order.append(name)
+            return name
+        return call
+
+    first = asyncio.create_task(scheduler.submit(outbound.DELIVERY, "dm", blocker))
+    await asyncio.sleep(0)
+    waiting = [asyncio.create_task(scheduler.submit(priority, "dm", job(name))) for priority, name in jobs]
+    await asyncio.sleep(0)
+    gate.set()
+    results = await asyncio.gather(first, *waiting)
+    await scheduler.drain()
+    return order, results[1:]
+
+
+def test_higher_priority_runs_first():
+    order, results = asyncio.run(run_in_order(OutboundScheduler({"dm": 1}), [
+        (outbound.BROADCAST, "broadcast"),
+        (outbound.REMINDER, "reminder"),
+        (outbound.RETRY, "retry"),
+        (outbound.DELIVERY, "delivery"),
+    ]))
+    assert order == ["delivery", "retry", "reminder", "broadcast"]
+    assert results == ["broadcast", "reminder", "retry", "delivery"]
+
+
+def test_same_priority_is_first_in_first_out():
+    order, _ = asyncio.run(run_in_order(OutboundScheduler({"dm": 1}), [
+        (outbound.REMINDER, "a"), (outbound.REMINDER, "b"), (outbound.REMINDER, "c"),
+    ]))
+    assert order == ["a", "b", "c"]
+
+
+def test_errors_reach_the_caller():
+    async def fail():
+        raise ValueError("boom")
+
+    async def run():
+        scheduler = OutboundScheduler({"dm": 1})
+        with pytest.raises(ValueError):
+            await scheduler.submit(outbound.DELIVERY, "dm", fail)
+        await scheduler.drain()
+
+    asyncio.run(run())
+
+
+def test_rate_limited_low_priority_calls_are_retried_after_backoff():
+    calls = []
+
+    async def flaky():
+        calls.append(asyncio.get_running_loop().time())
+        if len(calls) == 1:
+            raise discord.RateLimited(0.05)
+        return "sent"
+
+    async def run():
+        scheduler = OutboundScheduler({"dm": 1})
+        result = await scheduler.submit(outbound.REMINDER, "dm", flaky)
+        await scheduler.drain()
+        return result
+
+    assert asyncio.run(run()) == "sent"
+    assert calls[1] - calls[0] >= 0.05
@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta
+import pytest
+from src.models.archive import Archiver
+
+
+def add_purchases(db, table, rows):
+    with db.connect(attach_archive=True) as conn:
+        conn.executemany(f"""
+            INSERT INTO {table} (id, discord_id, discord_name, invoice_id, variant_key, purchase_date, expiry_date, status)
+            VALUES (?, ?, 'buyer', ?, 'MONTHLY', ?, ?, 'expired')
+        """, [(id, discord_id, f"inv{id}", date, date) for id, discord_id, date in rows])
+        conn.commit()
+
+
+def day(n):
+    return (datetime(2026, 1, 1) + timedelta(days=n)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+@pytest.fixture
+def history(db):
+    """User 1 has ids 1-6 in the archive and 7-12 in the hot table, one per day, plus other users' rows"""
+    Archiver(db, after_days=30, batch_size=100).ensure_archive_schema()
+    add_purchases(db, "archive.purchases", [(id, "1", day(id)) for id in range(1, 7)] + [(50, "2", day(3))])
+    add_purchases(db, "main.purchases", [(id, "1", day(id)) for id in range(7, 13)] + [(60, "2", day(9))])
+    return db
+
+
+def pages(db, limit, **kwargs):
+    before, seen = None, []
+    while True:
+        rows = db.get_purchase_page("1", before, limit, **kwargs)
+        if not rows:
+            return seen
+        seen.append([row[0] for row in rows])
+        before = (rows[-1][3], rows[-1][0])
+
+
+def test_pages_walk_hot_and_archive_newest_first(history):
+    assert pages(history, 5) == [[12, 11, 10, 9, 8], [7, 6, 5, 4, 3], [2, 1]]
+
+
+def test_pages_without_archive(history):
+    assert pages(history, 4, include_archive=False) == [[12, 11, 10, 9], [8, 7]]
+
+
+def test_same_timestamp_is_ordered_by_id(db):
+    add_purchases(db, "main.purchases", [(id, "1", day(0)) for id in range(1, 6)])
+    assert pages(db, 2) == [[5, 4], [3, 2], [1]]
+
+
+def test_interleaved_tables_merge_in_order(history):
+    # Archive rows newer than some hot rows still come out in date order
+    add_purchases(history, "archive.purchases", [(20, "1", day(10) + ".5")])
+    assert pages(history, 3)[:2] == [[12, 11, 20], [10, 9, 8]]
+
+
+def test_page_query_seeks_the_covering_index(history):
+    with history.connect() as conn:
+        plan = " ".join(row[-1] for row in conn.execute("""
+            EXPLAIN QUERY PLAN
+            SELECT id, variant_key, product_key, purchase_date, expiry_date, status
+            FROM main.purchases
+            WHERE discord_id = ? AND (purchase_date, id) < (?, ?)
+            ORDER BY purchase_date DESC, id DESC
+            LIMIT ?
+        """, ("1", day(9), 9, 5)))
+    assert "COVERING INDEX idx_purchases_user_date" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def test_pages_for_one_tenant(history):
+    with history.connect(attach_archive=True) as conn:
+        conn.execute("UPDATE main.purchases SET tenant_id = 'other' WHERE id IN (8, 10)")
+        conn.execute("UPDATE archive.purchases SET tenant_id = 'other' WHERE id = 2")
+        conn.commit()
+    assert pages(history, 5, tenant_id="other") == [[10, 8, 2]]
+    assert pages(history, 5, tenant_id="default") == [[12, 11, 9, 7, 6], [5, 4, 3, 1]]
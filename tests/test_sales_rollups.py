@@ -0,0 +1,48 @@
+import sqlite3
+from src.models.database import Database
+
+
+def test_sales_are_rolled_up_per_tenant(db):
+    db.add_subscription("1", "a", "inv1", variant_key="1M", gateway="STRIPE", amount=10)
+    db.record_purchase("1", "a", "inv1", None, "1M", gateway="STRIPE", amount=10)
+    db.add_subscription("2", "b", "inv2", variant_key="1M", gateway="STRIPE", amount=25, tenant_id="other")
+    db.record_purchase("2", "b", "inv2", None, "1M", gateway="STRIPE", amount=25, tenant_id="other")
+
+    assert db.get_sales_stats(30, "default")["total"] == (1, 10.0)
+    assert db.get_sales_stats(30, "other")["total"] == (1, 25.0)
+    assert db.get_sales_stats(30)["total"] == (2, 35.0)
+
+
+def test_rebuild_only_touches_one_tenant(db):
+    db.add_subscription("1", "a", "inv1", variant_key="1M", gateway="STRIPE", amount=10)
+    db.add_subscription("2", "b", "inv2", variant_key="1M", gateway="STRIPE", amount=25, tenant_id="other")
+    with db.connect() as conn:
+        conn.execute("UPDATE sales_rollups SET revenue = 0")
+
+    assert db.rebuild_sales_rollups("other") == 1
+    assert db.get_sales_stats(30, "other")["total"] == (1, 25.0)
+    assert db.get_sales_stats(30, "default")["total"] == (1, 0.0)
+
+
+def test_rollups_without_tenants_are_rebuilt_on_startup(tmp_path):
+    path = str(tmp_path / "legacy.db")
+    Database(path)
+    with sqlite3.connect(path) as conn:
+        conn.execute("DROP TABLE sales_rollups")
+        conn.execute("DROP TABLE sales_rollup_invoices")
+        conn.execute("""
+            CREATE TABLE sales_rollups (
+                day TEXT NOT NULL, variant_key TEXT NOT NULL, gateway TEXT NOT NULL,
+                sales INTEGER NOT NULL DEFAULT 0, revenue REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, variant_key, gateway)
+            )
+        """)
+        conn.execute("CREATE TABLE sales_rollup_invoices (invoice_id TEXT PRIMARY KEY)")
+        conn.execute("""
+            INSERT INTO subscriptions (discord_id, discord_name, invoice_id, expiry_date, variant_key, gateway, amount, tenant_id)
+            VALUES ('1', 'a', 'inv1', datetime('now', '+30 days'), '1M', 'STRIPE', 10, 'other')
+        """)
+
+    db = Database(path)
+    assert db.get_sales_stats(30, "other")["total"] == (1, 10.0)
+    assert db.get_sales_stats(30, "default")["total"] == (0, 0)
@@ -0,0 +1,66 @@
+import asyncio
+import sqlite3
+import pytest
+
+pytest.importorskip("dotenv")  # write_behind reads its defaults from settings
+from src.models.write_behind import WriteBehindBuffer
+
+
+def set_value(name, value):
+    def write(conn):
+        conn.execute("INSERT OR REPLACE INTO job_state (name, value) VALUES (?, ?)", (name, value))
+    return write
+
+
+def values(db):
+    with db.connect() as conn:
+        return dict(conn.execute("SELECT name, value FROM job_state"))
+
+
+def test_failed_flush_is_retried_without_overwriting_newer_writes(db, monkeypatch):
+    buffer = WriteBehindBuffer(db)
+    buffer.put(set_value("a", "old"), key="a")
+    buffer.put(set_value("b", "kept"), key="b")
+
+    connect = db.connect
+    calls = []
+
+    def connect_once_locked(*args, **kwargs):
+        if not calls:
+            calls.append(1)
+            buffer.put(set_value("a", "new"), key="a")  # Queued while the failing batch was out
+            raise sqlite3.OperationalError("database is locked")
+        return connect(*args, **kwargs)
+
+    monkeypatch.setattr(db, "connect", connect_once_locked)
+    buffer.flush_sync()
+    assert buffer.pending == 2
+    assert values(db) == {}
+
+    buffer.flush_sync()
+    assert buffer.pending == 0
+    assert values(db) == {"a": "new", "b": "kept"}
+
+
+def test_flusher_idles_until_a_write_arrives(db):
+    async def scenario():
+        buffer = WriteBehindBuffer(db, interval=0.01)
+        flushes = []
+        flush = buffer.flush
+
+        async def counting_flush():
+            flushes.append(buffer.pending)
+            await flush()
+
+        buffer.flush = counting_flush
+        buffer.start()
+        await asyncio.sleep(0.05)
+        assert flushes == []  # No wakeups while nothing is queued
+
+        buffer.put(set_value("a", "1"), key="a")
+        await asyncio.sleep(0.05)
+        assert flushes == [1]
+        await buffer.drain()
+
+    asyncio.run(scenario())
+    assert values(db) == {"a": "1"}